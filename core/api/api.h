@@ -1184,6 +1184,22 @@ namespace pxar {
      */
     void maskPixel(uint8_t column, uint8_t row, bool mask, uint8_t rocid);
 
+    /** Function to enable the pixels given by the column and row vectors on all ROCs:
+     */
+    void testPixels(std::vector<uint8_t> columns, std::vector<uint8_t> rows, bool enable);
+
+    /** Function to enable the pixels given by the column and row vectors on the specified ROC:
+     */
+    void testPixels(std::vector<uint8_t> columns, std::vector<uint8_t> rows, bool enable, uint8_t rocid);
+
+    /** Function to mask the pixels given by the column and row vectors on all ROCs:
+     */
+    void maskPixels(std::vector<uint8_t> columns, std::vector<uint8_t> rows, bool mask);
+
+    /** Function to mask the pixels given by the column and row vectors on a specific ROC
+     */
+    void maskPixels(std::vector<uint8_t> columns, std::vector<uint8_t> rows, bool mask, uint8_t rocid);
+
     /** Function to enable all pixels on all ROCs:
      */
     void testAllPixels(bool enable);
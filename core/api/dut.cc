@@ -6,6 +6,7 @@
 #include "log.h"
 #include "dictionaries.h"
 #include "helper.h"
+#include "constants.h"
 #include <vector>
 #include <algorithm>
 
@@ -488,6 +489,61 @@ void dut::testPixel(uint8_t column, uint8_t row, bool enable, uint8_t rocid) {
   }
 }
 
+// Set the enable or the mask bit of a list of pixels on one ROC. The pixels are looked up
+// in a column/row table instead of searching the pixel vector once for every pixel:
+static void setPixelBits(rocConfig & rocconf, const std::vector<uint8_t> & columns, const std::vector<uint8_t> & rows, bool value, bool mask) {
+
+  std::vector<pixelConfig*> table(ROC_NUMCOLS*ROC_NUMROWS, NULL);
+  for(std::vector<pixelConfig>::iterator it = rocconf.pixels.begin(); it != rocconf.pixels.end(); ++it) {
+    if(it->column() < ROC_NUMCOLS && it->row() < ROC_NUMROWS) { table.at(it->column()*ROC_NUMROWS + it->row()) = &(*it); }
+  }
+
+  for(size_t i = 0; i < columns.size() && i < rows.size(); i++) {
+    pixelConfig * px = (columns.at(i) < ROC_NUMCOLS && rows.at(i) < ROC_NUMROWS) ? table.at(columns.at(i)*ROC_NUMROWS + rows.at(i)) : NULL;
+    if(px == NULL) {
+      LOG(logWARNING) << "Pixel at column " << static_cast<int>(columns.at(i)) << " and row " << static_cast<int>(rows.at(i)) << " not found for ROC with I2C address " << static_cast<int>(rocconf.i2c_address) << "!" ;
+    }
+    else if(mask) { px->setMask(value); }
+    else { px->setEnable(value); }
+  }
+}
+
+void dut::testPixels(std::vector<uint8_t> columns, std::vector<uint8_t> rows, bool enable) {
+
+  if(status()) {
+    LOG(logDEBUGAPI) << "Set enable bit to " << static_cast<int>(enable) << " for " << columns.size() << " pixels on all ROCs";
+    for (std::vector<rocConfig>::iterator rocit = roc.begin() ; rocit != roc.end(); ++rocit){
+      setPixelBits(*rocit, columns, rows, enable, false);
+    }
+  }
+}
+
+void dut::testPixels(std::vector<uint8_t> columns, std::vector<uint8_t> rows, bool enable, uint8_t rocid) {
+
+  if(status() && rocid < roc.size()) {
+    LOG(logDEBUGAPI) << "Set enable bit to " << static_cast<int>(enable) << " for " << columns.size() << " pixels on ROC " << static_cast<int>(rocid);
+    setPixelBits(roc.at(rocid), columns, rows, enable, false);
+  }
+}
+
+void dut::maskPixels(std::vector<uint8_t> columns, std::vector<uint8_t> rows, bool mask) {
+
+  if(status()) {
+    LOG(logDEBUGAPI) << "Set mask bit to " << static_cast<int>(mask) << " for " << columns.size() << " pixels on all ROCs";
+    for (std::vector<rocConfig>::iterator rocit = roc.begin() ; rocit != roc.end(); ++rocit){
+      setPixelBits(*rocit, columns, rows, mask, true);
+    }
+  }
+}
+
+void dut::maskPixels(std::vector<uint8_t> columns, std::vector<uint8_t> rows, bool mask, uint8_t rocid) {
+
+  if(status() && rocid < roc.size()) {
+    LOG(logDEBUGAPI) << "Set mask bit to " << static_cast<int>(mask) << " for " << columns.size() << " pixels on ROC " << static_cast<int>(rocid);
+    setPixelBits(roc.at(rocid), columns, rows, mask, true);
+  }
+}
+
 void dut::maskAllPixels(bool mask) {
 
   if(status()) {
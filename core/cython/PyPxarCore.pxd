@@ -160,6 +160,7 @@ cdef extern from "api.h" namespace "pxar":
         vector[pixelConfig] getMaskedPixels()
         vector[rocConfig] getEnabledRocs()
         vector[uint8_t] getEnabledRocI2Caddr()
+        vector[uint8_t] getRocI2Caddr()
         vector[uint8_t] getEnabledRocIDs()
         vector[tbmConfig] getEnabledTbms()
         bool getPixelEnabled(uint8_t column, uint8_t row)
@@ -176,6 +177,10 @@ cdef extern from "api.h" namespace "pxar":
         void testPixel(uint8_t column, uint8_t row, bool enable, uint8_t rocid)
         void maskPixel(uint8_t column, uint8_t row, bool mask)
         void maskPixel(uint8_t column, uint8_t row, bool mask, uint8_t rocid)
+        void testPixels(vector[uint8_t] columns, vector[uint8_t] rows, bool enable)
+        void testPixels(vector[uint8_t] columns, vector[uint8_t] rows, bool enable, uint8_t rocid)
+        void maskPixels(vector[uint8_t] columns, vector[uint8_t] rows, bool mask)
+        void maskPixels(vector[uint8_t] columns, vector[uint8_t] rows, bool mask, uint8_t rocid)
         void testAllPixels(bool enable)
         void testAllPixels(bool enable, uint8_t rocid)
         void maskAllPixels(bool mask, uint8_t rocid)
@@ -219,7 +224,7 @@ cdef extern from "api.h" namespace "pxar":
         vector[uint16_t] data
 
 
-cdef extern from "api.h" namespace "pxar":
+cdef extern from "api.h" namespace "pxar" nogil:
     cdef cppclass pxarCore:
         pxarCore(string usbId, string logLevel) except +
         dut* _dut
@@ -286,7 +291,7 @@ cdef extern from "api.h" namespace "pxar":
         bool daqTriggerSource(string triggerSource, uint32_t period) except +
         bool daqSingleSignal(string triggerSignal) except +
         void daqTrigger(uint32_t nTrig, uint16_t period) except +
-        void daqTriggerLoop(uint16_t period) except +
+        uint16_t daqTriggerLoop(uint16_t period) except +
         void daqTriggerLoopHalt() except +
         Event daqGetEvent() except +
         rawEvent daqGetRawEvent() except +
@@ -1,10 +1,19 @@
 # distutils: language = c++
 from libcpp cimport bool
-from libc.stdint cimport uint8_t, int8_t, uint16_t, int16_t, int32_t, uint32_t
+from libc.stdint cimport uint8_t, int8_t, uint16_t, int16_t, int32_t, uint32_t, int64_t
 from libcpp.string cimport string
 from libcpp.pair cimport pair
 from libcpp.vector cimport vector
 from libcpp.map cimport map
+from cpython cimport Py_buffer
+from functools import wraps
+from threading import RLock
+from time import time, sleep
+from collections import OrderedDict
+try:
+    from collections.abc import Sequence
+except ImportError:
+    from collections import Sequence
 import numpy
 
 cimport PyPxarCore
@@ -150,6 +159,13 @@ cdef class RocConfig:
         def __get__(self): return self.thisptr.enable()
         def __set__(self, enable): self.thisptr.setEnable(enable)
 
+STATISTICS_FIELDS = ('info_words_read', 'total_events', 'valid_events', 'empty_events', 'valid_pixels',
+                     'errors', 'errors_event', 'errors_tbm', 'errors_roc', 'errors_pixel',
+                     'errors_event_start', 'errors_event_stop', 'errors_event_overflow', 'errors_event_invalid_words', 'errors_event_invalid_xor',
+                     'errors_event_frame', 'errors_event_idledata', 'errors_event_nodata', 'errors_event_pkam',
+                     'errors_tbm_header', 'errors_tbm_eventid_mismatch', 'errors_tbm_trailer', 'errors_roc_missing', 'errors_roc_readback',
+                     'errors_pixel_incomplete', 'errors_pixel_address', 'errors_pixel_pulseheight', 'errors_pixel_buffer_corrupt')
+
 cdef class Statistics:
     cdef statistics thisobj      # hold a C++ instance which we're wrapping
     def __cinit__(self):
@@ -162,6 +178,18 @@ cdef class Statistics:
         self.thisobj = s
     def dump(self):
         self.thisobj.dump()
+    def as_array(self):
+        """ Returns all counters as uint64 array in the order of STATISTICS_FIELDS """
+        cdef statistics *s = &self.thisobj
+        return numpy.array([s.info_words_read(), s.info_events_total(), s.info_events_valid(), s.info_events_empty(), s.info_pixels_valid(),
+                            s.errors(), s.errors_event(), s.errors_tbm(), s.errors_roc(), s.errors_pixel(),
+                            s.errors_event_start(), s.errors_event_stop(), s.errors_event_overflow(), s.errors_event_invalid_words(), s.errors_event_invalid_xor(),
+                            s.errors_event_frame(), s.errors_event_idledata(), s.errors_event_nodata(), s.errors_event_pkam(),
+                            s.errors_tbm_header(), s.errors_tbm_eventid_mismatch(), s.errors_tbm_trailer(), s.errors_roc_missing(), s.errors_roc_readback(),
+                            s.errors_pixel_incomplete(), s.errors_pixel_address(), s.errors_pixel_pulseheight(), s.errors_pixel_buffer_corrupt()], 'u8')
+    def as_dict(self):
+        """ Returns all counters as ordered dictionary with the names of the properties """
+        return OrderedDict(zip(STATISTICS_FIELDS, self.as_array().tolist()))
     property errors:
         def __get__(self): return self.thisobj.errors()
     property info_words_read:
@@ -219,8 +247,63 @@ cdef class Statistics:
     property errors_pixel_buffer_corrupt:
         def __get__(self): return self.thisobj.errors_pixel_buffer_corrupt()
 
+cdef fill_pixel_fields(vector[pixel] &pixels, uint8_t[:] roc, uint8_t[:] column, uint8_t[:] row, double[:] value):
+    cdef size_t i
+    for i in xrange(pixels.size()):
+        roc[i] = pixels[i].roc()
+        column[i] = pixels[i].column()
+        row[i] = pixels[i].row()
+        value[i] = pixels[i].value()
+
+cdef class PixelView:
+    """ Read-only sequence of the pixels of a PxEvent, which creates each Pixel only when it is first accessed. """
+    cdef PxEvent event
+    cdef list cache
+    cdef dict arrays
+    def __cinit__(self, PxEvent event):
+        self.event = event
+        self.cache = [None] * event.thisptr.pixels.size()
+    def __len__(self):
+        return len(self.cache)
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in xrange(*i.indices(len(self.cache)))]
+        if i < 0:
+            i += len(self.cache)
+        if not 0 <= i < len(self.cache):
+            raise IndexError('pixel index out of range')
+        if self.cache[i] is None:
+            px = Pixel()
+            px.fill(self.event.thisptr.pixels[i])
+            self.cache[i] = px
+        return self.cache[i]
+    def __iter__(self):
+        for i in xrange(len(self.cache)):
+            yield self[i]
+    def __repr__(self):
+        return '[{}]'.format(', '.join(str(px) for px in self))
+    cdef dict fields(self):
+        # columnar arrays of the pixels, created once
+        cdef vector[pixel] *pixels = &self.event.thisptr.pixels
+        if self.arrays is None:
+            self.arrays = {key: numpy.empty(pixels.size(), 'u1') for key in ['roc', 'column', 'row']}
+            self.arrays['value'] = numpy.empty(pixels.size(), 'f8')
+            fill_pixel_fields(pixels[0], self.arrays['roc'], self.arrays['column'], self.arrays['row'], self.arrays['value'])
+        return self.arrays
+    property rocs:
+        def __get__(self): return self.fields()['roc']
+    property columns:
+        def __get__(self): return self.fields()['column']
+    property rows:
+        def __get__(self): return self.fields()['row']
+    property values:
+        def __get__(self): return self.fields()['value']
+
+Sequence.register(PixelView)
+
 cdef class PxEvent:
     cdef Event *thisptr      # hold a C++ instance which we're wrapping
+    cdef PixelView view      # cached view on the pixels, reset whenever they change
     def __cinit__(self):
         self.thisptr = new Event()
     def __dealloc__(self):
@@ -235,9 +318,11 @@ cdef class PxEvent:
         s += " ======\n"
         return str(s)
     def __repr__(self):
-        return '[{}]'.format(', '.join(px for px in self.pixels))
+        return repr(self.pixels)
     cdef clone(self, Event ev):
+        del self.thisptr
         self.thisptr = new Event(ev)
+        self.view = None
     def printHeader(self):
         self.thisptr.printHeader()
     def printTrailer(self):
@@ -245,18 +330,16 @@ cdef class PxEvent:
 
     property pixels:
         def __get__(self):
-            r = list()
-            for p in self.thisptr.pixels:
-                P = Pixel()
-                P.fill(p)
-                r.append(P)
-            return r
+            if self.view is None:
+                self.view = PixelView(self)
+            return self.view
         def __set__(self, value):
             cdef vector[pixel] v
             cdef Pixel px
             for px in value:
                 v.push_back( <pixel> px.thisptr[0])
             self.thisptr.pixels = v
+            self.view = None
     property header:
         def __get__(self): return self.thisptr.getHeaders()
         def __set__(self, value): self.thisptr.addHeader(value)
@@ -306,12 +389,285 @@ cdef class PxEvent:
     property eventid_mismatch:
         def __get__(self): return self.thisptr.eventid_mismatch
 
+cdef dict event_arrays(vector[Event] &events):
+    """ Flattens the pixels of a vector of Events into numpy arrays.
+    The pixels of event i are found at [offsets[i]:offsets[i + 1]] of the pixel arrays.
+    """
+    cdef size_t i, j, n_pixels = 0, k = 0
+    for i in xrange(events.size()):
+        n_pixels += events[i].pixels.size()
+    data = {'offsets': numpy.empty(events.size() + 1, 'i8'),
+            'roc': numpy.empty(n_pixels, 'u1'),
+            'column': numpy.empty(n_pixels, 'u1'),
+            'row': numpy.empty(n_pixels, 'u1'),
+            'value': numpy.empty(n_pixels, 'f8')}
+    cdef int64_t[:] offsets = data['offsets']
+    cdef uint8_t[:] roc = data['roc'], column = data['column'], row = data['row']
+    cdef double[:] value = data['value']
+    for i in xrange(events.size()):
+        offsets[i] = k
+        for j in xrange(events[i].pixels.size()):
+            roc[k] = events[i].pixels[j].roc()
+            column[k] = events[i].pixels[j].column()
+            row[k] = events[i].pixels[j].row()
+            value[k] = events[i].pixels[j].value()
+            k += 1
+    offsets[events.size()] = k
+    return data
+
+# messages of pxar::DataNoEvent, which only signals an empty DAQ buffer
+NO_EVENT_MESSAGES = ('No event available', 'No data available')
+
+TRAILER_BITS = {'no_token_pass': 0x8000, 'reset_tbm': 0x4000, 'reset_roc': 0x2000, 'sync_error': 0x1000, 'sync_trigger': 0x0800,
+                'clear_trigger_count': 0x0400, 'cal_trigger': 0x0200, 'stack_full': 0x0100, 'auto_reset': 0x0080, 'pkam_reset': 0x0040}
+
+cdef word_matrix(vector[vector[uint16_t]] &words):
+    """ (n_events, n_cores) array of the TBM words of each event, filled with 0 if an event has less cores, and the number of words of each event. """
+    cdef size_t i, j, n = 0
+    counts = numpy.empty(words.size(), 'u2')
+    cdef uint16_t[:] c = counts
+    for i in xrange(words.size()):
+        c[i] = words[i].size()
+        n = words[i].size() if words[i].size() > n else n
+    data = numpy.zeros((words.size(), n), 'u2')
+    cdef uint16_t[:, :] v = data
+    for i in xrange(words.size()):
+        for j in xrange(words[i].size()):
+            v[i, j] = words[i][j]
+    return data, counts
+
+cdef flag_matrix(vector[vector[bool]] &flags):
+    """ (n_events, n) bool array of the per-event flags, filled with False if an event has less entries, and the number of flags of each event. """
+    cdef size_t i, j, n = 0
+    counts = numpy.empty(flags.size(), 'u2')
+    cdef uint16_t[:] c = counts
+    for i in xrange(flags.size()):
+        c[i] = flags[i].size()
+        n = flags[i].size() if flags[i].size() > n else n
+    data = numpy.zeros((flags.size(), n), 'u1')
+    cdef uint8_t[:, :] v = data
+    for i in xrange(flags.size()):
+        for j in xrange(flags[i].size()):
+            v[i, j] = flags[i][j]
+    return data.view('?'), counts
+
+cdef dict event_header_arrays(vector[Event] &events):
+    """ Collects the TBM headers and trailers with their decoded fields, the ROC error flags and the pixel error flags of a vector of Events.
+    TBM fields have the shape (n_events, n_cores), ROC flags (n_events, n_rocs) and pixel flags the shape of the pixel arrays of event_arrays.
+    The padded matrices come with the number of real entries of every event as 'n_<key>', e.g. n_header.
+    """
+    cdef size_t i, j, k = 0, n_pixels = 0
+    cdef vector[vector[uint16_t]] headers, trailers
+    cdef vector[vector[bool]] readback, missing, incomplete, no_data, mismatch
+    for i in xrange(events.size()):
+        headers.push_back(events[i].getHeaders())
+        trailers.push_back(events[i].getTrailers())
+        readback.push_back(events[i].roc_readback)
+        missing.push_back(events[i].missing_roc_headers)
+        incomplete.push_back(events[i].incomplete_data)
+        no_data.push_back(events[i].no_data)
+        mismatch.push_back(events[i].eventid_mismatch)
+        n_pixels += events[i].pixels.size()
+    data = {}
+    for key, (matrix, counts) in [('header', word_matrix(headers)), ('trailer', word_matrix(trailers)), ('roc_readback', flag_matrix(readback)),
+                                  ('missing_roc_headers', flag_matrix(missing)), ('incomplete_data', flag_matrix(incomplete)), ('no_data', flag_matrix(no_data)),
+                                  ('eventid_mismatch', flag_matrix(mismatch))]:
+        data[key], data['n_' + key] = matrix, counts
+    header, trailer = data['header'], data['trailer']
+    data['trigger_count'] = (header >> 8).astype('u1')
+    data['data_id'] = ((header & 0x00c0) >> 6).astype('u1')
+    data['trigger_phase'] = (header & 0x003f).astype('u1')
+    data['stack_count'] = (trailer & 0x003f).astype('u1')
+    for key, bit in TRAILER_BITS.items():
+        data[key] = (trailer & bit) != 0
+    pixel_flags = numpy.zeros((3, n_pixels), 'u1')
+    cdef uint8_t[:, :] flags = pixel_flags
+    for i in xrange(events.size()):
+        for j in xrange(events[i].pixels.size()):
+            flags[0, k] = events[i].pixels[j].invalidAddress()
+            flags[1, k] = events[i].pixels[j].invalidPulseHeight()
+            flags[2, k] = events[i].pixels[j].bufferCorruption()
+            k += 1
+    data['invalid_address'], data['invalid_pulse_height'], data['buffer_corruption'] = pixel_flags.view('?')
+    return data
+
+cdef vector[uint8_t] byte_vector(values):
+    """ Converts an array-like of small integers into a vector without going through Python for every element. """
+    cdef uint8_t[:] v = numpy.ascontiguousarray(values, 'u1').ravel()
+    cdef vector[uint8_t] r
+    cdef size_t i
+    r.reserve(v.shape[0])
+    for i in xrange(v.shape[0]):
+        r.push_back(v[i])
+    return r
+
+cdef fill_pixel_map(vector[pixel] &pixels, vector[int] &roc_index, double[:, :, :] values, uint8_t[:, :, :] mask):
+    """ Sorts the pixels into the (roc, column, row) array and clears the mask of every pixel found. """
+    cdef size_t i
+    cdef int roc
+    for i in xrange(pixels.size()):
+        roc = roc_index[pixels[i].roc()]
+        if roc < 0 or pixels[i].column() >= values.shape[1] or pixels[i].row() >= values.shape[2]:
+            continue
+        values[roc, pixels[i].column(), pixels[i].row()] = pixels[i].value()
+        mask[roc, pixels[i].column(), pixels[i].row()] = 0
+
+cdef fill_scan_step(vector[pixel] &pixels, vector[int] &roc_index, float[:, :, :] values):
+    """ Sorts the pixels of one DAC setting into the (roc, column, row) array. """
+    cdef size_t i
+    cdef int roc
+    for i in xrange(pixels.size()):
+        roc = roc_index[pixels[i].roc()]
+        if roc < 0 or pixels[i].column() >= values.shape[1] or pixels[i].row() >= values.shape[2]:
+            continue
+        values[roc, pixels[i].column(), pixels[i].row()] = pixels[i].value()
+
+cdef class WordBuffer:
+    """ Owns a vector of raw 16bit DAQ words and exposes it via the buffer protocol, i.e. numpy.asarray() does not copy. """
+    cdef vector[uint16_t] words
+    cdef Py_ssize_t shape[1]
+    cdef Py_ssize_t strides[1]
+
+    def __len__(self):
+        return self.words.size()
+
+    def __getbuffer__(self, Py_buffer *buffer, int flags):
+        self.shape[0] = self.words.size()
+        self.strides[0] = sizeof(uint16_t)
+        buffer.buf = <char *> self.words.data()
+        buffer.format = 'H'
+        buffer.internal = NULL
+        buffer.itemsize = sizeof(uint16_t)
+        buffer.len = self.words.size() * sizeof(uint16_t)
+        buffer.ndim = 1
+        buffer.obj = self
+        buffer.readonly = 0
+        buffer.shape = self.shape
+        buffer.strides = self.strides
+        buffer.suboffsets = NULL
+
+    def __releasebuffer__(self, Py_buffer *buffer):
+        pass
+
+cdef words_array(vector[uint16_t] &words):
+    """ Moves the content of [words] into a WordBuffer and returns a uint16 numpy array on top of it. """
+    cdef WordBuffer buf = WordBuffer()
+    if words.empty():
+        return numpy.empty(0, 'u2')
+    buf.words.swap(words)
+    return numpy.asarray(buf)
+
+cdef raw_event_arrays(vector[rawEvent] &events):
+    """ Concatenates the data of a vector of rawEvents into one word array.
+    The words of event i are found at [offsets[i]:offsets[i + 1]].
+    """
+    cdef size_t i
+    cdef vector[uint16_t] words
+    offsets_array = numpy.empty(events.size() + 1, 'i8')
+    cdef int64_t[:] offsets = offsets_array
+    offsets[0] = 0
+    for i in xrange(events.size()):
+        offsets[i + 1] = offsets[i] + events[i].data.size()
+    words.reserve(offsets[events.size()])
+    for i in xrange(events.size()):
+        words.insert(words.end(), events[i].data.begin(), events[i].data.end())
+    return words_array(words), offsets_array
+
+def synchronized(method):
+    """ Serialises the calls into pxarCore, which is not thread safe, since the long calls run without the GIL. """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
 cdef class PyPxarCore:
     cdef pxarCore *thisptr # hold the C++ instance
+    cdef readonly object lock # reentrant lock around all calls into pxarCore, may be held to group several calls
     def __cinit__(self, usbId = "*", logLevel = "INFO"):
+        self.lock = RLock()
         self.thisptr = new pxarCore(usbId, logLevel)
     def __dealloc__(self):
         del self.thisptr
+    cdef vector[int] roc_index(self):
+        # translates the I2C address of a ROC into its index in the DUT
+        cdef vector[int] index = vector[int](256, -1)
+        cdef vector[uint8_t] i2c = self.thisptr._dut.getRocI2Caddr()
+        cdef size_t i
+        for i in xrange(i2c.size()):
+            index[i2c[i]] = i
+        return index
+    cdef pixel_map(self, vector[pixel] &pixels):
+        # dense map: (n_rocs, 52, 80) array of the pixel values and mask of the pixels without response
+        cdef vector[int] roc_index = self.roc_index()
+        values = numpy.zeros((self.thisptr._dut.getNRocs(), 52, 80), 'f8')
+        mask = numpy.ones(values.shape, 'u1')
+        fill_pixel_map(pixels, roc_index, values, mask)
+        return values, mask.view('?')
+    cdef pixel_config_map(self, bool masked):
+        # (n_rocs, 52, 80) bool array of the masked or of the enabled pixels
+        cdef size_t roc, i
+        cdef vector[pixelConfig] pixels
+        data = numpy.zeros((self.thisptr._dut.getNRocs(), 52, 80), 'u1')
+        cdef uint8_t[:, :, :] v = data
+        for roc in xrange(self.thisptr._dut.getNRocs()):
+            pixels = self.thisptr._dut.getMaskedPixels(roc) if masked else self.thisptr._dut.getEnabledPixels(roc)
+            for i in xrange(pixels.size()):
+                if pixels[i].column() < v.shape[1] and pixels[i].row() < v.shape[2]:
+                    v[roc, pixels[i].column(), pixels[i].row()] = 1
+        return data.view('?')
+    cdef dac_scan(self, vector[pair[uint8_t, vector[pixel]]] &r, float fill):
+        # dense scan: (n_dac, n_rocs, 52, 80) array of the pixel values and the DAC values
+        cdef vector[int] roc_index = self.roc_index()
+        cdef size_t d
+        values = numpy.full((r.size(), self.thisptr._dut.getNRocs(), 52, 80), fill, 'f4')
+        dacs = numpy.empty(r.size(), 'u1')
+        cdef float[:, :, :, :] v = values
+        for d in xrange(r.size()):
+            dacs[d] = r[d].first
+            fill_scan_step(r[d].second, roc_index, v[d])
+        return values, dacs
+    cdef dac_dac_scan(self, vector[pair[uint8_t, pair[uint8_t, vector[pixel]]]] &r, float fill):
+        # dense scan: (n_dac1, n_dac2, n_rocs, 52, 80) array of the pixel values and the values of both DACs
+        cdef vector[int] roc_index = self.roc_index()
+        cdef vector[int] index1 = vector[int](256, -1), index2 = vector[int](256, -1)
+        cdef size_t d
+        dacs1, dacs2 = list(), list()
+        for d in xrange(r.size()):
+            if index1[r[d].first] < 0:
+                index1[r[d].first] = len(dacs1)
+                dacs1.append(r[d].first)
+            if index2[r[d].second.first] < 0:
+                index2[r[d].second.first] = len(dacs2)
+                dacs2.append(r[d].second.first)
+        values = numpy.full((len(dacs1), len(dacs2), self.thisptr._dut.getNRocs(), 52, 80), fill, 'f4')
+        cdef float[:, :, :, :, :] v = values
+        for d in xrange(r.size()):
+            fill_scan_step(r[d].second.second, roc_index, v[index1[r[d].first], index2[r[d].second.first]])
+        return values, numpy.array(dacs1, 'u1'), numpy.array(dacs2, 'u1')
+    cdef event_batch(self, bool arrays, bool headers):
+        # all events in the DAQ buffer as list of PxEvents or as columnar arrays, None if there are none
+        cdef vector[Event] r
+        try:
+            with self.lock:
+                with nogil:
+                    r = self.thisptr.daqGetEventBuffer()
+        except RuntimeError as err:
+            if str(err) in NO_EVENT_MESSAGES:
+                return None
+            raise
+        if arrays:
+            data = event_arrays(r)
+            if headers:
+                data.update(event_header_arrays(r))
+            return data
+        pixelevents = list()
+        for event in r:
+            p = PxEvent()
+            p.clone(event)
+            pixelevents.append(p)
+        return pixelevents
+    @synchronized
     def initTestboard(self,sig_delays, power_settings, pg_setup):
         """ Initializer method for the testboard
         Parameters are dictionaries in the form {"name":value}:
@@ -331,6 +687,7 @@ cdef class PyPxarCore:
         for item in enumerate(pg_setup):
             pgs.push_back(pair[string, uint8_t ](item[1][0],int(item[1][1])))
         return self.thisptr.initTestboard(sd, ps, pgs)
+    @synchronized
     def setTestboardPower(self, power_settings):
         """ Initializer method for the testboard
         Parameters are dictionaries in the form {"name":value}:
@@ -342,24 +699,29 @@ cdef class PyPxarCore:
         for key, value in power_settings.items():
             ps.push_back((key,float(value)))
         self.thisptr.setTestboardPower(ps)
+    @synchronized
     def setBlackOffsets(self, values):
         cdef vector[float] offsets
         for offset in values:
             offsets.push_back(offset)
         self.thisptr.setBlackOffsets(offsets)
+    @synchronized
     def setDecodingL1Offsets(self, values):
         cdef vector[float] offsets
         for offset in values:
             offsets.push_back(offset)
         self.thisptr.setDecodingL1Offsets(offsets)
+    @synchronized
     def setDecodingAlphas(self, values):
         cdef vector[float] alphas
         for alpha in values:
             alphas.push_back(alpha)
         self.thisptr.setDecodingAlphas(alphas)
+    @synchronized
     def getTestboardDelays(self):
         r = self.thisptr.getTestboardDelays()
         return {tup.first: tup.second for tup in r}
+    @synchronized
     def setTestboardDelays(self, sig_delays):
         """ Initializer method for the testboard
         Parameters are dictionaries in the form {"name":value}:
@@ -371,6 +733,7 @@ cdef class PyPxarCore:
         for key, value in sig_delays.items():
             sd.push_back(pair[string,uint8_t](key,value))
         self.thisptr.setTestboardDelays(sd)
+    @synchronized
     def setPatternGenerator(self, pg_setup):
         """ Initializer method for the testboard
         Parameters are dictionaries in the form {"name":value}:
@@ -382,6 +745,7 @@ cdef class PyPxarCore:
         for item in enumerate(pg_setup):
             pgs.push_back(pair[string, uint8_t ](item[1][0],item[1][1]))
         self.thisptr.setPatternGenerator(pgs)
+    @synchronized
     def initDUT(self, hubids, tbmtype, tbmDACs, roctype, rocDACs, rocPixels, rocI2C = None):
         """ Initializer method for the DUT (attached devices)
         Parameters:
@@ -426,24 +790,30 @@ cdef class PyPxarCore:
         else:
             return self.thisptr.initDUT(hubs, tbmtype, td, roctype,rd,rpcs)
 
+    @synchronized
     def getVersion(self):
         return self.thisptr.getVersion()
+    @synchronized
     def testAllPixels(self, bool enable, rocid = None):
         if rocid is not None:
             self.thisptr._dut.testAllPixels(enable,rocid)
         else:
             self.thisptr._dut.testAllPixels(enable)
 
+    @synchronized
     def getTbmDACs(self, int tbmid):
         r = self.thisptr._dut.getTbmDACs(tbmid)
         return {tup.first: tup.second for tup in r}
   
+    @synchronized
     def getRocDACs(self, int rocid):
         r = self.thisptr._dut.getDACs(rocid)
         return {tup.first: tup.second for tup in r}
+    @synchronized
     def getDACs(self, int rocid):
         return self.getRocDACs(rocid)
   
+    @synchronized
     def updateTrimBits(self, trimming, int rocid):
         cdef vector[pixelConfig] v
         cdef pixelConfig pc
@@ -453,37 +823,70 @@ cdef class PyPxarCore:
             v.push_back(pc)
         self.thisptr._dut.updateTrimBits(v, rocid)
 
+    @synchronized
     def info(self):
         self.thisptr._dut.info()
 
+    @synchronized
     def setROCEnable(self, int rocid, bool enable):
         self.thisptr._dut.setROCEnable(rocid, enable)
 
+    @synchronized
     def setTBMEnable(self, int tbmid, bool enable):
         self.thisptr._dut.setTBMEnable(tbmid, enable)
 
+    @synchronized
     def testPixel(self, int col, int row, bool enable, rocid = None):
         if rocid is not None:
             self.thisptr._dut.testPixel(col, row, enable,rocid)
         else:
             self.thisptr._dut.testPixel(col, row, enable)
+    @synchronized
     def maskAllPixels(self, bool enable, rocid = None):
         if rocid is not None:
             self.thisptr._dut.maskAllPixels(enable,rocid)
         else:
             self.thisptr._dut.maskAllPixels(enable)
+    @synchronized
     def maskPixel(self, int col, int row, bool enable, rocid = None):
         if rocid is not None:
             self.thisptr._dut.maskPixel(col, row, enable,rocid)
         else:
             self.thisptr._dut.maskPixel(col, row, enable)
 
+    @synchronized
+    def testPixels(self, columns, rows, bool enable, rocid = None):
+        """ enables or disables the pixels given by the arrays [columns] and [rows] on all ROCs or on ROC [rocid] """
+        cdef vector[uint8_t] c = byte_vector(columns), r = byte_vector(rows)
+        if rocid is not None:
+            self.thisptr._dut.testPixels(c, r, enable, rocid)
+        else:
+            self.thisptr._dut.testPixels(c, r, enable)
+    @synchronized
+    def maskPixels(self, columns, rows, bool mask, rocid = None):
+        """ masks or unmasks the pixels given by the arrays [columns] and [rows] on all ROCs or on ROC [rocid] """
+        cdef vector[uint8_t] c = byte_vector(columns), r = byte_vector(rows)
+        if rocid is not None:
+            self.thisptr._dut.maskPixels(c, r, mask, rocid)
+        else:
+            self.thisptr._dut.maskPixels(c, r, mask)
+    @synchronized
+    def getMaskMap(self):
+        """ Returns a (n_rocs, 52, 80) bool array which is True for the masked pixels """
+        return self.pixel_config_map(True)
+    @synchronized
+    def getEnableMap(self):
+        """ Returns a (n_rocs, 52, 80) bool array which is True for the enabled pixels """
+        return self.pixel_config_map(False)
+
+    @synchronized
     def getNMaskedPixels(self, rocid = None):
         if rocid is not None:
             return self.thisptr._dut.getNMaskedPixels(rocid)
         else:
             return self.thisptr._dut.getNMaskedPixels()
 
+    @synchronized
     def getMaskedPixels(self, rocid = None):
         cdef vector[pixelConfig] rpcs
         if rocid is not None:
@@ -497,12 +900,14 @@ cdef class PyPxarCore:
             pixelconfigs.append(pxc)
         return pixelconfigs
 
+    @synchronized
     def getNEnabledPixels(self, rocid = None):
         if rocid is not None:
             return self.thisptr._dut.getNEnabledPixels(rocid)
         else:
             return self.thisptr._dut.getNEnabledPixels()
 
+    @synchronized
     def getEnabledPixels(self, rocid = None):
         cdef vector[pixelConfig] rpcs
         if rocid is not None:
@@ -516,11 +921,14 @@ cdef class PyPxarCore:
             pixelconfigs.append(pxc)
         return pixelconfigs
 
+    @synchronized
     def getNEnabledTbms(self):
         return self.thisptr._dut.getNEnabledTbms()
+    @synchronized
     def getNEnabledRocs(self):
         return self.thisptr._dut.getNEnabledRocs()
 
+    @synchronized
     def getEnabledRocI2Caddr(self):
         cdef vector[uint8_t] rpcs
         rpcs = self.thisptr._dut.getEnabledRocI2Caddr()
@@ -529,6 +937,16 @@ cdef class PyPxarCore:
             roci2c.append(r)
         return roci2c
 
+    @synchronized
+    def getRocI2Caddr(self):
+        cdef vector[uint8_t] rpcs
+        rpcs = self.thisptr._dut.getRocI2Caddr()
+        roci2c = list()
+        for r in rpcs:
+            roci2c.append(r)
+        return roci2c
+
+    @synchronized
     def getEnabledRocIDs(self):
         cdef vector[uint8_t] rpcs
         rpcs = self.thisptr._dut.getEnabledRocIDs()
@@ -537,53 +955,76 @@ cdef class PyPxarCore:
             rocids.append(r)
         return rocids
 
+    @synchronized
     def getNTbms(self):
         return self.thisptr._dut.getNTbmCores()
+    @synchronized
     def getNRocs(self):
         return self.thisptr._dut.getNRocs()
+    @synchronized
     def getTbmType(self):
         return self.thisptr._dut.getTbmType()
+    @synchronized
     def getRocType(self):
         return self.thisptr._dut.getRocType()
     #def programDUT(self):
         #return self.thisptr.programDUT()
+    @synchronized
     def status(self):
         return self.thisptr.status()
+    @synchronized
     def flashTB(self, string filename):
         return self.thisptr.flashTB(filename)
+    @synchronized
     def getTBia(self):
         return float(self.thisptr.getTBia())
+    @synchronized
     def getTBva(self):
         return float(self.thisptr.getTBva())
+    @synchronized
     def getTBid(self):
         return float(self.thisptr.getTBid())
+    @synchronized
     def getTBvd(self):
         return float(self.thisptr.getTBvd())
+    @synchronized
     def HVoff(self):
         self.thisptr.HVoff()
+    @synchronized
     def HVon(self):
         self.thisptr.HVon()
+    @synchronized
     def Poff(self):
         self.thisptr.Poff()
+    @synchronized
     def Pon(self):
         self.thisptr.Pon()
+    @synchronized
     def SignalProbe(self, string probe, string name, int channel = 0):
         return self.thisptr.SignalProbe(probe, name, channel)
+    @synchronized
     def setDAC(self, string dacName, uint8_t dacValue, rocid = None):
         if rocid is None:
             return self.thisptr.setDAC(dacName, dacValue)
         else:
             return self.thisptr.setDAC(dacName, dacValue, rocid)
+    @synchronized
     def getDACRange(self, string dacName):
         return self.thisptr.getDACRange(dacName)
+    @synchronized
     def setTbmReg(self, string regName, uint8_t regValue, tbmid = None):
         if tbmid is None:
             return self.thisptr.setTbmReg(regName, regValue)
         else:
             return self.thisptr.setTbmReg(regName, regValue, tbmid)
-    def getPulseheightVsDAC(self, string dacName, int dacStep, int dacMin, int dacMax, int flags = 0, int nTriggers = 16):
+    @synchronized
+    def getPulseheightVsDAC(self, string dacName, int dacStep, int dacMin, int dacMax, int flags = 0, int nTriggers = 16, dense = False):
+        """ dense = True returns a (n_dac, n_rocs, 52, 80) numpy array with the values (NaN for pixels without response) and the DAC values """
         cdef vector[pair[uint8_t, vector[pixel]]] r
-        r = self.thisptr.getPulseheightVsDAC(dacName, dacStep, dacMin, dacMax, flags, nTriggers)
+        with nogil:
+            r = self.thisptr.getPulseheightVsDAC(dacName, dacStep, dacMin, dacMax, flags, nTriggers)
+        if dense:
+            return self.dac_scan(r, numpy.nan)
         dac_steps = list()
         for d in xrange(r.size()):
             pixels = list()
@@ -595,9 +1036,14 @@ cdef class PyPxarCore:
             dac_steps.append(pixels)
         return numpy.array(dac_steps)
 
-    def getEfficiencyVsDAC(self, string dacName, int dacStep, int dacMin, int dacMax, int flags = 0, int nTriggers = 16):
+    @synchronized
+    def getEfficiencyVsDAC(self, string dacName, int dacStep, int dacMin, int dacMax, int flags = 0, int nTriggers = 16, dense = False):
+        """ dense = True returns a (n_dac, n_rocs, 52, 80) numpy array with the values (0 for pixels without response) and the DAC values """
         cdef vector[pair[uint8_t, vector[pixel]]] r
-        r = self.thisptr.getEfficiencyVsDAC(dacName, dacStep, dacMin, dacMax, flags, nTriggers)
+        with nogil:
+            r = self.thisptr.getEfficiencyVsDAC(dacName, dacStep, dacMin, dacMax, flags, nTriggers)
+        if dense:
+            return self.dac_scan(r, 0)
         dac_steps = list()
         for d in xrange(r.size()):
             pixels = list()
@@ -609,9 +1055,14 @@ cdef class PyPxarCore:
             dac_steps.append(pixels)
         return numpy.array(dac_steps)
 
-    def getEfficiencyVsDACDAC(self, string dac1name, uint8_t dac1step, uint8_t dac1min, uint8_t dac1max, string dac2name, uint8_t dac2step, uint8_t dac2min, uint8_t dac2max, uint16_t flags = 0, uint32_t nTriggers=16):
+    @synchronized
+    def getEfficiencyVsDACDAC(self, string dac1name, uint8_t dac1step, uint8_t dac1min, uint8_t dac1max, string dac2name, uint8_t dac2step, uint8_t dac2min, uint8_t dac2max, uint16_t flags = 0, uint32_t nTriggers=16, dense = False):
+        """ dense = True returns a (n_dac1, n_dac2, n_rocs, 52, 80) numpy array with the values (0 for pixels without response) and the values of both DACs """
         cdef vector[pair[uint8_t, pair[uint8_t, vector[pixel]]]] r
-        r = self.thisptr.getEfficiencyVsDACDAC(dac1name, dac1step, dac1min, dac1max, dac2name, dac2step, dac2min, dac2max, flags, nTriggers)
+        with nogil:
+            r = self.thisptr.getEfficiencyVsDACDAC(dac1name, dac1step, dac1min, dac1max, dac2name, dac2step, dac2min, dac2max, flags, nTriggers)
+        if dense:
+            return self.dac_dac_scan(r, 0)
         # Return the linearized matrix with all pixels:
         dac_steps = list()
         for d in xrange(r.size()):
@@ -624,9 +1075,14 @@ cdef class PyPxarCore:
             dac_steps.append(pixels)
         return numpy.array(dac_steps)
 
-    def getThresholdVsDAC(self, string dac1Name, uint8_t dac1Step, uint8_t dac1Min, uint8_t dac1Max, string dac2Name, uint8_t dac2Step, uint8_t dac2Min, uint8_t dac2Max, threshold, uint16_t flags = 0, uint32_t nTriggers=16):
+    @synchronized
+    def getThresholdVsDAC(self, string dac1Name, uint8_t dac1Step, uint8_t dac1Min, uint8_t dac1Max, string dac2Name, uint8_t dac2Step, uint8_t dac2Min, uint8_t dac2Max, uint8_t threshold, uint16_t flags = 0, uint32_t nTriggers=16, dense = False):
+        """ dense = True returns a (n_dac, n_rocs, 52, 80) numpy array with the values (NaN for pixels without response) and the DAC values """
         cdef vector[pair[uint8_t, vector[pixel]]] r
-        r = self.thisptr.getThresholdVsDAC(dac1Name, dac1Step, dac1Min, dac1Max, dac2Name, dac2Step, dac2Min, dac2Max, threshold, flags, nTriggers)
+        with nogil:
+            r = self.thisptr.getThresholdVsDAC(dac1Name, dac1Step, dac1Min, dac1Max, dac2Name, dac2Step, dac2Min, dac2Max, threshold, flags, nTriggers)
+        if dense:
+            return self.dac_scan(r, numpy.nan)
         dac_steps = list()
         for d in xrange(r.size()):
             pixels = list()
@@ -638,9 +1094,14 @@ cdef class PyPxarCore:
             dac_steps.append(pixels)
         return numpy.array(dac_steps)
 
-    def getPulseheightVsDACDAC(self, string dac1name, uint8_t dac1step, uint8_t dac1min, uint8_t dac1max, string dac2name, uint8_t dac2step, uint8_t dac2min, uint8_t dac2max, uint16_t flags = 0, uint32_t nTriggers=16):
+    @synchronized
+    def getPulseheightVsDACDAC(self, string dac1name, uint8_t dac1step, uint8_t dac1min, uint8_t dac1max, string dac2name, uint8_t dac2step, uint8_t dac2min, uint8_t dac2max, uint16_t flags = 0, uint32_t nTriggers=16, dense = False):
+        """ dense = True returns a (n_dac1, n_dac2, n_rocs, 52, 80) numpy array with the values (NaN for pixels without response) and the values of both DACs """
         cdef vector[pair[uint8_t, pair[uint8_t, vector[pixel]]]] r
-        r = self.thisptr.getPulseheightVsDACDAC(dac1name, dac1step, dac1min, dac1max, dac2name, dac2step, dac2min, dac2max, flags, nTriggers)
+        with nogil:
+            r = self.thisptr.getPulseheightVsDACDAC(dac1name, dac1step, dac1min, dac1max, dac2name, dac2step, dac2min, dac2max, flags, nTriggers)
+        if dense:
+            return self.dac_dac_scan(r, numpy.nan)
         # Return the linearized matrix with all pixels:
         dac_steps = list()
         for d in xrange(r.size()):
@@ -653,9 +1114,14 @@ cdef class PyPxarCore:
             dac_steps.append(pixels)
         return numpy.array(dac_steps)
 
-    def getPulseheightMap(self, int flags, int nTriggers):
+    @synchronized
+    def getPulseheightMap(self, int flags, int nTriggers, dense = False):
+        """ dense = True returns a (n_rocs, 52, 80) numpy array with the values and a mask of the pixels which did not report anything """
         cdef vector[pixel] r
-        r = self.thisptr.getPulseheightMap(flags, nTriggers)
+        with nogil:
+            r = self.thisptr.getPulseheightMap(flags, nTriggers)
+        if dense:
+            return self.pixel_map(r)
         pixels = list()
         for p in r:
             px = Pixel()
@@ -663,9 +1129,14 @@ cdef class PyPxarCore:
             pixels.append(px)
         return pixels
 
-    def getEfficiencyMap(self, int flags, int nTriggers):
+    @synchronized
+    def getEfficiencyMap(self, int flags, int nTriggers, dense = False):
+        """ dense = True returns a (n_rocs, 52, 80) numpy array with the values and a mask of the pixels which did not report anything """
         cdef vector[pixel] r
-        r = self.thisptr.getEfficiencyMap(flags, nTriggers)
+        with nogil:
+            r = self.thisptr.getEfficiencyMap(flags, nTriggers)
+        if dense:
+            return self.pixel_map(r)
         pixels = list()
         for p in r:
             px = Pixel()
@@ -673,9 +1144,14 @@ cdef class PyPxarCore:
             pixels.append(px)
         return pixels
 
-    def getThresholdMap(self, string dacName, uint8_t dacStep, uint8_t dacMin, uint8_t dacMax, uint8_t threshold, int flags, int nTriggers):
+    @synchronized
+    def getThresholdMap(self, string dacName, uint8_t dacStep, uint8_t dacMin, uint8_t dacMax, uint8_t threshold, int flags, int nTriggers, dense = False):
+        """ dense = True returns a (n_rocs, 52, 80) numpy array with the values and a mask of the pixels which did not report anything """
         cdef vector[pixel] r
-        r = self.thisptr.getThresholdMap(dacName, dacStep, dacMin, dacMax, threshold, flags, nTriggers)
+        with nogil:
+            r = self.thisptr.getThresholdMap(dacName, dacStep, dacMin, dacMax, threshold, flags, nTriggers)
+        if dense:
+            return self.pixel_map(r)
         pixels = list()
         for p in r:
             px = Pixel()
@@ -683,52 +1159,73 @@ cdef class PyPxarCore:
             pixels.append(px)
         return pixels
 
+    @synchronized
     def setExternalClock(self, bool enable):
         return self.thisptr.setExternalClock(enable)
 
+    @synchronized
     def setClockStretch(self, uint8_t src, uint16_t delay, uint16_t width):
         self.thisptr.setClockStretch(src, delay, width)
 
+    @synchronized
     def setSignalMode(self, string signal, string mode, uint8_t speed):
         self.thisptr.setSignalMode(signal, mode, speed)
 
+    @synchronized
     def daqStart(self, flags = None):
-        if flags is not None:
-            return self.thisptr.daqStart(flags)
-        else:
-            return self.thisptr.daqStart(0)
+        cdef uint16_t f = flags if flags is not None else 0
+        cdef bool r
+        with nogil:
+            r = self.thisptr.daqStart(f)
+        return r
 
+    @synchronized
     def daqStatus(self):
         return self.thisptr.daqStatus()
 
+    @synchronized
     def daqClear(self):
         self.thisptr.daqClear()
 
+    @synchronized
     def daqTriggerSource(self, string source, uint32_t period = 0):
         return self.thisptr.daqTriggerSource(source, period)
 
+    @synchronized
     def daqSingleSignal(self, string signal):
         return self.thisptr.daqSingleSignal(signal)
 
+    @synchronized
     def daqTrigger(self, uint32_t nTrig, uint16_t period = 0):
-        self.thisptr.daqTrigger(nTrig,period)
+        with nogil:
+            self.thisptr.daqTrigger(nTrig,period)
 
+    @synchronized
     def daqTriggerLoop(self, uint16_t period):
-        self.thisptr.daqTriggerLoop(period)
+        """ starts the trigger loop of the pattern generator and returns the period in clock cycles actually used (0 if the DAQ is not running) """
+        cdef uint16_t r
+        with nogil:
+            r = self.thisptr.daqTriggerLoop(period)
+        return r
 
+    @synchronized
     def daqTriggerLoopHalt(self):
         self.thisptr.daqTriggerLoopHalt()
 
+    @synchronized
     def daqGetEvent(self):
         cdef Event r
-        r = self.thisptr.daqGetEvent()
+        with nogil:
+            r = self.thisptr.daqGetEvent()
         p = PxEvent()
         p.clone(r)
         return p
 
+    @synchronized
     def daqGetEventBuffer(self):
         cdef vector[Event] r
-        r = self.thisptr.daqGetEventBuffer()
+        with nogil:
+            r = self.thisptr.daqGetEventBuffer()
         pixelevents = list()
         for event in r:
             p = PxEvent()
@@ -736,37 +1233,108 @@ cdef class PyPxarCore:
             pixelevents.append(p)
         return pixelevents
 
+    def iterEvents(self, int batch_size = 1000, timeout = None, double min_wait = .001, double max_wait = .1, bool arrays = False, bool headers = False):
+        """ Generator yielding lists of at most [batch_size] PxEvents as they arrive in the DAQ buffer.
+        While the buffer is empty it sleeps, doubling the waiting time from [min_wait] up to [max_wait] seconds.
+        The iteration stops if no event arrived for [timeout] seconds, never if timeout is None.
+        arrays = True yields the whole buffer in the columnar form of daqGetEventBufferArrays(headers) instead.
+        """
+        wait, t_last = min_wait, time()
+        while True:
+            events = self.event_batch(arrays, headers)
+            if events is not None:
+                wait, t_last = min_wait, time()
+                if arrays:
+                    yield events
+                    continue
+                for i in xrange(0, len(events), batch_size):
+                    yield events[i:i + batch_size]
+            elif timeout is not None and time() - t_last > timeout:
+                return
+            else:
+                sleep(wait)
+                wait = min(2 * wait, max_wait)
+
+    @synchronized
+    def daqGetEventBufferArrays(self, headers = False):
+        """ Returns the event buffer in columnar form without creating any PxEvent:
+        a dictionary with the numpy arrays 'roc', 'column', 'row' and 'value' of all pixels
+        and the 'offsets' array, such that event i holds the pixels [offsets[i]:offsets[i + 1]]
+        headers = True adds the (n_events, n_cores) arrays 'header' and 'trailer' with their decoded fields
+        (e.g. 'trigger_count', 'trigger_phase', 'stack_count', 'pkam_reset'), the (n_events, n_rocs) ROC error flags
+        (e.g. 'roc_readback', 'no_data') and the pixel error flags (e.g. 'invalid_address').
+        The matrices are padded, 'n_header', 'n_trailer', 'n_roc_readback', ... hold the number of real entries of every event.
+        """
+        cdef vector[Event] r
+        with nogil:
+            r = self.thisptr.daqGetEventBuffer()
+        data = event_arrays(r)
+        if headers:
+            data.update(event_header_arrays(r))
+        return data
+
+    @synchronized
     def daqGetRawEvent(self):
         cdef rawEvent r
         hits = []
-        r = self.thisptr.daqGetRawEvent()
+        with nogil:
+            r = self.thisptr.daqGetRawEvent()
         for i in range(r.data.size()):
             hits.append(r.data[i])
         return hits
 
+    @synchronized
     def daqGetBuffer(self):
         cdef vector[uint16_t] r
-        r = self.thisptr.daqGetBuffer()
+        with nogil:
+            r = self.thisptr.daqGetBuffer()
         return r
 
+    @synchronized
     def daqGetRawEventBuffer(self):
         # Since we're just returning the 16bit ints as rawEvent in python,
         # this is the same as dqGetBuffer:
         return self.thisptr.daqGetBuffer()
 
+    @synchronized
+    def daqGetBufferArray(self):
+        """ Returns the full raw DTB buffer as a uint16 numpy array which takes over the memory of the C++ vector """
+        cdef vector[uint16_t] r
+        with nogil:
+            r = self.thisptr.daqGetBuffer()
+        return words_array(r)
+
+    @synchronized
+    def daqGetRawEventBufferArrays(self):
+        """ Returns the raw event buffer as a uint16 numpy array of all words
+        and the 'offsets' array, such that event i holds the words [offsets[i]:offsets[i + 1]]
+        """
+        cdef vector[rawEvent] r
+        with nogil:
+            r = self.thisptr.daqGetRawEventBuffer()
+        return raw_event_arrays(r)
+
+    @synchronized
     def daqGetReadback(self):
         cdef vector[vector[uint16_t]] r
-        r = self.thisptr.daqGetReadback()
+        with nogil:
+            r = self.thisptr.daqGetReadback()
         return r
 
+    @synchronized
     def daqGetXORsum(self, uint8_t channel):
         cdef vector[uint8_t] r
         r = self.thisptr.daqGetXORsum(channel)
         return r
 
+    @synchronized
     def daqStop(self):
-        return self.thisptr.daqStop()
+        cdef bool r
+        with nogil:
+            r = self.thisptr.daqStop()
+        return r
 
+    @synchronized
     def getStatistics(self):
         cdef statistics r
         r = self.thisptr.getStatistics()
@@ -774,9 +1342,11 @@ cdef class PyPxarCore:
         s.c_clone(r)
         return s
 
+    @synchronized
     def setReportingLevel(self, string logLevel):
         self.thisptr.setReportingLevel(logLevel)
 
+    @synchronized
     def getReportingLevel(self):
         return self.thisptr.getReportingLevel()
 
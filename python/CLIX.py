@@ -9,8 +9,16 @@ path.insert(1, join(pxar_dir, 'lib'))
 path.insert(1, join(pxar_dir, 'python', 'src'))
 
 from utils import *
-from numpy import zeros, array, mean, arange
+from numpy import zeros, array, mean, arange, where, add, nan_to_num, isnan
 from pxar_helpers import *  # arity decorator, PxarStartup, PxarConfigFile, PxarParametersFile and others
+from acquisition import Acquisition
+from event_ring import HitAggregator
+from rate_meter import RateMeter
+from trigger_scheduler import TriggerScheduler
+from vcal_sweep import VcalSweep
+from threshold_finder import ThresholdFinder
+from timing_scan import clock_delays
+from yield_scan import YieldScan
 
 gui_available = has_root()
 if gui_available:
@@ -98,22 +106,18 @@ class PxarCoreCmd(cmd.Cmd):
         c = TCanvas('c', 'c', 1000, 1000)
         c.SetRightMargin(.12)
 
+        roc, col, row, value = pixel_arrays(data, self.api.getRocI2Caddr())
         # Find number of ROCs present:
-        module = False
-        for px in data:
-            if px.roc > 0:
-                module = True
-                break
+        module = any(roc > 0)
         # Prepare new numpy matrix:
         d = zeros((417 if module else 52, 161 if module else 80))
-        for px in data:
-            xoffset = 52 * (px.roc % 8) if module else 0
-            yoffset = 80 * int(px.roc / 8) if module else 0
-            # Flip the ROCs upside down:
-            y = (px.row + yoffset) if (px.roc < 8) else (2 * yoffset - px.row - 1)
-            # Reverse order of the upper ROC row:
-            x = (px.column + xoffset) if (px.roc < 8) else (415 - xoffset - px.column)
-            d[x][y] += 1 if count else px.value
+        xoffset = 52 * (roc % 8) if module else 0
+        yoffset = 80 * (roc / 8) if module else 0
+        # Flip the ROCs upside down:
+        y = where(roc < 8, row + yoffset, 2 * yoffset - row - 1)
+        # Reverse order of the upper ROC row:
+        x = where(roc < 8, col + xoffset, 415 - xoffset - col)
+        add.at(d, (x, y), 1 if count else value)
 
         plot = Plotter.create_th2(d, 0, 417 if module else 52, 0, 161 if module else 80, name, 'pixels x', 'pixels y', name)
         if no_stats:
@@ -138,16 +142,10 @@ class PxarCoreCmd(cmd.Cmd):
 
     def plot_1d(self, data, name, dacname, min_val, max_val):
         if not self.window:
-            print_data(self.fullOutput, data, (max_val - min_val) / len(data))
+            print_data(self.fullOutput, data)
             return
 
-        # Prepare new numpy matrix:
-        d = zeros(len(data))
-        for idac, dac in enumerate(data):
-            if dac:
-                d[idac] = dac[0].value
-
-        plot = Plotter.create_th1(d, min_val, max_val, name, dacname, name)
+        plot = Plotter.create_th1(first_pixel(data[0]), min_val, max_val, name, dacname, name)
         self.window.histos.append(plot)
         self.window.update()
 
@@ -164,18 +162,7 @@ class PxarCoreCmd(cmd.Cmd):
         c = TCanvas('c', 'c', 1000, 1000)
         c.SetRightMargin(.12)
 
-        # Prepare new numpy matrix:
-        bins1 = (max1 - min1) / step1 + 1
-        bins2 = (max2 - min2) / step2 + 1
-        d = zeros((bins1, bins2))
-
-        for idac, dac in enumerate(data):
-            if dac:
-                bin1 = (idac / ((max2 - min2) / step2 + 1))
-                bin2 = (idac % ((max2 - min2) / step2 + 1))
-                d[bin1][bin2] = dac[0].value
-
-        plot = Plotter.create_th2(d, min1, max1, min2, max2, name, dac1, dac2, 'Efficiency')
+        plot = Plotter.create_th2(first_pixel(data[0]), min1, max1, min2, max2, name, dac1, dac2, 'Efficiency')
         plot.Draw('COLZ')
         plot.SetStats(0)
         self.window = c
@@ -284,12 +271,15 @@ class PxarCoreCmd(cmd.Cmd):
         self.api.daqStop()
         return plotdata
 
+    def set_tb_delays(self, dic):
+        # updates the testboard delays in [dic] and writes all delays at once (setTestboardDelays replaces the stored delays)
+        delays = self.api.getTestboardDelays()
+        delays.update(dic)
+        self.api.setTestboardDelays(delays)
+
     def set_clock(self, value):
         # sets all the delays to the right value if you want to change clk
-        self.api.setTestboardDelays({"clk": value})
-        self.api.setTestboardDelays({"ctr": value})
-        self.api.setTestboardDelays({"sda": value + 11})
-        self.api.setTestboardDelays({"tin": value + 2})
+        self.set_tb_delays(clock_delays(value, digital=False))
 
     def get_address_levels(self):
         event = self.daq_converted_raw(verbose=False)
@@ -334,26 +324,20 @@ class PxarCoreCmd(cmd.Cmd):
         self.api.daqStop()
 
     def rate(self, duration):
+        meter = RateMeter()
         self.api.daqStart()
         t = time()
-        t1 = 0
-        all_trig = 0
-        while t1 < duration:
-            trig_time = time()
-            triggers = 0
-            while triggers < 5:
-                try:
-                    self.api.daqGetEvent()
-                    triggers += 1
-                    all_trig += 1
-                except RuntimeError:
-                    pass
-            print '\r{0:02.2f}'.format(triggers / (time() - trig_time)),
-            sys.stdout.flush()
-            t1 = time() - t
-        print "complete rate", '{0:02.2f}'.format(all_trig / (time() - t))
-        # print time.time()-t
+        while time() - t < duration:
+            for events in self.api.iterEvents(batch_size=5, timeout=.1):  # returns after .1 s without events to check the duration
+                meter.add(len(events))
+                if time() - t > duration:
+                    break
+                print '\r{}'.format(meter.format()),
+                sys.stdout.flush()
+        print
+        meter.print_rates()
         self.api.daqStop()
+        return meter
 
     def enable_pix(self, row=5, col=12, roc=0):
         self.api.testAllPixels(0)
@@ -365,21 +349,6 @@ class PxarCoreCmd(cmd.Cmd):
         self.api.testAllPixels(1) if roc is None else self.api.testAllPixels(1, roc)
         self.api.maskAllPixels(0) if roc is None else self.api.maskAllPixels(0, roc)
 
-    def vcal_scan(self, vec_ph, average, loops, start=0):
-        for vcal in range(256):
-            self.api.setDAC("vcal", vcal)
-            sum_ph = zeros(80)
-            for i in range(average):
-                self.api.daqTrigger(1, 500)
-                data = self.api.daqGetEvent()
-                for j in range(loops):
-                    if len(data.pixels) > j:
-                        row = data.pixels[i].row
-                        sum_ph[row] += data.pixels[i].value
-            sum_ph /= average
-            for row in range(start, loops + start):
-                vec_ph[row].append(sum_ph[row])
-
     def scan_vcal(self, ctrl_reg, ntrig=10):
         self.api.setDAC('ctrlreg', ctrl_reg)
         for vcal in xrange(0, 256):
@@ -406,26 +375,6 @@ class PxarCoreCmd(cmd.Cmd):
         print xmin
         return xmin
 
-    def trim_ver(self, vec_trim, ntrig, start=0, loops=40):
-        for vcal in range(256):
-            self.api.setDAC('vcal', vcal)
-            ph_ver = zeros(80)
-            for i in range(ntrig):
-                self.api.daqTrigger(1, 500)
-                data = self.api.daqGetEvent()
-                for pix in data.pixels:
-                    ph_ver[pix.row] += 1
-            # stop loop if all thresholds are found
-            found_values = True
-            for row in range(start, loops + start):
-                if int(ph_ver[row]) == ntrig and vec_trim[row + 1] == 0:
-                    vec_trim[row + 1] = vcal
-            for row in range(start, loops + start):
-                if vec_trim[row + 1] == 0:
-                    found_values = False
-            if found_values:
-                break
-
     def print_activated(self, roc=None):
         active = self.api.getNEnabledPixels() if roc is None else self.api.getNEnabledPixels(roc)
         masked = self.api.getNMaskedPixels() if roc is None else self.api.getNMaskedPixels(roc)
@@ -445,25 +394,29 @@ class PxarCoreCmd(cmd.Cmd):
 
     # endregion
 
-    @arity(0, 2, [int, float])
-    def do_trigger_loop(self, rate=10, duration=1):
-        """ do_triggerLoop [rate] [duration]: sends triggers with rate for duration"""
+    def run_triggers(self, rate, duration):
+        """ sends triggers with [rate] Hz for [duration] minutes using the trigger scheduler and shows the remaining time """
         self.api.daqStart()
-        triggers = int(60 * duration) * rate
-        print "number of triggers:", triggers
-        for i in range(triggers):
-            self.api.daqTrigger(1, 500)
-            sleep(float(1) / rate)
-            #            print self.convertedRaw()
-            #            print "", '\r{0:4.2f}%'.format(100*(float(i)/nTrig)), "\r",
-            sec = (triggers - i) / float(rate) % 60
-            min_val = (triggers - i) / rate / 60
-            print "", '\r{0:02d}:'.format(min_val), '\b{0:02d}:'.format(int(sec)), '\b{0:02.0f}'.format(
-                100 * (sec - int(sec))),
+        print "number of triggers:", int(60 * duration * rate)
+        trigger = TriggerScheduler(self.api, rate)
+        trigger.start()
+        t_end = trigger.StartTime + 60 * duration
+        while time() < t_end:
+            remaining = t_end - time()
+            sec = remaining % 60
+            print "", '\r{0:02d}:'.format(int(remaining) / 60), '\b{0:02d}:'.format(int(sec)), '\b{0:02.0f}'.format(100 * (sec - int(sec))),
             sys.stdout.flush()
+            sleep(.1)
+        trigger.stop()
         print
+        trigger.print_stats()
         self.api.daqStop()
 
+    @arity(0, 2, [int, float])
+    def do_trigger_loop(self, rate=10, duration=1):
+        """ do_triggerLoop [rate] [duration]: sends triggers with rate for duration"""
+        self.run_triggers(rate, duration)
+
     def complete_trigger_loop(self):
         return [self.do_trigger_loop.__doc__, '']
 
@@ -472,21 +425,7 @@ class PxarCoreCmd(cmd.Cmd):
     @arity(0, 2, [int, float])
     def do_test_loop(self, rate=100, duration=1):
         """ do_triggerLoop [rate] [duration]: sends triggers with rate for duration"""
-        self.api.daqStart()
-        triggers = int(60 * duration) * rate
-        print "number of triggers:", triggers
-        for i in range(triggers):
-            t = time()
-            self.api.daqTrigger(1, 500)
-            sec = (triggers - i) / float(rate) % 60
-            min_val = (triggers - i) / rate / 60
-            print "", '\r{0:02d}:'.format(min_val), '\b{0:02d}:'.format(int(sec)), '\b{0:02.0f}'.format(
-                100 * (sec - int(sec))),
-            sys.stdout.flush()
-            while time() - t < 1. / rate:
-                sleep(.01)
-        print
-        self.api.daqStop()
+        self.run_triggers(rate, duration)
 
     def complete_test_loop(self):
         return [self.do_test_loop.__doc__, '']
@@ -597,7 +536,7 @@ class PxarCoreCmd(cmd.Cmd):
     def print_eff(self, data, n_trig):
         unmasked = 4160 - self.api.getNMaskedPixels()
         active = self.api.getNEnabledPixels()
-        read_back = sum(px.value for px in data)
+        read_back = pixel_arrays(data)[3].sum()
         total = n_trig * (unmasked if unmasked < active else active)
         eff = 100. * read_back / total
         print 'Efficiency: {eff:6.2f}% ({rb:5d}/{tot:5d})'.format(eff=eff, rb=int(read_back), tot=total)
@@ -607,7 +546,7 @@ class PxarCoreCmd(cmd.Cmd):
         for roc in xrange(self.api.getNEnabledRocs()):
             self.api.testAllPixels(0)
             self.api.testPixel(14, 14, 1, roc)
-            data = self.api.getEfficiencyVsDACDAC(dac1name, dac1step, dac1min, dac1max, dac2name, dac2step, dac2min, dac2max, flags, n_triggers)
+            data = self.api.getEfficiencyVsDACDAC(dac1name, dac1step, dac1min, dac1max, dac2name, dac2step, dac2min, dac2max, flags, n_triggers, dense=True)
             name = '{dac1} vs {dac2} Scan for ROC {roc}'.format(dac1=dac1name.title(), dac2=dac2name.title(), roc=roc)
             self.plot_2d(data, name, dac1name, dac1step, dac1min, dac1max, dac2name, dac2step, dac2min, dac2max)
             self.enable_all(roc)
@@ -1006,7 +945,7 @@ class PxarCoreCmd(cmd.Cmd):
     def do_getEfficiencyMap(self, flags=0, nTriggers=10):
         """getEfficiencyMap [flags = 0] [nTriggers = 10]: returns the efficiency map"""
         # self.window = PxarGui(gClient.GetRoot(), 1000, 800)
-        data = self.api.getEfficiencyMap(flags, nTriggers)
+        data = self.api.getEfficiencyMap(flags, nTriggers, dense=True)
         self.print_eff(data, nTriggers)
         self.plot_map(data, "Efficiency", no_stats=True)
 
@@ -1019,7 +958,7 @@ class PxarCoreCmd(cmd.Cmd):
         """getPulseheightMap [flags = 0] [nTriggers = 10]: returns the Pulseheight map"""
         # self.window = PxarGui(gClient.GetRoot(), 1000, 800)
         gStyle.SetPalette(55)
-        data = self.api.getPulseheightMap(flags, nTriggers)
+        data = self.api.getPulseheightMap(flags, nTriggers, dense=True)
         self.print_eff(data, nTriggers)
         self.plot_map(data, "Pulseheight", no_stats=True)
 
@@ -1030,7 +969,7 @@ class PxarCoreCmd(cmd.Cmd):
     @arity(0, 2, [int, int])
     def do_getXPixelAlive(self, nTriggers=50):
         """getxPixelAlive [flags = 0] [nTriggers = 10]: returns the efficiency map"""
-        data = self.api.getEfficiencyMap(896, nTriggers)
+        data = self.api.getEfficiencyMap(896, nTriggers, dense=True)
         self.print_eff(data, nTriggers)
         self.plot_map(data, "Efficiency", no_stats=True)
 
@@ -1041,7 +980,7 @@ class PxarCoreCmd(cmd.Cmd):
     @arity(0, 6, [str, int, int, int, int, int])
     def do_getPulseheightVsDAC(self, dacname="vcal", dacstep=1, dacmin=0, dacmax=255, flags=0, nTriggers=10):
         """getPulseheightVsDAC [DAC name] [step size] [min] [max] [flags = 0] [nTriggers = 10]: returns the pulseheight over a 1D DAC scan"""
-        data = self.api.getPulseheightVsDAC(dacname, dacstep, dacmin, dacmax, flags, nTriggers)
+        data = self.api.getPulseheightVsDAC(dacname, dacstep, dacmin, dacmax, flags, nTriggers, dense=True)
         self.plot_1d(data, "Pulseheight", dacname, dacmin, dacmax)
 
     def complete_getPulseheightVsDAC(self, text, line, start_index, end_index):
@@ -1547,7 +1486,7 @@ class PxarCoreCmd(cmd.Cmd):
             if delay == 'all':
                 self.set_clock(value)
             else:
-                self.api.setTestboardDelays({delay: value})
+                self.set_tb_delays({delay: value})
             self.api.daqStart()
             self.api.daqTrigger(1, 500)
             sleep(0.1)
@@ -2032,7 +1971,7 @@ class PxarCoreCmd(cmd.Cmd):
     @arity(0, 3, [int, int, int])
     def do_wbcScan(self, min_wbc=90, max_triggers=50, max_wbc=130):
         """do_wbcScan [minimal WBC] [number of events] [maximal WBC]: \n
-        sets wbc from minWBC until it finds the wbc which has more than 90% filled events or it reaches maxWBC \n
+        sets wbc from minWBC until the yield peak of every ROC is resolved or it reaches maxWBC. Each ROC keeps the wbc of its peak \n
         (default [90] [100] [130])"""
 
         # prepararations
@@ -2042,57 +1981,12 @@ class PxarCoreCmd(cmd.Cmd):
         self.api.daqTriggerSource('extern')
         self.api.daqStart()
 
-        trigger_phases = zeros(10)
-        yields = OrderedDict([(roc, {wbc: 0 for wbc in xrange(min_wbc, max_wbc)}) for roc in xrange(self.api.getNEnabledRocs())])
-        set_dacs = {roc: False for roc in yields}
-        print '\nROC EVENT YIELDS:\n  wbc\t{r}'.format(r='\t'.join(('roc' + str(yld)).rjust(6) for yld in yields.keys()))
-
-        # loop over wbc
-        for wbc in xrange(min_wbc, max_wbc):
-            self.clear_buffer()
-            self.api.setDAC('wbc', wbc)
-
-            # loop until you find nTriggers
-            n_triggers = 0
-            while n_triggers < max_triggers:
-                try:
-                    data = self.api.daqGetEvent()
-                    trigger_phases[data.triggerPhases[0]] += 1
-                    for roc in set([pix.roc for pix in data.pixels]):
-                        yields[roc][wbc] += 1. * 100. / max_triggers
-                    n_triggers += 1
-                except RuntimeError:
-                    pass
-            y_strings = ['{y:5.1f}%'.format(y=yld) for yld in [yields[roc][wbc] for roc in yields.iterkeys()]]
-            print '  {w:03d}\t{y}'.format(w=wbc, y='\t'.join(y_strings))
-
-            # stopping criterion
-            best_wbc = max_wbc
-            if wbc > min_wbc + 3:
-                for roc, ylds in yields.iteritems():
-                    if any(yld > 10 for yld in ylds.values()[:wbc - min_wbc - 2]):
-                        best_wbc = ylds.keys()[ylds.values().index(max(ylds.values()))]
-                        print 'set wbc of roc {i} to {v}'.format(i=roc, v=best_wbc)
-                        self.api.setDAC('wbc', best_wbc, roc)
-                        set_dacs[roc] = True
-                if all(set_dacs.itervalues()):
-                    print 'found all wbcs'
-
-                    for roc, dic in yields.iteritems():
-                        keys = dic.keys()
-                        for key in keys:
-                            if key >= best_wbc + 4:
-                                yields[roc].pop(key)
-                    break
+        scan = YieldScan(self.api, lambda wbc, roc: self.api.setDAC('wbc', wbc, roc), xrange(min_wbc, max_wbc), max_triggers)
+        scan.run()
         self.api.daqStop()
-
-        # triggerphase
-
-        print '\nTRIGGER PHASE:'
-        for i, trigger_phase in enumerate(trigger_phases):
-            if trigger_phase:
-                percentage = trigger_phase * 100 / sum(trigger_phases)
-                print '{i}\t{d} {v:2.1f}%'.format(i=i, d=int(round(percentage)) * '|', v=percentage)
+        scan.print_trigger_phases()
+        measured = scan.get_yields()
+        yields = OrderedDict((roc, OrderedDict((wbc, ylds[roc]) for wbc, ylds in measured.iteritems() if not isnan(ylds[roc]))) for roc in xrange(scan.NRocs))
 
         # plot wbc_scan
         mg = TMultiGraph('mg_wbc', 'WBC Scans for all ROCs')
@@ -2116,38 +2010,12 @@ class PxarCoreCmd(cmd.Cmd):
 
         self.api.testAllPixels(0, None)
         self.api.HVon()
-
-        latencyScan = []
-        print "latency \tyield"
-
-        # loop over latency
-        for latency in range(minlatency, maxlatency):
-            delay = {}
-            delay["triggerlatency"] = latency
-            self.api.setTestboardDelays(delay)
-            self.api.daqTriggerSource(triggersignal)
-            self.api.daqStart()
-            nHits = 0
-            nTriggers = 0
-
-            # loop until you find maxTriggers
-            while nTriggers < triggers:
-                try:
-                    data = self.api.daqGetEvent()
-                    if len(data.pixels) > 0:
-                        rocs = []
-                        for i in range(len(data.pixels)):
-                            rocs.append(data.pixels[i].roc)
-                        if 1 in rocs and 2 in rocs:
-                            nHits += 1
-                    nTriggers += 1
-                except RuntimeError:
-                    pass
-
-            hitYield = 100 * nHits / triggers
-            latencyScan.append(hitYield)
-            print '{0:03d}'.format(latency), "\t", '{0:3.0f}%'.format(hitYield)
-            self.api.daqStop()
+        self.api.daqTriggerSource(triggersignal)
+        self.api.daqStart()
+        scan = YieldScan(self.api, lambda latency, roc: self.set_tb_delays({'triggerlatency': latency}), xrange(minlatency, maxlatency), triggers, per_roc=False)
+        scan.run()
+        self.api.daqStop()
+        latencyScan = [y[0] for y in scan.get_yields(coincidence=True).itervalues()]
 
         if (self.window):
             self.window = PxarGui(gClient.GetRoot(), 1000, 800)
@@ -2219,7 +2087,7 @@ class PxarCoreCmd(cmd.Cmd):
         self.api.testPixel(15, 59, 1)
         t = time()
         for delay in range(min_value, max_value):
-            self.api.setTestboardDelays({name: delay})
+            self.set_tb_delays({name: delay})
             sleep(1)
             i = 0
             self.api.setDAC("vana", 70 + i)
@@ -2304,57 +2172,38 @@ class PxarCoreCmd(cmd.Cmd):
         self.api.daqTriggerSource('extern')
         self.api.setDAC('wbc', 93)
         self.api.HVon()
-        windowsize = 100
         t = time()
         self.api.daqStart()
 
+        events = (event for batch in self.api.iterEvents() for event in batch)
+
         # check if module is True
         module = True
-        while True:
-            try:
-                data = self.api.daqGetEvent().pixels
-                if len(data) > 0:
-                    if data[0].roc == 0:
-                        module = False
-                break
-            except RuntimeError:
-                pass
+        data = next(events).pixels
+        if len(data) > 0:
+            if data[0].roc == 0:
+                module = False
 
         d = zeros((417 if module else 53, 161 if module else 81))
         triggers = 0
-        t1 = time()
-        before = None
-        mean = None
-        t2 = time()
+        meter = RateMeter(window=10)
         while triggers < max_triggers:
-            print "\r#events:", '{0:06d}'.format(triggers),
-            if triggers < windowsize:
-                mean = triggers / (time() - t1)
-                print 'rate: {0:03.0f} Hz'.format(mean),
-                if triggers == 90:
-                    t2 = time()
-            elif triggers > before and triggers % 10 == 0:
-                mean = float(windowsize - 5) / windowsize * mean + float(windowsize - 95) / windowsize * 10 / (
-                        time() - t2)
-                print 'rate: {0:03.0f} Hz'.format(mean),
-                t2 = time()
-            sys.stdout.flush()
-            before = triggers
-            try:
-                data = self.api.daqGetEvent()
-                if len(data.pixels) > 1:
-                    triggers += 1
-                    for i in range(len(data.pixels) - 1):
-                        px = data.pixels[i]
-                        xoffset = 52 * (px.roc % 8) if module else 0
-                        yoffset = 80 * int(px.roc / 8) if module else 0
-                        # Flip the ROCs upside down:
-                        y = (px.row + yoffset) if (px.roc < 8) else (2 * yoffset - px.row - 1)
-                        # Reverse order of the upper ROC row:
-                        x = (px.column + xoffset) if (px.roc < 8) else (415 - xoffset - px.column)
-                        d[x + 1][y + 1] += 1 if True else px.value
-            except RuntimeError:
-                pass
+            if triggers % 10 == 0:
+                print '\r#events: {0:06d} rate: {1:03.0f} Hz'.format(triggers, meter.get_windowed()[0]),
+                sys.stdout.flush()
+            data = next(events)
+            if len(data.pixels) > 1:
+                triggers += 1
+                meter.add(1, len(data.pixels))
+                for i in range(len(data.pixels) - 1):
+                    px = data.pixels[i]
+                    xoffset = 52 * (px.roc % 8) if module else 0
+                    yoffset = 80 * int(px.roc / 8) if module else 0
+                    # Flip the ROCs upside down:
+                    y = (px.row + yoffset) if (px.roc < 8) else (2 * yoffset - px.row - 1)
+                    # Reverse order of the upper ROC row:
+                    x = (px.column + xoffset) if (px.roc < 8) else (415 - xoffset - px.column)
+                    d[x + 1][y + 1] += 1 if True else px.value
         self.api.daqStop()
 
         print "\ntest took: ", round(time() - t, 2), "s"
@@ -2384,125 +2233,43 @@ class PxarCoreCmd(cmd.Cmd):
 
     @arity(0, 3, [int, int, int])
     def do_trim_verification(self, a=0, b=52, ntrig=10):
+        """ do_trim_verification [a] [b] [ntrig]: finds the vcal thresholds of the columns [a, b) with a parallel bisection and plots them for the first ROC """
         start_time = time()
+        pixels = zeros(self.api.getEnableMap().shape, bool)
+        pixels[:, a:b] = True
+        self.api.setDAC('ctrlreg', 0)
+        finder = ThresholdFinder(self.api, ntrig)
+        thresholds = finder.run(pixels, PBar())
+        finder.print_stats(pixels.sum())
 
         vcal_thresh = zeros((53, 81))
-
-        for col in range(a, b):
-            # first half col
-            self.api.testAllPixels(0)
-            self.api.maskAllPixels(1)
-            for row in range(40):
-                self.api.testPixel(col, row, 1)
-                self.api.maskPixel(col, row, 0)
-            self.api.daqStart()
-            self.api.setDAC('ctrlreg', 0)
-            self.trim_ver(vcal_thresh[col + 1], ntrig)
-            for row in range(40):
-                print '\r', '{0:2.2f}%'.format((col + float(row) / 80) / float(52) * 100),
-                sys.stdout.flush()
-            self.api.daqStop()
-            # second half col
-            self.api.testAllPixels(0)
-            self.api.maskAllPixels(1)
-            for row in range(40, 80):
-                self.api.testPixel(col, row, 1)
-                self.api.maskPixel(col, row, 0)
-            self.api.daqStart()
-            self.api.setDAC('ctrlreg', 0)
-            self.trim_ver(vcal_thresh[col + 1], ntrig, 40)
-            for row in range(40, 80):
-                print '\r', '{0:2.2f}%'.format((col + float(row) / 80) / float(52) * 100),
-                sys.stdout.flush()
-            self.api.daqStop()
-
+        vcal_thresh[1:, 1:] = nan_to_num(thresholds[0])
         self.window = PxarGui(gClient.GetRoot(), 1000, 800)
         plot = Plotter.create_th2(vcal_thresh, 0, 52, 0, 80, 'trim verfication', 'col', 'row', 'thresh')
         self.window.histos.append(plot)
         self.window.update()
         self.elapsed_time(start_time)
 
-    @arity(0, 3, [int, str, int])
-    def do_ph_vs_vcal(self, average=10, name='ph.cal', do_plot=False):
+    @arity(0, 4, [int, str, int, int])
+    def do_ph_vs_vcal(self, average=10, name='phCalibration', do_plot=False, parallel=True):
+        """ do_ph_vs_vcal [average] [name] [do_plot] [parallel]: measures the pulse height vs. vcal in both ranges for all pixels and saves it to [name]_C[roc].dat
+            for phCalibrationFits (use --after2019). [parallel] scans all pixels with getPulseheightVsDAC, otherwise half columns are scanned with buffered triggers. """
         start_time = time()
-
-        f = open(name, 'w')
-
-        # create vectors
-        ph_y = []
-        vcal_high_x = []
-        vcal_low_x = []
-        for vcal in range(256):
-            vcal_high_x.append(vcal * 7)
-            vcal_low_x.append(vcal)
-        for col in range(52):
-            ph_y.append([])
-            for row in range(80):
-                ph_y[col].append([])
-
-        for col in range(52):
-            # first half col
-            self.api.testAllPixels(0)
-            self.api.maskAllPixels(1)
-            for row in range(40):
-                self.api.testPixel(col, row, 1)
-                self.api.maskPixel(col, row, 0)
-            self.api.daqStart()
-            self.api.setDAC('ctrlreg', 0)
-            self.vcal_scan(ph_y[col], average, 40)
-            self.api.setDAC('ctrlreg', 4)
-            self.vcal_scan(ph_y[col], average, 40)
-            for row in range(40):
-                print '\r', '{0:2.2f}%'.format((col + float(row) / 80) / float(52) * 100),
-                sys.stdout.flush()
-                f.write('Pix ' + str(col) + ' ' + str(row) + ' ')
-                for val in ph_y[0][row]:
-                    f.write(str(val) + ' ')
-                f.write('\n')
-            self.api.daqStop()
-            # second half col
-            self.api.testAllPixels(0)
-            self.api.maskAllPixels(1)
-            for row in range(40, 80):
-                self.api.testPixel(col, row, 1)
-                self.api.maskPixel(col, row, 0)
-            self.api.daqStart()
-            self.api.setDAC('ctrlreg', 0)
-            self.vcal_scan(ph_y[col], average, 40, 40)
-            self.api.setDAC('ctrlreg', 4)
-            self.vcal_scan(ph_y[col], average, 40, 40)
-            for row in range(40, 80):
-                print '\r', '{0:2.2f}%'.format((col + float(row) / 80) / float(52) * 100),
-                sys.stdout.flush()
-                f.write('Pix ' + str(col) + ' ' + str(row) + ' ')
-                for val in ph_y[0][row]:
-                    f.write(str(val) + ' ')
-                f.write('\n')
-            self.api.daqStop()
-        print
-        f.close()
+        sweep = VcalSweep(self.api, average)
+        sweep.run(parallel, PBar())
+        print 'Saved', ', '.join(sweep.save(name))
 
         if do_plot:
-            # plot ph vs vcal
-            # self.window = PxarGui(gClient.GetRoot(), 1000, 800)
-            plot = Plotter.create_tgraph(ph_y[0][20], "ph scan", "vcal", "ph", 0, vcal_high_x)
-            plot.SetMarkerSize(0.5)
-            plot.SetMarkerStyle(20)
-            plot2 = Plotter.create_tgraph(ph_y[0][40], "ph scan", "vcal", "ph", 0, vcal_high_x)
-            plot2.SetMarkerSize(0.5)
-            plot2.SetMarkerStyle(20)
-            plot2.SetMarkerColor(3)
+            plots = [Plotter.create_tgraph(sweep.PH[0, 0, row].tolist(), 'ph scan', 'vcal', 'ph', 0, sweep.get_vcals().tolist()) for row in [20, 40]]
             c1 = TCanvas('c1', 'c1', 800, 800)
-            c1.DrawFrame(0, 0, 1900, 200)
-            plot.Draw('P')
-            plot2.Draw('P')
+            c1.DrawFrame(0, 0, 1900, 256)
+            for i, plot in enumerate(plots):
+                plot.SetMarkerSize(0.5)
+                plot.SetMarkerStyle(20)
+                plot.SetMarkerColor(1 if not i else 3)
+                plot.Draw('P')
             c1.Update()
             raw_input()
-            # f1 = ROOT.TH1.pol1
-            # plot.Fit(fit, 'Q')
-            # self.window.histos.append(plot)
-            # self.window.histos.append(plot2)
-            # self.window.update()
         self.elapsed_time(start_time)
 
     def complete_ph_vs_vcal(self):
@@ -3075,7 +2842,7 @@ class PxarCoreCmd(cmd.Cmd):
         gr = TGraph()
         for i in xrange(n):
             self.mask_frame(i)
-            data = self.api.getEfficiencyMap(896, n_trig)
+            data = self.api.getEfficiencyMap(896, n_trig, dense=True)
             eff = self.print_eff(data, n_trig)
             unmasked = 4180 - self.api.getNMaskedPixels()
             gr.SetPoint(i, unmasked, eff)
@@ -3090,21 +2857,18 @@ class PxarCoreCmd(cmd.Cmd):
     @arity(0, 3, [float, int, int])
     def do_findErrors2(self, t=1, delay=25, n=10000):
         self.api.HVon()
-        t_start = time()
         self.set_pg(cal=False, res=False)
         self.api.daqStart()
+        hits = HitAggregator(self.api.getRocI2Caddr())
+        acq = Acquisition(self.api, arrays=True, idle=lambda: self.api.daqTrigger(n, 500))
+        acq.add_consumer('hits', hits.add)
         self.start_pbar(t * 600)
-        data = []
-        while time() - t_start < t * 60:
-            self.ProgressBar.update(int((time() - t_start) * 10) + 1)
-            self.api.daqTrigger(n, 500)
-            data += self.api.daqGetEventBuffer()
+        acq.run(t, pbar=self.ProgressBar)
         self.ProgressBar.finish()
         self.api.daqStop()
         self.api.HVoff()
         self.set_pg()
-        data = [pix for ev in data for pix in ev.pixels]
-        self.plot_map(data, 'Hit Map', count=True, no_stats=True)
+        self.plot_map(hits.get_hit_map(), 'Hit Map', no_stats=True)
         stats = self.api.getStatistics()
         event_rate = stats.valid_events / (2.5e-8 * stats.total_events / 8.)
         hit_rate = stats.valid_pixels / (2.5e-8 * stats.total_events / 8.)
@@ -3213,33 +2977,26 @@ class PxarCoreCmd(cmd.Cmd):
     @arity(0, 3, [float, int, int])
     def do_hitmap1(self, t=1, random_trigger=1, n=10000):
         self.api.HVon()
-        t_start = time()
         if random_trigger:
             self.setPG(cal=False, res=False, delay=20)
         else:
             self.api.daqTriggerSource('extern')
         self.api.daqStart()
+        hits = HitAggregator(self.api.getRocI2Caddr())
+        acq = Acquisition(self.api, arrays=True, idle=lambda: self.api.daqTrigger(n, 500) if random_trigger else sleep(.1))
+        acq.add_consumer('hits', hits.add)
         self.start_pbar(t * 600)
-        data = []
-        while time() - t_start < t * 60:
-            self.ProgressBar.update(int((time() - t_start) * 10) + 1)
-            if random_trigger:
-                self.api.daqTrigger(n, 500)
-            try:
-                sleep(.5)
-                data += self.api.daqGetEventBuffer()
-            except RuntimeError:
-                pass
+        acq.run(t, pbar=self.ProgressBar)
         self.ProgressBar.finish()
         self.api.daqStop()
         self.api.HVoff()
         self.setPG()
-        data = [pix for ev in data for pix in ev.pixels]
         h = TH1I('h', 'h', 512, -256, 256)
-        for pix in data:
-            h.Fill(pix.value)
+        for i, entries in enumerate(hits.get_ph_bins()[1], 1):
+            h.SetBinContent(i, entries)
+        h.SetEntries(hits.NHits)
         self.plot_graph(h, draw_opt='')
-        self.plot_map(data, 'Hit Map', count=True, no_stats=True)
+        self.plot_map(hits.get_hit_map(), 'Hit Map', no_stats=True)
         stats = self.api.getStatistics()
         event_rate = stats.valid_events / (2.5e-8 * stats.total_events / 8.)
         hit_rate = stats.valid_pixels / (2.5e-8 * stats.total_events / 8.)
@@ -14,14 +14,19 @@ path.insert(1, join(pxar_dir, 'lib'))
 path.insert(1, join(pxar_dir, 'python', 'src'))
 
 from argparse import ArgumentParser
-from numpy import delete, sign, argmax, genfromtxt, argsort
+from numpy import delete, argmax, genfromtxt, argsort, diff, split, meshgrid, arange, full, nanmax, nan, isnan
 from numpy.random import randint
 from time import sleep
 from pxar_helpers import *
 from TreeWriterLjubljana import TreeWriterLjubljana
 from hdf5_writer import HDF5Writer
+from acquisition import Acquisition
+from trigger_scheduler import TriggerScheduler
+from threshold_finder import ThresholdFinder
+from vana_tuner import VanaTuner
+from timing_scan import TimingScan, clock_delays
+from yield_scan import YieldScan
 from json import dumps
-from threading import Thread
 import atexit
 from draw import *
 import signal
@@ -46,8 +51,7 @@ prog_name = basename(argv.pop(0))
 
 def ex():
     if z is not None:
-        z.IsRunning = False
-        sleep(.5)
+        z.data_loop(status=OFF)
         z.api.HVoff()
     print 'Bye ...'
 
@@ -77,6 +81,7 @@ class CLIX:
         self.Draw = Draw()
         self.PBar = PBar()
         self.IsRunning = False
+        self.Trigger = None
 
         self.get_ia()
 
@@ -114,6 +119,11 @@ class CLIX:
         event = self.remove_tbm_info(event)
         return self.expand_sign(event) if self.IsAnalogue else event
 
+    def convert_raw_words(self, words):
+        """Vectorised version of convert_raw_event for numpy arrays of raw words."""
+        words = (words & 0x0fff).astype('i2')
+        return words - ((words & 0x0800) << 1) if self.IsAnalogue else words
+
     @staticmethod
     def decode_header(num):
         bin_str = bin(num)[2:]
@@ -308,14 +318,10 @@ class CLIX:
         except RuntimeError:
             return
 
-    def update_time(self, t_start, t_max, n, n_max):
-        t = time() - t_start
-        if t - self.PBar.LastUpdate > .1:
-            self.PBar.update(int(t * 10) if n_max is None else n)
-            self.PBar.LastUpdate = t
-        return t < t_max * 60 if n_max is None else n < n_max
-
-    def take_data(self, wbc, t, n=None, random_trig=False):
+    def take_data(self, wbc, t, n=None, random_trig=False, consumers=None, arrays=False):
+        """ takes data for [t] minutes or [n] events. The readout runs in its own thread and passes the events to the [consumers] (dict of name: function),
+            which run concurrently. Without consumers all events are returned.
+            :param arrays: pass the batches as columnar arrays with the TBM headers instead of lists of PxEvents """
         self.api.HVon()
         if random_trig:
             self.set_pg(cal=False, res=False, delay=20)
@@ -323,33 +329,33 @@ class CLIX:
             self.signal_probe('a1', 'sdata2')
             self.set_dac('wbc', wbc)
             self.api.daqTriggerSource('extern')
-        self.PBar.start(t * 600 if n is None else n)
+
+        def idle():
+            self.daq_trigger(10000) if random_trig else do_nothing()
+            self.set_dac('wbc', wbc)  # resets the ROC ... lazy solution
+        acq = Acquisition(self.api, arrays=arrays, headers=arrays, idle=idle)
         data = []
+        for name, function in (consumers if consumers is not None else {'collector': data.extend}).iteritems():
+            acq.add_consumer(name, function)
+        self.PBar.start(t * 600 if n is None else n)
         self.daq_start()
-        t_start = time()
-        while time() - t_start < t * 60 if n is None else len(data) < n:
-            sleep(.01)
-            self.daq_trigger(10000) if random_trig else do_nothing()
-            try:
-                self.set_dac('wbc', wbc)  # resets the ROC ... lazy solution
-                while self.update_time(t_start, t, len(data), n):
-                    data.append(self.api.daqGetEvent())
-            except RuntimeError:
-                pass
+        acq.run(t, n, self.PBar)
         self.PBar.finish()
-        self.print_rate(time() - t_start, random_trig)
+        self.print_rate(acq.Meter)
+        acq.print_stats()
         self.daq_stop()
         self.api.HVoff()
         self.set_pg()
         return data
 
-    def print_rate(self, t, random_trig):
+    def print_rate(self, meter):
+        """ prints the testboard statistics and the rates of the [meter] (RateMeter). The testboard only counts the words of the whole run,
+            so only their cumulative rate is given. """
         stats = self.api.getStatistics()
-        t = (2.5e-8 * stats.total_events / 8.) if random_trig else t
         stats.dump()
-        print 'Event Rate: {0: 8.4f} kHz'.format(stats.valid_events / t / 1e3)
-        print 'Hit Rate:   {0: 8.4f} kHz'.format(stats.valid_pixels / t / 1e3)
-        print 'Trigger Eff {0: 8.4f} %'.format(100. * stats.valid_events / float(stats.total_events))
+        meter.print_rates()
+        print '  {:<8}{:>36.1f} Hz'.format('words', stats.info_words_read / meter.get_duration() if meter.get_duration() > 0 else 0.)
+        print 'Trigger Eff {0: 8.4f} %'.format(100. * stats.valid_events / float(max(stats.total_events, 1)))
 
     def get_event_data(self, n):
         data = []
@@ -374,10 +380,16 @@ class CLIX:
         sleep(.2)
 
     def get_raw_buffer(self, convert=True):
-        events = []
-        while not events or events[-1] is not None:
-            events.append(self.daq_get_raw_event(convert))
-        return array(events[:-1])
+        """ :returns: the raw events in the DTB buffer as 2D array if they all have the same length, otherwise as array of event arrays. """
+        try:
+            words, offsets = self.api.daqGetRawEventBufferArrays()
+        except RuntimeError:
+            return array([])
+        words = self.convert_raw_words(words) if convert else words
+        lengths = diff(offsets)
+        if lengths.size and (lengths == lengths[0]).all():
+            return words.reshape(lengths.size, lengths[0])
+        return array(split(words, offsets[1:-1]))
 
     def get_raw_event(self, convert=True, trigger=True, n_trig=1):
         if trigger:
@@ -420,11 +432,9 @@ class CLIX:
     @update_pbar
     def set_clock(self, value, prnt=False):
         """sets all the delays to the right value if you want to change clk"""
-        self.set_tb_delay('clk', value)
-        self.set_tb_delay('ctr', value)
-        self.set_tb_delay('sda', value + (15 if 'dig' in self.api.getRocType() else 11))
-        self.set_tb_delay('tin', value + (5 if 'dig' in self.api.getRocType() else 2))
         info(('set clk delay to {}' if value != self.TBDelays['clk'] else 'keeping previous clk delay of {}').format(value), prnt=prnt)
+        self.TBDelays.update(clock_delays(value, not self.IsAnalogue))
+        self.api.setTestboardDelays(self.TBDelays)
 
     def set_external_clock(self, status=True):
         """setExternalClock [status]: enables the external DTB clock input, switches off the internal clock. Only switches if external clock is present."""
@@ -467,35 +477,27 @@ class CLIX:
         print 'Trigger loop with frequency of {f}Hz {m}'.format(f=freq, m='started' if on else 'stopped')
 
     def data_loop(self, freq=10, status=ON):
-
-        if self.IsRunning:
-            self.IsRunning = False
-            sleep(.1)
+        """ sends triggers with [freq] Hz in the background until it is called with status OFF. """
+        if self.Trigger is not None:
+            self.Trigger.stop()
+            self.Trigger.print_stats()
+            self.Trigger = None
         self.IsRunning = status
         if status == OFF or not freq:
             self.daq_stop()
             return
-
-        def dloop():
-            t0 = time()
-            self.daq_start()
-            z.set_clock(z.get_tb_delay('clk'))  # reduces noise
-            while self.IsRunning:
-                self.daq_trigger(1, 500)
-                while time() - t0 < .99 / freq:
-                    sleep(1. / 100. / freq)
-                t0 = time()
-        t = Thread(target=dloop)
-        t.setDaemon(True)
-        t.start()
+        self.daq_start()
+        self.set_clock(self.get_tb_delay('clk'))  # reduces noise
+        self.Trigger = TriggerScheduler(self.api, freq)
+        self.Trigger.start()
 
     def get_raw_data(self, n_trigger=1000):
         self.send_triggers(n_trigger)
         return self.get_raw_buffer()
 
-    def get_data(self, n_trigger=1000):
+    def get_data(self, n_trigger=1000, arrays=False):
         self.send_triggers(n_trigger)
-        return self.api.daqGetEventBuffer()
+        return self.api.daqGetEventBufferArrays() if arrays else self.api.daqGetEventBuffer()
 
     def get_address_levels(self, n_trigger=1000):
         data = self.get_raw_data(n_trigger)[:, 3:]  # remove the ROC header
@@ -530,8 +532,8 @@ class CLIX:
         self.api.maskPixel(column, row, 0, roc)
 
     def enable_pixels(self, columns, rows, roc=None):
-        for column, row in zip(columns, rows):
-            self.enable_pix(column, row, roc)
+        self.api.testPixels(columns, rows, 1, roc)
+        self.api.maskPixels(columns, rows, 0, roc)
 
     def enable_single_pixel(self, column=14, row=14, roc=None, prnt=True):
         """enableOnePixel [row] [column] [roc] : enables one Pixel (default 14/14); masks and disables the rest"""
@@ -555,7 +557,7 @@ class CLIX:
     def print_eff(self, data, n_trig):
         unmasked = 4160 * self.get_n_rocs() - self.api.getNMaskedPixels()
         active = self.api.getNEnabledPixels()
-        read_back = sum(px.value for px in data)
+        read_back = pixel_arrays(data)[3].sum()
         total = n_trig * (unmasked if unmasked < active else active)
         eff = 100. * read_back / total
         print 'Efficiency: {:6.2f}% ({:5d}/{:5d})'.format(eff, int(read_back), total)
@@ -564,18 +566,16 @@ class CLIX:
     def plot_map(self, data, title, count=False, stats=True):
         is_module = self.NRocs > 1
         proc = 'proc' in self.api.getRocType()
-        x, y, zz = [], [], []  # Prepare new numpy matrix:
-        for px in data:
-            roc = (px.roc - 12) % 16 if proc else px.roc
-            xoffset = 52 * (roc % 8) if is_module else 0
-            yoffset = 80 * int(roc / 8) if is_module else 0
-            y.append(px.row + yoffset if roc < 8 else 2 * yoffset - px.row - 1)  # Flip the ROCs upside down:
-            x.append(px.column + xoffset if roc < 8 else 415 - xoffset - px.column)  # Reverse order of the upper ROC row:
-            zz.append(px.value)
+        roc, col, row, zz = pixel_arrays(data, self.I2C)
+        roc = (roc - 12) % 16 if proc else roc
+        xoffset = 52 * (roc % 8) if is_module else 0
+        yoffset = 80 * (roc / 8) if is_module else 0
+        y = where(roc < 8, row + yoffset, 2 * yoffset - row - 1)  # Flip the ROCs upside down:
+        x = where(roc < 8, col + xoffset, 415 - xoffset - col)  # Reverse order of the upper ROC row:
         if not count:
-            x, y = [array(arr).repeat(zz) for arr in [x, y]]
+            x, y = [arr.repeat(zz.astype('i')) for arr in [x, y]]
         binning = make_bins(0, 417 if is_module else 52) + make_bins(0, 161 if is_module else 80)
-        if not len(x):
+        if not x.size:
             return warning('empty data ... there is nothing to show')
         self.Draw.histo_2d(x, y, binning, title, x_tit='col', y_tit='row', stats=stats, z_range=[0, max(zz)])
         self.draw_module_grid(is_module)
@@ -587,51 +587,31 @@ class CLIX:
     # -----------------------------------------
 
     def get_efficiency_map(self, flags=0, n_triggers=10):
-        data = self.api.getEfficiencyMap(flags, n_triggers)
+        data = self.api.getEfficiencyMap(flags, n_triggers, dense=True)
         self.print_eff(data, n_triggers)
         self.plot_map(data, 'Efficiency Map', stats=False)
 
-    def clk_scan(self, exclude=None):
-        """ scanning digital clk and deser phases """
-        n = 10
+    def get_header_efficiency(self, n=10):
+        """ :returns: the fraction of [n] triggers with a valid ROC header of every ROC """
         n_rocs = self.api.getNRocs()
+        self.daq_trigger(n)
+        evts = [self.daq_get_raw_event() for _ in xrange(n)]
+        return mean([1 if event is not None and len(event) == n_rocs and all(header in xrange(2040, 2044) for header in event) else 0 for event in evts])
+
+    def clk_scan(self, exclude=None, cached=True):
+        """ scanning digital clk and deser phases: coarse scan and refinement of the edge of the good window, which is cached for every module """
         self.set_pg(cal=False, res=True)
         self.daq_start()
-        print '\nCLK',
-        for i in xrange(8):
-            print '{:2d} '.format(i),
-        print
-        good = []
-        for clk in xrange(20):
-            if clk == exclude:
-                continue
-            self.set_clock(clk)
-            print '{:2d}:'.format(clk),
-            for phase in xrange(8):
-                self.set_tb_delay('deser160phase', phase)
-                # self.api.setTestboardDelays({'clk': clk})
-                self.daq_trigger(n)
-                evts = [self.daq_get_raw_event() for _ in xrange(n)]
-                eff = mean([1 if event is not None and len(event) == n_rocs and all(header in xrange(2040, 2044) for header in event) else 0 for event in evts])
-                if eff == 1:
-                    good.append((clk, phase))
-                    print '{c}{eff:1.1f}{e}'.format(eff=eff, c=GREEN, e=ENDC),
-                elif eff > .5:
-                    print '{c}{eff:1.1f}{e}'.format(eff=eff, c=YELLOW, e=ENDC),
-                elif eff > 0:
-                    print '{c}{eff:1.1f}{e}'.format(eff=eff, c=RED, e=ENDC),
-                else:
-                    print ' x ',
-            print
+        scan = TimingScan(self.api, self.TBDelays, self.get_header_efficiency, basename(realpath(self.Dir)), not self.IsAnalogue, exclude=[exclude] if exclude is not None else None,
+                          cache_file=join(dirname(realpath(self.Dir)), 'timing_windows.json') if cached else None)
+        best = scan.run()
+        scan.print_grid()
         self.daq_stop()
         self.set_pg(cal=True, res=True)
-        if not good:
+        if best is None:
             print 'Did not find any good timing...'
             return
-        clk, phase = good[(len(good) / 2)]
-        print 'Set CLK/DESER160PHASE to: {}/{}'.format(clk, phase)
-        self.set_clock(clk)
-        self.set_tb_delay('deser160phase', phase)
+        print 'Set CLK/DESER160PHASE to: {}/{}'.format(*best)
 
     def scan_clk(self):
         self.daq_start()
@@ -645,12 +625,12 @@ class CLIX:
         self.api.setDAC('ctrlreg', 4 if high else 0)
         self.api.setDAC('vcal', vcal)
         self.enable_single_pixel(col, row)
-        x = [px.value for evt in self.get_data(n_trig) for px in evt.pixels]
+        x = self.get_data(n_trig, arrays=True)['value']
         self.Draw.distribution(x, make_bins(-256, 256), 'ACD Distribution for vcal {} in {} Range'.format(vcal, 'high' if high else 'low'), x_tit='ADC', x_range=ax_range(x, 0, .2, .7))
 
     def wbc_scan(self, min_wbc=97, max_triggers=50, max_wbc=130, plot=False):
         """do_wbcScan [minimal WBC] [number of events] [maximal WBC]: \n
-        sets wbc from minWBC until it finds the wbc which has more than 90% filled events or it reaches maxWBC \n
+        sets wbc from minWBC until the yield peak of every ROC is resolved or it reaches maxWBC. Each ROC keeps the wbc of its peak \n
         (default [90] [100] [130])"""
 
         # preparations
@@ -661,34 +641,12 @@ class CLIX:
         self.api.SignalProbe('a1', 'sdata2')
         self.api.daqStart()
 
-        trigger_phases = zeros(10)
-        yields = OrderedDict((wbc, zeros(self.get_n_rocs())) for wbc in xrange(min_wbc, max_wbc))
-        print '\nROC EVENT YIELDS:\n  wbc\t{r}'.format(r='\t'.join(('roc{}'.format(i)).rjust(6) for i in xrange(self.get_n_rocs())))
-
-        for wbc in xrange(min_wbc, max_wbc):  # loop over wbc
-            self.clear_buffer()
-            self.api.setDAC('wbc', wbc)
-            for event in self.get_event_data(max_triggers):
-                if len(event.triggerPhases):
-                    trigger_phases[event.triggerPhases[0]] += 1
-                    for roc in set([pix.roc for pix in event.pixels]):
-                        yields[wbc][roc] += 100. / max_triggers
-            print '  {:03d}\t{}'.format(wbc, '\t'.join(['{:5.1f}%'.format(v) for v in yields[wbc]]))
-
-            # stopping criterion
-            if wbc > min_wbc + 3 and any(yld > 10 for yld in yields[wbc - 2]):
-                break
-        for roc in xrange(self.get_n_rocs()):
-            self.api.setDAC('wbc', max(yields, key=lambda x: yields[x][roc]), roc)
+        scan = YieldScan(self.api, lambda wbc, roc: self.api.setDAC('wbc', wbc, roc), xrange(min_wbc, max_wbc), max_triggers)
+        scan.run()
         self.api.daqStop()
-
-        # trigger_phase
-        print '\nTRIGGER PHASE:'
-        for i, trigger_phase in enumerate(trigger_phases):
-            if trigger_phase:
-                percentage = trigger_phase * 100 / sum(trigger_phases)
-                print '{i}\t{d} {v:2.1f}%'.format(i=i, d=int(round(percentage)) * '|', v=percentage)
-
+        scan.print_trigger_phases()
+        measured = scan.get_yields()
+        yields = OrderedDict((wbc, measured.get(wbc, full(self.get_n_rocs(), nan))) for wbc in xrange(min_wbc, max_wbc))
         self.plot_wbc(yields, plot)
 
     def plot_wbc(self, yields, show=True):
@@ -700,11 +658,13 @@ class CLIX:
                 print('all zero...')
                 return
             x = arange(x_min, x_max)
-            g = [self.Draw.graph(x, [yields[wbc][roc] for wbc in x], xtit='wbc', ytit='yield [%]', show=False) for roc in range(self.NRocs)]
+            points = [[(wbc, yields[wbc][roc]) for wbc in x if wbc in yields and not isnan(yields[wbc][roc])] for roc in range(self.NRocs)]  # NaN: not measured
+            g = [self.Draw.graph(*zip(*p), xtit='wbc', ytit='yield [%]', show=False) for p in points]
             self.Draw.multigraph(g, 'WBC Scan', ['ROC {}'.format(i) for i in range(self.NRocs)], 'lp')
 
     def hitmap(self, t=1, wbc=93, n=None, random_trigger=False):
-        pix_data = [pix for event in self.take_data(wbc, t, n, random_trigger) for pix in event.pixels]
+        pix_data = []
+        self.take_data(wbc, t, n, random_trigger, consumers={'hitmap': lambda events: pix_data.extend(pix for event in events for pix in event.pixels)})
         self.Draw.distribution([px.value for px in pix_data], make_bins(-256, 256), xtit='Pulse Height [adc]')
         self.plot_map(pix_data, 'Hit Map', count=True, stats=set_statbox(entries=True))
 
@@ -723,10 +683,9 @@ class CLIX:
                 data2 = lines[i + 1].split(' ')
                 i2c = int(data1[1])
                 self.api.maskAllPixels(True, i2c)
-                for col in xrange(int(data1[2]), int(data2[2]) + 1):
-                    for row in xrange(int(data1[3]), int(data2[3]) + 1):
-                        print col, row, i2c
-                        self.api.maskPixel(col, row, False, i2c)
+                cols, rows = [a.ravel() for a in meshgrid(arange(int(data1[2]), int(data2[2]) + 1), arange(int(data1[3]), int(data2[3]) + 1))]
+                print 'Unmask cols {}-{} rows {}-{} i2c {}'.format(data1[2], data2[2], data1[3], data2[3], i2c)
+                self.api.maskPixels(cols, rows, False, i2c)
             elif data1[0] == 'pix':
                 i2c = int(data1[1])
                 col = int(data1[2])
@@ -737,31 +696,26 @@ class CLIX:
                 i2c = int(data1[1])
                 col = int(data1[2])
                 print 'Mask col', col, 'i2c', i2c
-                for row in xrange(80):
-                    self.api.maskPixel(col, row, True, i2c)
+                self.api.maskPixels(full(80, col), arange(80), True, i2c)
             elif data1[0] == 'row':
                 i2c = int(data1[1])
                 row = int(data1[2])
                 print 'Mask row', row, 'i2c', i2c
-                for col in xrange(52):
-                    self.api.maskPixel(col, row, True, i2c)
+                self.api.maskPixels(arange(52), full(52, row), True, i2c)
 
     def save_time(self, t=2, n=10000):
         self.api.HVon()
-        w = HDF5Writer('main')
+        w = HDF5Writer('main', stream=True)
         info('taking data ...')
-        t_start = time()
         w.PBar.start(t * 60 * 10)
         self.enable_single_pixel(14, 14, prnt=False)
+        acq = Acquisition(self.api, arrays=True, headers=True, idle=lambda: self.daq_trigger(n), idle_period=.5)
+        acq.add_consumer('writer', w.add_events)
         self.daq_start()
-        while time() - t_start < t * 60:
-            self.daq_trigger(n)
-            for event in self.api.daqGetEventBuffer():
-                w.add_event(event)
-            sleep(.5)
-            w.PBar.update(int((time() - t_start) * 10))
+        acq.run(t, pbar=w.PBar)
+        acq.print_stats()
         self.daq_stop()
-        w.convert()
+        w.save_file()
         self.api.HVoff()
 
     def save_random(self, n=10000, n_pixel=10):
@@ -781,10 +735,10 @@ class CLIX:
         self.api.HVoff()
 
     def save_hdf5(self, t=1, n=None, random=False):
-        w = HDF5Writer('main')
+        w = HDF5Writer('main', stream=True)
         self.enable_all()
-        w.add_data(self.take_data(w.WBC, t, n, random))
-        w.convert()
+        self.take_data(w.WBC, t, n, random, consumers={'writer': w.add_events}, arrays=True)
+        w.save_file()
 
     def save_data(self, n=240000):
         global BREAK
@@ -796,18 +750,17 @@ class CLIX:
         self.signal_probe('a1', 'sdata2')
         self.daq_start()
         i = 0
-        while True:
-            try:
-                t.write(self.api.daqGetEvent())
+        while not BREAK:
+            for events in self.api.iterEvents(timeout=.5):
+                for event in events:
+                    t.write(event)
+                    i += 1
+                    if i == n:
+                        call('ssh -tY f9pc DISPLAY=:0 /home/f9pc001/miniconda2/bin/python /home/f9pc001/Downloads/run/say.py'.split() + ['"finished run {}"'.format(t.RunNumber)])
                 print '\r{}'.format(i),
                 stdout.flush()
-                i += 1
-                if i == n:
-                    call('ssh -tY f9pc DISPLAY=:0 /home/f9pc001/miniconda2/bin/python /home/f9pc001/Downloads/run/say.py'.split() + ['"finished run {}"'.format(t.RunNumber)])
-            except RuntimeError:
-                pass
-            if BREAK:
-                break
+                if BREAK:
+                    break
         self.daq_stop()
         BREAK = False
 
@@ -891,35 +844,31 @@ class CLIX:
         self.save_tb_delays()
 
     def find_vana(self, target=24, xmin=60, xmax=180):
-        values = []
-        for roc in range(self.NRocs):
-            self.set_dac('vana', 0)  # set vana of all ROCs to 0
-            values.append(self._find_vana(target, vana=int(mean([xmin, xmax])), step=(xmax - xmin) // 2, roc=roc))
-        for i in range(self.NRocs):
-            self.set_dac('vana', values[i], i)
-
-    def _find_vana(self, target=24, vana=120, step=60, count=0, roc=0):
-        self.set_dac('vana', vana, roc)
-        c = self.get_ia(prnt=False)
-        if abs(c - target) < .2 + .1 * count:
-            info('set vana of ROC {} to {}, analogue current: {:.1f} mA'.format(roc, vana, c))
+        """ tunes the vana of all ROCs in common rounds, such that each ROC alone (all other vana at 0) gives an analogue current of [target] mA. """
+        tuner = VanaTuner(self.api, lambda: self.get_ia(3, prnt=False), self.NRocs, target, (xmin, xmax))
+        tuner.run()
+        for roc in xrange(self.NRocs):
             self.save_dac_parameters(roc)
-            return vana
-        return self._find_vana(target, vana + step // 2 * int(sign(target - c)), max(step // 2, 1), count + 1 if step == 1 else 0, roc)
+        return tuner
 
     def draw_address_levels(self, n_trigger=1000, **kwargs):
         x = self.get_address_levels(n_trigger).flatten()
         return self.Draw.distribution(x, make_bins(-512, 512), x_tit='Level [adc]', stats=set_statbox(entries=True), **kwargs)
 
-    def s_curve(self, col=14, row=14, ntrig=1000):
-        """ checkADCTimeConstant [vcal=200] [ntrig=10]: sends an amount of triggers for a fixed vcal in high/low region and prints adc values"""
+    def s_curve(self, col=14, row=14, ntrig=1000, width=20):
+        """ draws the efficiency vs. vcal of a single pixel for vcals within [width] around its threshold, which is found with a quick bisection (full range if width is None)"""
         self.enable_single_pixel(row, col)
-        efficiencies = [0 if not px else px[0].value / ntrig for px in self.api.getEfficiencyVsDAC('vcal', 1, 0, 255, nTriggers=ntrig)]
-        g = self.Draw.make_tgrapherrors('gsc', 'S-Curve for Pixel {} {}'.format(col, row), x=arange(256), y=efficiencies)
+        vmin, vmax = 0, 255
+        if width is not None:
+            threshold = nanmax(ThresholdFinder(self.api, min(ntrig, 50)).run()[:, col, row])
+            if threshold == threshold:
+                vmin, vmax = int(max(threshold - width, 0)), int(min(threshold + width, 255))
+        values, vcals = self.api.getEfficiencyVsDAC('vcal', 1, vmin, vmax, nTriggers=ntrig, dense=True)
+        efficiencies = first_pixel(values) / float(ntrig)
+        g = self.Draw.make_tgrapherrors('gsc', 'S-Curve for Pixel {} {}'.format(col, row), x=vcals.astype('d'), y=efficiencies.astype('d'))
         format_histo(g, x_tit='VCAL', y_tit='Efficiency [%]', y_off=1.3)
         self.Draw.histo(g, draw_opt='ap', lm=.12)
 
-
 if __name__ == '__main__':
     # command line argument parsing
 
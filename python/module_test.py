@@ -40,25 +40,23 @@ def main(argv=None):
     # collect data:
     evt = 0
     words = 0
-    while 1:
-        try:
-            data = api.daqGetEvent()
-            evt += 1
-            mystats = api.getStatistics()
-            words += mystats.info_words_read
-            error = True if mystats.errors != 0 else False
-        except RuntimeError:
-            pass
-        except KeyboardInterrupt:
-            print "KeyboardInterrupt caught"
-            print "#################################################################"
-            print "Total: " + str(words) + " words in " + str(evt) + " events."
-            print "#################################################################"
-            raise
-        if error:
-            print "Found error after " + str(words) + " words (event " + str(evt) + ")"
-        if evt%250000 == 0:
-            print "Event " + str(evt)
+    stats = PxarStatistics(api.getNTbms(), delta=True)
+    try:
+        for data in api.iterEvents():
+            evt += len(data)
+            mystats = stats.add(api.getStatistics())
+            words += mystats['info_words_read']
+            if mystats['errors'] != 0:
+                print "Found error after " + str(words) + " words (event " + str(evt) + ")"
+            if evt / 250000 != (evt - len(data)) / 250000:
+                print "Event " + str(evt / 250000 * 250000)
+                stats.print_rates(n=None)
+    except KeyboardInterrupt:
+        print "KeyboardInterrupt caught"
+        print "#################################################################"
+        print "Total: " + str(words) + " words in " + str(evt) + " events."
+        print "#################################################################"
+        raise
             
     # stop the DAQ:
     api.daqStop()
@@ -7,12 +7,12 @@
 from draw import *
 from ROOT import TCanvas, TCutG, TH2F, TF2
 from argparse import ArgumentParser
-from numpy import zeros, array
+from numpy import zeros, array, where, add
 from os.path import basename, dirname, realpath, split, join
 from sys import argv, path
 from progressbar import Bar, ETA, FileTransferSpeed, Percentage, ProgressBar
-from time import time
-from TreeWriter import TreeWriter
+from time import time, sleep
+from TreeWriterErrors import TreeWriter
 lib_dir = join(split(dirname(realpath(__file__)))[0], 'lib')
 path.insert(1, lib_dir)
 try:
@@ -21,6 +21,10 @@ except ImportError:
     id3003_xray_generator = None
 from pxar_helpers import *
 from pxar_plotter import Plotter
+from acquisition import Acquisition
+from event_ring import EventRing, HitAggregator
+from tempfile import mkdtemp
+from shutil import rmtree
 
 dacdict = PyRegisterDictionary()
 probedict = PyProbeDictionary()
@@ -65,14 +69,14 @@ class ErrorFinder:
             print 'Unknown dac {d}!'.format(d=dac)
 
     def get_efficiency_map(self, flags=0, n_triggers=10):
-        data = self.api.getEfficiencyMap(flags, n_triggers)
+        data = self.api.getEfficiencyMap(flags, n_triggers, dense=True)
         self.print_eff(data, n_triggers)
         self.plot_map(data, "Efficiency", no_stats=True)
 
     def print_eff(self, data, n_trig):
         unmasked = 4160 - self.api.getNMaskedPixels()
         active = self.api.getNEnabledPixels()
-        read_back = sum(px.value for px in data)
+        read_back = pixel_arrays(data)[3].sum()
         total = n_trig * (unmasked if unmasked < active else active)
         eff = 100. * read_back / total
         print 'Efficiency: {eff:6.2f}% ({rb:5d}/{tot:5d})'.format(eff=eff, rb=int(read_back), tot=total)
@@ -87,16 +91,16 @@ class ErrorFinder:
         proc = 'proc' in self.api.getRocType()
         # Prepare new numpy matrix:
         d = zeros((417 if module else 52, 161 if module else 80))
-        for px in data:
-            roc = (px.roc - 12) % 16 if proc else 0
-            xoffset = 52 * (roc % 8) if module else 0
-            yoffset = 80 * int(roc / 8) if module else 0
+        roc, col, row, value = pixel_arrays(data, self.api.getRocI2Caddr())
+        roc = (roc - 12) % 16 if proc else 0
+        xoffset = 52 * (roc % 8) if module else 0
+        yoffset = 80 * (roc / 8) if module else 0
 
-            # Flip the ROCs upside down:
-            y = (px.row + yoffset) if (roc < 8) else (2 * yoffset - px.row - 1)
-            # Reverse order of the upper ROC row:
-            x = (px.column + xoffset) if (roc < 8) else (415 - xoffset - px.column)
-            d[x][y] += 1 if count else px.value
+        # Flip the ROCs upside down:
+        y = where(roc < 8, row + yoffset, 2 * yoffset - row - 1)
+        # Reverse order of the upper ROC row:
+        x = where(roc < 8, col + xoffset, 415 - xoffset - col)
+        add.at(d, (x, y), 1 if count else value)
 
         plot = Plotter.create_th2(d, 0, 417 if module else 52, 0, 161 if module else 80, name, 'pixels x', 'pixels y', name)
         if no_stats:
@@ -130,7 +134,8 @@ class ErrorFinder:
         h.Draw('colz')
         self.Plots.append(h)
 
-    def find_errors(self, t=1, n=10000, show=True):
+    def find_errors(self, t=1, n=10000, show=True, capacity=100000):
+        """ keeps at most [capacity] events in memory, older ones are spilled to disk until the tree is written """
         self.start_xray()
         set_palette()
         self.api.HVon()
@@ -138,26 +143,32 @@ class ErrorFinder:
         self.set_pg(cal=False, res=False)
         self.api.daqStart()
         self.start_pbar(t * 600)
-        data = []
         stats = PxarStatistics(self.api.getNTbms())
-        n_triggers = 0
-        while time() - t_start < t * 60:
-            n_triggers += n
-            self.ProgressBar.update(int((time() - t_start) * 10) + 1)
-            self.api.daqTrigger(n, 500)
-            data += self.api.daqGetEventBuffer()
-        self.ProgressBar.finish()
-        stats.add(self.api.getStatistics())
-        self.api.daqStop()
-        self.api.HVoff()
-        self.set_pg()
-        self.stop_xray()
-
-        writer = TreeWriter(data)
-        writer.write_tree(self.HV, self.Current)
+        hits = HitAggregator(self.api.getRocI2Caddr())
+        ring = EventRing(capacity, mkdtemp(prefix='errors'), [hits])
+        try:
+            acq = Acquisition(self.api, arrays=True, headers=True, idle=lambda: self.api.daqTrigger(n, 500))
+            acq.add_consumer('ring', ring.add)
+            acq.start()
+            while time() - t_start < t * 60:
+                self.ProgressBar.update(min(int((time() - t_start) * 10) + 1, t * 600))
+                sleep(.1)
+            acq.stop()
+            self.ProgressBar.finish()
+            acq.print_stats()
+            stats.add(self.api.getStatistics())
+            self.api.daqStop()
+            self.api.HVoff()
+            self.set_pg()
+            self.stop_xray()
+
+            writer = TreeWriter(ring)
+            writer.write_tree(self.HV, self.Current)
+        finally:
+            ring.clear()
+            rmtree(ring.SpillDir)
         if show:
-            data = [pix for ev in data for pix in ev.pixels]
-            self.plot_map(data, 'Hit Map', count=True, no_stats=True)
+            self.plot_map(hits.get_hit_map(), 'Hit Map', no_stats=True)
         print stats
         stats.save(self.HV, self.Current)
         print 'Event Rate: {0:5.4f} MHz'.format(stats.event_rate / 1000000)
@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 # --------------------------------------------------------
-#       Class to write a list is pXar Events into a root tree
+#       Class to write the columnar pXar event buffer (daqGetEventBufferArrays with headers) into a root tree
 # created on February 20th 2017 by M. Reichmann (remichae@phys.ethz.ch)
 # --------------------------------------------------------
 
@@ -13,6 +13,7 @@ from os.path import isfile
 class TreeWriter:
 
     def __init__(self, data):
+        """ :param data: columnar event buffer arrays or a sized iterable of them, e.g. an EventRing """
 
         self.Data = data
         self.File = None
@@ -72,6 +73,23 @@ class TreeWriter:
                            ('eventid_mismatch', vector('bool')())])
         return dic
 
+    @staticmethod
+    def init_columns():
+        """ :returns: the branch names of the pixel and of the event fields with the corresponding keys of the event buffer arrays """
+        pixel_columns = OrderedDict([('plane', 'roc'), ('col', 'column'), ('row', 'row'), ('adc', 'adc'), ('invalid_address', 'invalid_address'),
+                                     ('invalid_pulse_height', 'invalid_pulse_height'), ('buffer_corruption', 'buffer_corruption')])
+        event_columns = OrderedDict([('header', 'header'), ('trailer', 'trailer'), ('pkam', 'pkam_reset'), ('token_pass', 'token_pass'), ('reset_tbm', 'reset_tbm'),
+                                     ('reset_roc', 'reset_roc'), ('auto_reset', 'auto_reset'), ('cal_trigger', 'cal_trigger'), ('trigger_count', 'trigger_count'),
+                                     ('trigger_phase', 'trigger_phase'), ('stack_count', 'stack_count'), ('incomplete_data', 'incomplete_data'),
+                                     ('missing_roc_headers', 'missing_roc_headers'), ('roc_readback', 'roc_readback'), ('no_data', 'no_data'),
+                                     ('eventid_mismatch', 'eventid_mismatch')])
+        return pixel_columns, event_columns
+
+    @staticmethod
+    def count_key(data, key):
+        """ :returns: the key of the number of real entries in every event of the padded event field [key] """
+        return 'n_' + key if 'n_' + key in data else 'n_header' if key in ['trigger_count', 'trigger_phase'] else 'n_trailer'
+
     def clear_vectors(self):
         for key in self.VectorBranches.iterkeys():
             self.VectorBranches[key].clear()
@@ -80,45 +98,36 @@ class TreeWriter:
         for key, vec in self.VectorBranches.iteritems():
             self.Tree.Branch(key, vec)
 
+    def fill_batch(self, batch, n):
+        """ fills the events of a single columnar batch into the tree, [n] is the number of events filled before. """
+        data = dict(batch, adc=batch['value'].astype('i2'), token_pass=~batch['no_token_pass'])
+        offsets = batch['offsets'].tolist()
+        pixel_columns, event_columns = self.init_columns()
+        pixel_data = [(self.VectorBranches[br], data[key].tolist()) for br, key in pixel_columns.iteritems()]
+        event_data = [(self.VectorBranches[br], data[key].tolist(), data[self.count_key(data, key)].tolist()) for br, key in event_columns.iteritems()]
+        for i in xrange(len(offsets) - 1):
+            self.ProgressBar.update(n + i + 1)
+            self.clear_vectors()
+            for vec, values in pixel_data:
+                for value in values[offsets[i]:offsets[i + 1]]:
+                    vec.push_back(value)
+            for vec, values, counts in event_data:
+                for value in values[i][:counts[i]]:
+                    vec.push_back(value)
+            self.Tree.Fill()
+        return n + len(offsets) - 1
+
     def write_tree(self, hv, cur):
         hv_str = '-{v}'.format(v=hv) if hv is not None else ''
         cur_str = '-{c}'.format(c=cur) if cur is not None else ''
         self.File = TFile('run{n}{v}{c}.root'.format(n=str(self.RunNumber).zfill(3), v=hv_str, c=cur_str), 'RECREATE')
         self.Tree = TTree('tree', 'The error tree')
         self.set_branches()
-        self.start_pbar(len(self.Data))
-        for i, ev in enumerate(self.Data):
-            self.ProgressBar.update(i + 1)
-            self.clear_vectors()
-            for pix in ev.pixels:
-                self.VectorBranches['plane'].push_back(int(pix.roc))
-                self.VectorBranches['col'].push_back(int(pix.column))
-                self.VectorBranches['row'].push_back(int(pix.row))
-                self.VectorBranches['adc'].push_back(int(pix.value))
-                self.VectorBranches['invalid_address'].push_back(bool(pix.invalid_address))
-                self.VectorBranches['invalid_pulse_height'].push_back(bool(pix.invalid_pulse_height))
-                self.VectorBranches['buffer_corruption'].push_back(bool(pix.buffer_corruption))
-            for k in xrange(len(ev.roc_readback)):
-                self.VectorBranches['roc_readback'].push_back(ev.roc_readback[k])
-                self.VectorBranches['incomplete_data'].push_back(ev.incomplete_data[k])
-                self.VectorBranches['missing_roc_headers'].push_back(ev.missing_roc_headers[k])
-            for err in ev.eventid_mismatch:
-                self.VectorBranches['eventid_mismatch'].push_back(err)
-            for err in ev.no_data:
-                self.VectorBranches['no_data'].push_back(err)
-            for j in xrange(len(ev.header)):
-                self.VectorBranches['header'].push_back(ev.header[j])
-                self.VectorBranches['trailer'].push_back(ev.trailer[j])
-                self.VectorBranches['pkam'].push_back(ev.havePkamReset[j])
-                self.VectorBranches['cal_trigger'].push_back(ev.haveCalTrigger[j])
-                self.VectorBranches['token_pass'].push_back(ev.haveTokenPass[j])
-                self.VectorBranches['reset_tbm'].push_back(ev.haveResetTBM[j])
-                self.VectorBranches['reset_roc'].push_back(ev.haveResetROC[j])
-                self.VectorBranches['auto_reset'].push_back(ev.haveAutoReset[j])
-                self.VectorBranches['trigger_count'].push_back(ev.triggerCounts[j])
-                self.VectorBranches['trigger_phase'].push_back(ev.triggerPhases[j])
-                self.VectorBranches['stack_count'].push_back(ev.stackCounts[j])
-            self.Tree.Fill()
+        batches = [self.Data] if type(self.Data) is dict else self.Data
+        self.start_pbar(self.Data['offsets'].size - 1 if type(self.Data) is dict else len(self.Data))
+        n = 0
+        for batch in batches:
+            n = self.fill_batch(batch, n)
         self.ProgressBar.finish()
         self.File.cd()
         self.File.Write()
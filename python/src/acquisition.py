@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Class to read out the testboard in a background thread and to feed the events to concurrent consumers
+# created on October 18th 2026
+# --------------------------------------------------------
+
+from Queue import Queue, Full
+from threading import Thread, Event
+from collections import OrderedDict
+from time import time, sleep
+from utils import warning, do_nothing
+from rate_meter import RateMeter
+
+PixelKeys = ['roc', 'column', 'row', 'value', 'invalid_address', 'invalid_pulse_height', 'buffer_corruption']  # arrays with one entry per hit
+
+
+def n_hits(batch):
+    """ :returns: the number of pixel hits in a batch of events """
+    return batch['roc'].size if type(batch) is dict else sum(len(event.pixels) for event in batch)
+
+
+def n_events(batch):
+    """ :returns: the number of events in a list of PxEvents or in the columnar arrays of daqGetEventBufferArrays """
+    return batch['offsets'].size - 1 if type(batch) is dict else len(batch)
+
+
+def truncate(batch, n):
+    """ :returns: the first [n] events of a list of PxEvents or of the columnar arrays of daqGetEventBufferArrays """
+    if type(batch) is not dict:
+        return batch[:n]
+    n_hits = batch['offsets'][n]
+    return {key: values[:n + 1] if key == 'offsets' else values[:n_hits] if key in PixelKeys else values[:n] for key, values in batch.iteritems()}
+
+
+class Consumer(Thread):
+    """ Consumer stage which calls [function] for every batch of events in its own thread. """
+
+    def __init__(self, name, function, queue_size, block):
+        Thread.__init__(self, name=name)
+        self.setDaemon(True)
+        self.Function = function
+        self.Queue = Queue(queue_size)
+        self.Block = block
+
+        # backpressure statistics
+        self.NEvents = 0
+        self.MaxFill = 0
+        self.BlockedTime = 0.
+        self.NDropped = 0
+        self.NErrors = 0
+
+    def put(self, batch):
+        """ passes [batch] to the consumer. If the queue is full the producer waits (block=True) or the batch is dropped. """
+        try:
+            self.Queue.put_nowait(batch)
+        except Full:
+            if not self.Block:
+                self.NDropped += 1
+                return
+            t = time()
+            self.Queue.put(batch)
+            self.BlockedTime += time() - t
+        self.MaxFill = max(self.MaxFill, self.Queue.qsize())
+
+    def run(self):
+        while True:
+            batch = self.Queue.get()
+            if batch is None:
+                break
+            try:
+                self.Function(batch)
+            except Exception as err:
+                self.NErrors += 1
+                warning('consumer {} failed: {}'.format(self.name, err))
+            self.NEvents += n_events(batch)
+
+    def stats(self):
+        return OrderedDict([('events', self.NEvents), ('max fill', '{}/{}'.format(self.MaxFill, self.Queue.maxsize)), ('blocked', '{:.2f}s'.format(self.BlockedTime)),
+                            ('dropped', self.NDropped), ('errors', self.NErrors)])
+
+
+class Acquisition(object):
+    """ Drains the testboard in a readout thread and distributes the event batches to the consumer stages through bounded queues. """
+
+    def __init__(self, api, batch_size=1000, queue_size=100, arrays=False, headers=False, idle=None, idle_period=0):
+        """ :param idle: function called in the readout thread whenever the DAQ buffer ran empty, e.g. to send triggers
+            :param idle_period: minimum time in seconds between two calls of [idle] """
+        self.API = api
+        self.BatchSize = batch_size
+        self.QueueSize = queue_size
+        self.Arrays = arrays
+        self.Headers = headers
+        self.Idle = idle if idle is not None else do_nothing
+        self.IdlePeriod = idle_period
+        self.LastIdle = 0
+
+        self.Consumers = []
+        self.Reader = None
+        self.Stop = Event()
+
+        self.NEvents = 0
+        self.NBatches = 0
+        self.MaxEvents = None
+        self.StartTime = None
+        self.Meter = RateMeter()
+
+    def add_consumer(self, name, function, block=True):
+        """ adds a consumer stage calling [function] with every batch. Slow consumers stall the readout if [block], otherwise they lose batches. """
+        self.Consumers.append(Consumer(name, function, self.QueueSize, block))
+
+    def read(self):
+        while not self.Stop.is_set():
+            for batch in self.API.iterEvents(self.BatchSize, timeout=.01, arrays=self.Arrays, headers=self.Headers):
+                if self.MaxEvents is not None and self.NEvents + n_events(batch) >= self.MaxEvents:
+                    batch = truncate(batch, self.MaxEvents - self.NEvents)
+                    self.Stop.set()
+                self.NEvents += n_events(batch)
+                self.NBatches += 1
+                self.Meter.add(n_events(batch), n_hits(batch))
+                for consumer in self.Consumers:
+                    consumer.put(batch)
+                if self.Stop.is_set():
+                    break
+            if not self.Stop.is_set() and time() - self.LastIdle >= self.IdlePeriod:
+                self.LastIdle = time()
+                self.Idle()
+
+    def start(self):
+        self.Stop.clear()
+        self.StartTime = time()
+        self.Meter.start(self.StartTime)
+        for consumer in self.Consumers:
+            consumer.start()
+        self.Reader = Thread(target=self.read, name='readout')
+        self.Reader.setDaemon(True)
+        self.Reader.start()
+
+    def stop(self):
+        """ stops the readout and waits until the consumers processed all queued batches """
+        self.Stop.set()
+        self.Reader.join()
+        for consumer in self.Consumers:
+            consumer.Queue.put(None)
+            consumer.join()
+
+    def is_running(self):
+        return self.Reader is not None and self.Reader.is_alive()
+
+    def run(self, t=None, n=None, pbar=None):
+        """ runs the acquisition for [t] minutes or until [n] events were read, updates [pbar] in tenths of seconds or in events. """
+        self.MaxEvents = n
+        self.start()
+        try:
+            while self.is_running() and (t is None or time() - self.StartTime < t * 60) and (n is None or self.NEvents < n):
+                pbar.update(int((time() - self.StartTime) * 10) if n is None else self.NEvents) if pbar is not None else do_nothing()
+                sleep(.1)
+        finally:
+            self.stop()
+
+    def print_stats(self):
+        print 'Readout: {} events in {} batches'.format(self.NEvents, self.NBatches)
+        self.Meter.print_rates()
+        for consumer in self.Consumers:
+            print '  {}: {}'.format(consumer.name, ', '.join('{} {}'.format(key, value) for key, value in consumer.stats().iteritems()))
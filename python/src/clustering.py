@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Functions to find the clusters of 8-neighbouring hits in many events at once
+# created on October 18th 2026
+# --------------------------------------------------------
+
+from itertools import imap, izip
+from multiprocessing import Pool, cpu_count
+from multiprocessing.sharedctypes import RawArray
+from numpy import arange, argsort, bincount, concatenate, maximum, minimum, lexsort, repeat, searchsorted, unique, zeros, cumsum, frombuffer, prod
+from utils import do_nothing
+
+Shared = {}  # arrays of the hits and the numbers of hits of all planes in the worker processes
+
+ClusterType = [('column', 'f2'), ('row', 'f2'), ('vcal', 'f4'), ('size', 'u2'), ('seed_column', 'u2'), ('seed_row', 'u2')]
+
+
+def neighbour_pairs(keys, stride):
+    """ :returns: the indices of all pairs of neighbouring (or identical) pixels in the sorted [keys], [stride] is the key distance of adjacent columns """
+    i = arange(keys.size)
+    same = keys[1:] == keys[:-1]
+    a, b = [i[:-1][same]], [i[1:][same]]
+    for shift in [1, stride - 1, stride, stride + 1]:  # the neighbours above and in the next column, the others are found from their side
+        j = searchsorted(keys, keys + shift)
+        found = j < keys.size
+        found[found] = keys[j[found]] == keys[found] + shift
+        a.append(i[found])
+        b.append(j[found])
+    return concatenate(a), concatenate(b)
+
+
+def find_roots(n, a, b):
+    """ vectorised union-find of the [n] hits connected by the pairs [a], [b]
+        :returns: the smallest hit index of the cluster of every hit """
+    roots = arange(n)
+    while True:
+        ra, rb = roots[a], roots[b]
+        differ = ra != rb
+        if not differ.any():
+            return roots
+        low = minimum(ra, rb)[differ]
+        minimum.at(roots, ra[differ], low)
+        minimum.at(roots, rb[differ], low)
+        while True:  # path compression
+            jumped = roots[roots]
+            if (jumped == roots).all():
+                break
+            roots = jumped
+
+
+def clusterise(hits, n_hits):
+    """ finds the clusters of 8-neighbouring pixels in the [hits] of all events of one plane, [n_hits] is the number of hits in every event
+        :returns: the clusters with size, charge-weighted centroid, total vcal and seed pixel (the hit with the highest vcal) ordered by event,
+                  the number of clusters in every event """
+    if not hits.size:
+        return zeros(0, ClusterType), zeros(n_hits.size, 'u2')
+    events = repeat(arange(n_hits.size), n_hits)
+    col, row = hits['column'].astype('i8'), hits['row'].astype('i8')
+    stride = row.max() + 3  # padding, so that rows of neighbouring columns never match
+    keys = (events * (col.max() + 3) + col + 1) * stride + row + 1
+    order = argsort(keys, kind='mergesort')
+    keys, events, col, row, vcal = keys[order], events[order], col[order], row[order], hits['vcal'][order].astype('f8')
+
+    first, cluster = unique(find_roots(keys.size, *neighbour_pairs(keys, stride)), return_inverse=True)
+    weights = maximum(vcal, 1e-3)  # hits without charge only count for clusters without charge
+    clusters = zeros(first.size, ClusterType)
+    clusters['size'] = bincount(cluster)
+    clusters['column'] = bincount(cluster, weights * col) / bincount(cluster, weights)
+    clusters['row'] = bincount(cluster, weights * row) / bincount(cluster, weights)
+    clusters['vcal'] = bincount(cluster, vcal)
+    by_charge = lexsort((-vcal, cluster))
+    seeds = by_charge[searchsorted(cluster[by_charge], arange(first.size))]
+    clusters['seed_column'], clusters['seed_row'] = col[seeds], row[seeds]
+    return clusters, bincount(events[first], minlength=n_hits.size).astype('u2')
+
+
+# -----------------------------------------
+# region MULTIPROCESSING
+def to_shared(arr):
+    """ :returns: a copy of [arr] in shared memory with its dtype and shape """
+    raw = RawArray('b', max(arr.nbytes, 1))
+    if arr.size:
+        frombuffer(raw, arr.dtype, arr.size)[:] = arr.ravel()
+    return raw, arr.dtype, arr.shape
+
+
+def from_shared(raw, dtype, shape):
+    return frombuffer(raw, dtype, int(prod(shape))).reshape(shape)
+
+
+def init_worker(hits, n_hits):
+    Shared['hits'] = [from_shared(*h) for h in hits]
+    Shared['n_hits'] = from_shared(*n_hits)
+
+
+def clusterise_shard(shard):
+    roc, start, stop, hit_start, hit_stop = shard
+    return clusterise(Shared['hits'][roc][hit_start:hit_stop], Shared['n_hits'][roc][start:stop])
+
+
+def get_shards(n_hits, size):
+    """ :returns: the shards (plane, first event, last event, first hit, last hit) with [size] events """
+    shards = []
+    for roc, n in enumerate(n_hits):
+        offsets = concatenate([[0], cumsum(n, dtype='i8')])
+        for start in xrange(0, n.size, size):
+            stop = min(start + size, n.size)
+            shards.append((roc, start, stop, offsets[start], offsets[stop]))
+    return shards
+
+
+def clusterise_planes(hits, n_hits, n_processes=None, shard_size=100000, pbar=None):
+    """ clusterises the [hits] of all planes in shards of one plane and at most [shard_size] events on a pool of [n_processes] processes.
+        The hit arrays are copied once to shared memory, only the cluster arrays of the shards are sent back and merged in order.
+        :param n_hits: (n_planes, n_events) array of the number of hits
+        :returns: list of the clusters and the number of clusters per event of every plane """
+    n_processes = cpu_count() if n_processes is None else n_processes
+    shards = get_shards(n_hits, max(min(shard_size, n_hits.size // (4 * n_processes) + 1), 1000))
+    pool = None
+    if n_processes > 1 and len(shards) > 1:
+        pool = Pool(min(n_processes, len(shards)), init_worker, ([to_shared(h) for h in hits], to_shared(n_hits)))
+        results = pool.imap(clusterise_shard, shards)
+    else:
+        Shared.update(hits=hits, n_hits=n_hits)
+        results = imap(clusterise_shard, shards)
+    planes = [([zeros(0, ClusterType)], [zeros(0, 'u2')]) for _ in xrange(len(hits))]
+    try:
+        n_done = 0
+        for (roc, start, stop, _, _), (clusters, n_clusters) in izip(shards, results):
+            planes[roc][0].append(clusters)
+            planes[roc][1].append(n_clusters)
+            n_done += stop - start
+            pbar.update(n_done) if pbar is not None else do_nothing()
+    finally:
+        Shared.clear()
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return [(concatenate(clusters), concatenate(n_clusters)) for clusters, n_clusters in planes]
+# endregion MULTIPROCESSING
+# -----------------------------------------
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Class to keep a bounded number of events in memory and to aggregate all events on arrival
+# created on October 18th 2026
+# --------------------------------------------------------
+
+from collections import deque
+from threading import Lock
+from os import remove
+from os.path import join
+from numpy import savez, load, zeros, full, array, arange, add, bincount
+from acquisition import n_events
+
+
+class HitAggregator(object):
+    """ Streaming hit map, pulse height distribution and counters of columnar event batches (daqGetEventBufferArrays). """
+
+    def __init__(self, i2cs, ph_min=-256, ph_max=256):
+        self.I2C = full(256, -1, 'i2')
+        self.I2C[array(i2cs, 'i2')] = arange(len(i2cs))
+        self.HitMap = zeros((len(i2cs), 52, 80), 'u8')
+        self.PHMin = ph_min
+        self.PH = zeros(ph_max - ph_min, 'u8')
+        self.NEvents = 0
+        self.NHits = 0
+
+    def add(self, batch):
+        roc = self.I2C[batch['roc']]
+        good = (roc >= 0) & (batch['column'] < 52) & (batch['row'] < 80)
+        add.at(self.HitMap, (roc[good], batch['column'][good], batch['row'][good]), 1)
+        ph = batch['value'].astype('i8') - self.PHMin
+        self.PH += bincount(ph[(ph >= 0) & (ph < self.PH.size)], minlength=self.PH.size).astype('u8')
+        self.NEvents += n_events(batch)
+        self.NHits += batch['roc'].size
+
+    def get_hit_map(self):
+        """ :returns: the hit map in the (values, mask) form of the dense pixel maps """
+        return self.HitMap.astype('d'), self.HitMap == 0
+
+    def get_ph_bins(self):
+        return arange(self.PHMin, self.PHMin + self.PH.size), self.PH
+
+
+class EventRing(object):
+    """ Keeps the latest [capacity] events as columnar batches in memory. Older batches are written to [spill_dir] if it is given and dropped otherwise.
+        Every batch is passed to the [aggregators] on arrival, so their results are always up to date. """
+
+    def __init__(self, capacity=100000, spill_dir=None, aggregators=None):
+        self.Capacity = capacity
+        self.SpillDir = spill_dir
+        self.Aggregators = aggregators if aggregators is not None else []
+
+        self.Batches = deque()
+        self.SpillFiles = []
+        self.Lock = Lock()
+        self.NInMemory = 0
+        self.NEvents = 0
+        self.NDropped = 0
+
+    def __len__(self):
+        """ :returns: the number of events which can still be read back """
+        return self.NEvents - self.NDropped
+
+    def add(self, batch):
+        for aggregator in self.Aggregators:
+            aggregator.add(batch)
+        with self.Lock:
+            self.Batches.append(batch)
+            self.NInMemory += n_events(batch)
+            self.NEvents += n_events(batch)
+            while self.NInMemory > self.Capacity and len(self.Batches) > 1:
+                old = self.Batches.popleft()
+                self.NInMemory -= n_events(old)
+                self.spill(old)
+
+    def spill(self, batch):
+        if self.SpillDir is None:
+            self.NDropped += n_events(batch)
+            return
+        file_name = join(self.SpillDir, 'batch{:06d}.npz'.format(len(self.SpillFiles)))
+        savez(file_name, **batch)
+        self.SpillFiles.append(file_name)
+
+    def __iter__(self):
+        return self.iter_batches()
+
+    def iter_batches(self):
+        """ yields the spilled batches from disk and then the ones in memory, oldest first """
+        for file_name in list(self.SpillFiles):
+            f = load(file_name)
+            yield {key: f[key] for key in f.files}
+            f.close()
+        with self.Lock:
+            batches = list(self.Batches)
+        for batch in batches:
+            yield batch
+
+    def clear(self):
+        for file_name in self.SpillFiles:
+            remove(file_name)
+        self.SpillFiles = []
+        self.Batches.clear()
+        self.NInMemory = self.NEvents = self.NDropped = 0
@@ -7,8 +7,7 @@
 from utils import *
 from os.path import join, dirname, realpath
 from glob import glob
-from ROOT import TF1
-from numpy import arange, split, genfromtxt, array
+from vcal_calibration import VcalCalibration
 
 
 class FileWriter:
@@ -29,8 +28,7 @@ class FileWriter:
         self.NEvents = 0
 
         # Pulse Height Calibrations
-        self.Fit = TF1('ErFit', '[3] * (TMath::Erf((x - [0]) / [1]) + [2])', -500, 255 * 7)
-        self.Parameters = self.load_calibration_fitpars()
+        self.Calibration = VcalCalibration(self.Trim, n_cols=self.NCols, n_rows=self.NRows)
 
         self.PBar = PBar()
 
@@ -41,19 +39,9 @@ class FileWriter:
         f_names = glob(join(self.DataDir, '*'))
         return 0 if not f_names else max(int(remove_letters(f_name.split('.')[0])) for f_name in f_names) + 1
 
-    def load_calibration_fitpars(self):
-        split_at = arange(self.NRows, self.NCols * self.NRows, self.NRows)  # split at every new column (after n_rows)
-        lst = array([split(genfromtxt(filename, skip_header=3, usecols=arange(4)), split_at) for filename in glob('phCalibrationFitErr{}*'.format(self.Trim))])
-        if not lst.size or not lst[0].size:
-            warning('Did not find calibration file for trim {}! '.format(self.Trim))
-            return
-        return lst
-
     def get_vcal(self, roc, col, row, adc):
-        if self.Parameters is None:
-            return adc
-        self.Fit.SetParameters(*self.Parameters[roc][col][row])
-        return self.Fit.GetX(adc)
+        """ :returns: the vcal of single hits or of whole hit arrays from the lookup table of the calibration """
+        return self.Calibration(roc, col, row, adc)
 
     def save_file(self):
         pass
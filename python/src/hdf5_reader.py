@@ -6,14 +6,15 @@
 
 import h5py
 from file_reader import *
-from numpy import full, arange, where
+from numpy import full, arange, where, cumsum, concatenate, memmap
 from ROOT import TH2I, TH1F, TProfile2D, TProfile
 from json import loads
 
 
 class HDF5Reader(FileReader):
 
-    def __init__(self, run_number=None, dut=0, config_name='main'):
+    def __init__(self, run_number=None, dut=0, config_name='main', mmap=False):
+        """ :param mmap: map the uncompressed, contiguous datasets into memory instead of reading them """
         FileReader.__init__(self, run_number, config_name, file_type='hdf5')
 
         # Data
@@ -21,7 +22,13 @@ class HDF5Reader(FileReader):
         self.NEvents = self.Data['n_hits'].size
         self.NHits = self.Data['hits'].size
         self.NClusters = self.Data['clusters'].size
+        self.MMap = mmap
+        self.Columns = {}  # (dataset, field): column, every field is read only once
+        self.Cuts = {}  # (cut name, parameters): indices of the selected entries
+        self.Offsets = {}  # offsets calculated for files without event index
+
         self.Fid = self.load_fiducial()
+        self.CutFid = self.get_fid_key()  # snapshot of the fiducial region of the cached cuts
         self.FidCut = self.load_fid_cut()
 
         self.Bins = [self.NCols, arange(-.5, self.NCols), self.NRows, arange(-.5, self.NRows)]
@@ -31,27 +38,118 @@ class HDF5Reader(FileReader):
 
     def load_file(self):
         return h5py.File(join(self.DataDir, self.FileName))
-        
-    def load_fid_cut(self, cluster=True):
+
+    # -----------------------------------------
+    # region CACHE
+    def get_data(self, key, field):
+        """ :returns: the column [field] of the dataset [key] ('hits' or 'clusters'), which is read from the file only at the first call """
+        if (key, field) not in self.Columns:
+            self.Columns[(key, field)] = self.load_column(key, field)
+        return self.Columns[(key, field)]
+
+    def load_column(self, key, field):
+        ds = self.Data[key]
+        offset = ds.id.get_offset() if self.MMap and ds.chunks is None and ds.compression is None else None
+        if offset is not None:
+            return memmap(self.File.filename, ds.dtype, 'r', offset, ds.shape)[field]
+        return ds[field]
+
+    def get_cut(self, name, *pars):
+        """ :returns: the memoised indices of the cut [name] ('fid' or 'vcal') with the parameters [pars]. All cuts are reset if the fiducial region changed. """
+        if self.get_fid_key() != self.CutFid:
+            self.reset_cuts()
+        if (name,) + pars not in self.Cuts:
+            self.Cuts[(name,) + pars] = getattr(self, 'calc_{}_cut'.format(name))(*pars)
+        return self.Cuts[(name,) + pars]
+
+    def calc_fid_cut(self, cluster):
         key = 'clusters' if cluster else 'hits'
-        x, y = self.Data[key]['column'], self.Data[key]['row']
+        x, y = self.get_data(key, 'column'), self.get_data(key, 'row')
         return where((x >= self.Fid[0]) & (x <= self.Fid[1]) & (y >= self.Fid[2]) & (y <= self.Fid[3]))[0] if self.Fid else None
 
-    def get_vcal_values(self, use_fid=True):
-        return self.Data['clusters']['vcal'] if not use_fid or not self.Fid else self.Data['clusters']['vcal'][self.FidCut]
-    
-    def get_x(self, use_fid=True, cluster=True):
+    def calc_vcal_cut(self, vcal, use_fid, cluster):
+        return where(self.get_vcal_values(use_fid, cluster) < vcal)[0]
+
+    def get_fid_key(self):
+        return tuple(self.Fid) if self.Fid else None
+
+    def reset_cuts(self):
+        self.Cuts.clear()
+        self.CutFid = self.get_fid_key()
+        self.FidCut = self.load_fid_cut()
+
+    def set_fiducial(self, fid=None):
+        """ sets the fiducial region [col_min, col_max, row_min, row_max] (default: reloaded from the config) and resets the cuts """
+        self.Fid = self.load_fiducial() if fid is None else fid
+        self.reset_cuts()
+    # endregion CACHE
+    # -----------------------------------------
+
+    def load_fid_cut(self, cluster=True):
+        return self.get_cut('fid', cluster)
+
+    # -----------------------------------------
+    # region EVENTS
+    def get_offsets(self, key, start, stop):
+        """ :returns: the index of the first entry of the events [start, stop) in the dataset [key] ('hits' or 'clusters') and the end of the last event """
+        name = {'hits': 'hit_offsets', 'clusters': 'cluster_offsets'}[key]
+        if name in self.Data:
+            return self.Data[name][start:stop + 1]
+        if key not in self.Offsets:
+            warning('no event index for the {} in {}, calculating it from all events'.format(key, self.FileName))
+            self.Offsets[key] = concatenate([[0], cumsum(self.Data['n_{}'.format(key)], dtype='i8')])
+        return self.Offsets[key][start:stop + 1]
+
+    def get_event_data(self, start, stop):
+        """ :returns: the event metadata (trigger phase, trigger count, timestamp) of the events [start, stop) which are stored in the file """
+        return {name: self.File[name][start:stop] for name in ['trigger_phase', 'trigger_count', 'timestamp'] if name in self.File}
+
+    def get_event(self, i):
+        """ :returns: dictionary with the hits, the clusters and the metadata of event [i] (only these slices are read from the file) """
+        i = i + self.NEvents if i < 0 else i
+        if not 0 <= i < self.NEvents:
+            raise IndexError('event {} out of range ({} events)'.format(i, self.NEvents))
+        event = {name: values[0] for name, values in self.get_event_data(i, i + 1).iteritems()}
+        for key in ['hits', 'clusters']:
+            start, stop = self.get_offsets(key, i, i + 1)
+            event[key] = self.Data[key][start:stop]
+        return event
+
+    def iter_events(self, start=0, stop=None, chunk=1000):
+        """ yields the events [start, stop) in the format of get_event, reading the file in slices of [chunk] events """
+        stop = self.NEvents if stop is None else min(stop, self.NEvents)
+        for first in xrange(start, stop, chunk):
+            last = min(first + chunk, stop)
+            event_data = self.get_event_data(first, last)
+            data = {}
+            for key in ['hits', 'clusters']:
+                offsets = self.get_offsets(key, first, last)
+                data[key] = (self.Data[key][offsets[0]:offsets[-1]], offsets - offsets[0])
+            for i in xrange(last - first):
+                event = {name: values[i] for name, values in event_data.iteritems()}
+                for key, (values, offsets) in data.iteritems():
+                    event[key] = values[offsets[i]:offsets[i + 1]]
+                yield event
+    # endregion EVENTS
+    # -----------------------------------------
+
+    def get_column(self, field, use_fid=True, cluster=True):
         key = 'clusters' if cluster else 'hits'
-        return self.Data[key]['column'] if not use_fid or not self.Fid else self.Data[key]['column'][self.load_fid_cut(cluster)]
+        return self.get_data(key, field) if not use_fid or not self.Fid else self.get_data(key, field)[self.load_fid_cut(cluster)]
+
+    def get_vcal_values(self, use_fid=True, cluster=True):
+        return self.get_column('vcal', use_fid, cluster)
+
+    def get_x(self, use_fid=True, cluster=True):
+        return self.get_column('column', use_fid, cluster)
 
     def get_y(self, use_fid=True, cluster=True):
-        key = 'clusters' if cluster else 'hits'
-        return self.Data[key]['row'] if not use_fid or not self.Fid else self.Data[key]['row'][self.load_fid_cut(cluster)]
+        return self.get_column('row', use_fid, cluster)
 
     def draw_hitmap(self, cluster=False, vcal=None, fid=False):
         h = TH2I('hhm{}'.format(cluster), '{} Map'.format('Cluster' if cluster else 'Hit'), *self.Bins)
-        x = self.get_x(fid, cluster) if vcal is None else self.get_x(fid, cluster)[where(self.get_vcal_values(fid) < vcal)]
-        y = self.get_y(fid, cluster) if vcal is None else self.get_y(fid, cluster)[where(self.get_vcal_values(fid) < vcal)]
+        x = self.get_x(fid, cluster) if vcal is None else self.get_x(fid, cluster)[self.get_cut('vcal', vcal, fid, cluster)]
+        y = self.get_y(fid, cluster) if vcal is None else self.get_y(fid, cluster)[self.get_cut('vcal', vcal, fid, cluster)]
         h.FillN(x.size, x.astype('d'), y.astype('d'), full(x.size, 1, 'd'))
         format_histo(h, x_tit='column', y_tit='row', y_off=1.2, z_tit='Number of Entries', z_off=1.6)
         self.Plotter.format_statbox(entries=True, x=.8)
@@ -62,7 +160,7 @@ class HDF5Reader(FileReader):
 
     def draw_signal_map(self):
         h = TProfile2D('psm', 'Signal Map', *self.Bins)
-        for x, y, v in zip(self.Data['clusters']['column'], self.Data['clusters']['row'], self.Data['clusters']['vcal']):
+        for x, y, v in zip(self.get_x(False), self.get_y(False), self.get_vcal_values(False)):
             h.Fill(x, y, v)
         format_histo(h, x_tit='column', y_tit='row', y_off=1.2, z_tit='VCAL', z_off=1.6, stats=0)
         self.Plotter.draw_histo(h, lm=.13, rm=.18, draw_opt='colz', x=1.17)
@@ -73,7 +171,7 @@ class HDF5Reader(FileReader):
         return [bins.size - 1, bins]
 
     def get_event_bins(self, bin_width=1000):
-        bins = arange(0, (self.FidCut.size if self.Fid else self.NClusters) + .01, bin_width)
+        bins = arange(0, (self.load_fid_cut().size if self.Fid else self.NClusters) + .01, bin_width)
         return [bins.size - 1, bins]
 
     def draw_vcal(self, bin_width=5, use_fid=True):
@@ -102,10 +200,10 @@ class HDF5Reader(FileReader):
         self.Plotter.draw_histo(h, lm=.12)
 
     def get_vcal(self):
-        return mean_sigma(self.Data['clusters']['vcal'])
+        return mean_sigma(self.get_vcal_values(False))
 
     def below_thresh(self, thresh=35):
-        return sum(self.Data['clusters']['vcal'] < thresh) / float(self.NClusters) * 100
+        return sum(self.get_vcal_values(False) < thresh) / float(self.NClusters) * 100
 
     def load_fiducial(self):
         if 'fid' in self.Config.options('CHIP'):
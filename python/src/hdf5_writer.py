@@ -5,44 +5,144 @@
 # --------------------------------------------------------
 
 import h5py
-from numpy import cumsum, mean, sum, empty, zeros
+from numpy import empty, zeros, cumsum, concatenate, array, arange, repeat, diff, bincount
 from file_writer import *
+from clustering import clusterise_planes, ClusterType
+
+HitType = [('column', 'u2'), ('row', 'u2'), ('adc', 'i2'), ('vcal', 'f4')]
+EventType = [('trigger_phase', 'u1'), ('trigger_count', 'u1'), ('timestamp', 'f8')]
+
+
+def make_offsets(n, start=0):
+    """ :returns: the 64 bit index of the first entry of every event and the end of the last event """
+    return start + concatenate([[0], cumsum(n, dtype='i8')])
+
+
+def event_arrays(events):
+    """ :returns: the columnar arrays of daqGetEventBufferArrays with the trigger phase and trigger count of the first core of a list of PxEvents """
+    pixels = [px for event in events for px in event.pixels]
+    data = {key: array([getattr(px, key) for px in pixels], dtype) for key, dtype in [('roc', 'u1'), ('column', 'u1'), ('row', 'u1'), ('value', 'f8')]}
+    data['offsets'] = make_offsets([len(event.pixels) for event in events])
+    data['trigger_phase'] = array([event.triggerPhases[:1] or [0] for event in events], 'u1').reshape((-1, 1))
+    data['trigger_count'] = array([(event.header[0] >> 8) & 0xff if event.header else 0 for event in events], 'u1').reshape((-1, 1))
+    return data
 
 
 class HDF5Writer(FileWriter):
 
-    def __init__(self, config_name):
+    def __init__(self, config_name, stream=False, chunk_size=10000, flush_time=10, compression=None, n_processes=None):
+        """ :param stream: append the events in chunks of [chunk_size] events to resizable datasets while they arrive instead of keeping the whole run in memory
+            :param flush_time: maximum time in seconds the events are kept in memory in streaming mode before they are written and the file is flushed
+            :param compression: hdf5 compression filter of the datasets, e.g. 'gzip', 'gzip:4' or 'lzf' (default from option 'compression' in [MAIN])
+            :param n_processes: number of processes for the clustering in convert (default: number of cores) """
         FileWriter.__init__(self, config_name, 'hdf5')
 
-        # Data
+        self.Stream = stream
+        self.ChunkSize = chunk_size
+        self.FlushTime = flush_time
+        self.Compression = self.load_compression(compression)
+        self.NProcesses = n_processes
+
+        # Data, buffered in chunks of the added batches
         self.NHits = []
+        self.NBuffered = 0
         self.Hits = self.init_list()
         self.Clusters = self.init_list()
         self.NClusters = self.init_list()
-        self.TriggerPhase = []
+        self.EventData = []
+
+        self.File = self.open_file() if stream else None
+        self.FlushStart = time()
 
     # noinspection PyTypeChecker
     def init_list(self):
         v = empty(self.NPlanes, list)
-        v.fill([])
+        for i in xrange(self.NPlanes):
+            v[i] = []
         return v
 
+    def load_compression(self, compression):
+        compression = self.Config.get('MAIN', 'compression') if compression is None and self.Config.has_option('MAIN', 'compression') else compression
+        if compression is None:
+            return {}
+        name, level = (compression.split(':') + [None])[:2]
+        return {'compression': name, 'compression_opts': int(level) if level is not None else None}
+
+    def create_dataset(self, grp, name, data=None, dtype=None):
+        """ creates a compressed dataset with [data] or an empty resizable dataset of [dtype] for streaming """
+        if data is not None:
+            return grp.create_dataset(name, data=data, **self.Compression) if len(data) else grp.create_dataset(name, data=data)
+        return grp.create_dataset(name, (0,), dtype, maxshape=(None,), chunks=(self.ChunkSize,), **self.Compression)
+
+    @staticmethod
+    def append(ds, data):
+        if data.size:
+            ds.resize((ds.shape[0] + data.size,))
+            ds[-data.size:] = data
+
     def convert(self):
+        if self.Stream:
+            return self.write_chunk()
         self.make_arrays()
         self.clusterise()
 
+    def open_file(self):
+        ensure_dir(self.DataDir)
+        info('streaming to file: {}'.format(self.FileName))
+        f = h5py.File(join(self.DataDir, self.FileName), 'w')
+        for name, dtype in EventType:
+            self.create_dataset(f, name, dtype=dtype)
+        for roc in xrange(self.NPlanes):
+            grp = f.create_group('ROC{}'.format(roc))
+            for name, dtype in [('hits', HitType), ('n_hits', 'u2'), ('clusters', ClusterType), ('n_clusters', 'u2'), ('hit_offsets', 'i8'), ('cluster_offsets', 'i8')]:
+                self.create_dataset(grp, name, dtype=dtype)
+            self.append(grp['hit_offsets'], make_offsets([]))
+            self.append(grp['cluster_offsets'], make_offsets([]))
+        return f
+
     def save_file(self):
-        if len(self.NHits):
+        if self.Stream:
+            if self.File is not None:
+                self.write_chunk()
+                info('closing file: {} ({} events)'.format(self.FileName, self.NEvents))
+                self.File.close()
+                self.File = None
+        elif self.NEvents:
             ensure_dir(self.DataDir)
             info('saving file: {}'.format(self.FileName))
             with h5py.File(join(self.DataDir, self.FileName), 'w') as f:
-                f.create_dataset('trigger_phase', data=array(self.TriggerPhase, 'u1')) if self.TriggerPhase else do_nothing()
+                event_data = self.make_event_array()
+                for name, dtype in EventType:
+                    self.create_dataset(f, name, event_data[name])
                 for roc in xrange(self.NPlanes):
                     grp = f.create_group('ROC{}'.format(roc))
-                    grp.create_dataset('hits', data=self.Hits[roc])
-                    grp.create_dataset('n_hits', data=self.NHits[roc])
-                    grp.create_dataset('clusters', data=self.Clusters[roc])
-                    grp.create_dataset('n_clusters', data=self.NClusters[roc])
+                    self.create_dataset(grp, 'hits', self.Hits[roc])
+                    self.create_dataset(grp, 'n_hits', self.NHits[roc])
+                    self.create_dataset(grp, 'clusters', self.Clusters[roc])
+                    self.create_dataset(grp, 'n_clusters', self.NClusters[roc])
+                    self.create_dataset(grp, 'hit_offsets', make_offsets(self.NHits[roc]))
+                    self.create_dataset(grp, 'cluster_offsets', make_offsets(self.NClusters[roc]))
+
+    def write_chunk(self):
+        """ converts the buffered events, appends them to the datasets and flushes the file """
+        if self.File is None or not self.NHits:
+            return
+        n_hits = self.make_n_hit_array()
+        hits = [self.make_hit_array(roc) for roc in xrange(self.NPlanes)]
+        for roc, (clusters, n_clusters) in enumerate(clusterise_planes(hits, n_hits, n_processes=1)):
+            grp = self.File['ROC{}'.format(roc)]
+            hit_offsets = make_offsets(n_hits[roc], grp['hit_offsets'][-1])[1:]
+            cluster_offsets = make_offsets(n_clusters, grp['cluster_offsets'][-1])[1:]
+            for name, data in [('hits', hits[roc]), ('n_hits', n_hits[roc]), ('clusters', clusters), ('n_clusters', n_clusters), ('hit_offsets', hit_offsets),
+                               ('cluster_offsets', cluster_offsets)]:
+                self.append(grp[name], data)
+        event_data = self.make_event_array()
+        for name, dtype in EventType:
+            self.append(self.File[name], event_data[name])
+        self.File.flush()
+        self.NEvents += n_hits.shape[1]
+        self.NHits, self.Hits, self.EventData, self.NBuffered = [], self.init_list(), [], 0
+        self.FlushStart = time()
 
     def add_data(self, data):
         info('adding data ... ')
@@ -51,47 +151,66 @@ class HDF5Writer(FileWriter):
             self.add_event(event)
             self.PBar.update(i)
 
+    def add_events(self, events):
+        """ adds a batch of events, either the columnar arrays of daqGetEventBufferArrays (with headers for the trigger phase and count) or a list of PxEvents """
+        self.add_arrays(events if type(events) is dict else event_arrays(events))
+        if self.Stream and (self.NBuffered >= self.ChunkSize or time() - self.FlushStart > self.FlushTime):
+            self.write_chunk()
+
     def add_event(self, event):
-        if not event.pixels:
+        self.add_arrays(event_arrays([event]))
+
+    def add_arrays(self, data):
+        """ buffers the hits of all planes and the event data of the columnar event arrays [data], events without hits are skipped """
+        n_events = data['offsets'].size - 1
+        if not n_events:
             return
-        self.TriggerPhase.append(event.triggerPhases[0]) if event.triggerPhases else do_nothing()
-        n_hits = zeros(self.NPlanes)
-        for hit in event.pixels:
-            n_hits[hit.roc] += 1
-            self.Hits[hit.roc].append((hit.column, hit.row, hit.value, self.get_vcal(hit.roc, hit.column, hit.row, hit.value)))
-        self.NHits.append(n_hits) if any(n_hits) else do_nothing()
+        roc = data['roc'].astype('i8')
+        events = repeat(arange(n_events), diff(data['offsets']))
+        in_planes = roc < self.NPlanes
+        n_hits = bincount(events[in_planes] * self.NPlanes + roc[in_planes], minlength=n_events * self.NPlanes).reshape((n_events, self.NPlanes)).astype('u2')
+        good = n_hits.any(axis=1)
+        if not good.any():
+            return
+        hits = zeros(roc.size, HitType)
+        hits['column'], hits['row'], hits['adc'] = data['column'], data['row'], data['value']
+        for i in xrange(self.NPlanes):
+            self.Hits[i].append(hits[(roc == i) & good[events]])
+        self.NHits.append(n_hits[good])
+        event_data = zeros(good.sum(), EventType)
+        for name in ['trigger_phase', 'trigger_count']:
+            if name in data and data[name].shape[1]:
+                event_data[name] = data[name][good, 0]
+        event_data['timestamp'] = time()
+        self.EventData.append(event_data)
+        self.NBuffered += event_data.size
+
+    def make_hit_array(self, roc):
+        """ :returns: the structured array of the buffered hits of [roc] with the vcal of all hits from a single lookup """
+        hits = concatenate([zeros(0, HitType)] + self.Hits[roc])
+        hits['vcal'] = self.get_vcal(roc, hits['column'], hits['row'], hits['adc'])
+        return hits
+
+    def make_n_hit_array(self):
+        """ :returns: the (n_planes, n_events) array of the number of hits of the buffered events """
+        return concatenate([zeros((0, self.NPlanes), 'u2')] + self.NHits).T
+
+    def make_event_array(self):
+        return concatenate([zeros(0, EventType)] + self.EventData)
 
     def make_arrays(self):
         for roc in xrange(self.NPlanes):
-            self.Hits[roc] = array(self.Hits[roc], dtype=[('column', 'u2'), ('row', 'u2'), ('adc', 'i2'), ('vcal', 'f4')])
-        self.NHits = array(self.NHits, 'u1').T
+            self.Hits[roc] = self.make_hit_array(roc)
+        self.NHits = self.make_n_hit_array()
         self.NEvents = self.NHits[0].size
 
-    # TODO revise this since algorithm is faulty!
     def clusterise(self):
         self.PBar.start(self.NEvents * self.NPlanes)
         info('clusterise ...')
-        for roc in xrange(self.NPlanes):
-            for i, event in enumerate(split(self.Hits[roc], cumsum(self.NHits[roc])[:-1])):
-                cluster_hits = [[event[0]]]
-                for hit in event[1:]:
-                    belongs_to_existing_cluster = False
-                    for clusters in cluster_hits:
-                        # check if any hit is close to a cluster hit
-                        if any((abs(array(clusters)['column'].astype('i2') - hit['column']) <= 1) & (abs(array(clusters)['row'].astype('i2') - hit['row']) <= 1)):
-                            clusters.append(hit)
-                            belongs_to_existing_cluster = True
-                            break
-                    # make new cluster
-                    if not belongs_to_existing_cluster:
-                        cluster_hits.append([hit])
-                for cluster in cluster_hits:
-                    cluster = array(cluster)
-                    self.Clusters[roc].append((mean(cluster['column']), mean(cluster['row']), sum(cluster['vcal'])))
-                self.NClusters[roc].append(len(cluster_hits))
-                self.PBar.update(i + self.NEvents * roc)
-            self.Clusters[roc] = array(self.Clusters[roc], dtype=[('column', 'f2'), ('row', 'f2'), ('vcal', 'f4')])
-            self.NClusters[roc] = array(self.NClusters[roc], 'u1')
+        planes = clusterise_planes(self.Hits, self.NHits, self.NProcesses, pbar=self.PBar)
+        for roc, (clusters, n_clusters) in enumerate(planes):
+            self.Clusters[roc], self.NClusters[roc] = clusters, n_clusters
+        self.PBar.finish()
 
 
 if __name__ == '__main__':
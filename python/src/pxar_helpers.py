@@ -1,6 +1,6 @@
 #!/usr/bin/env python2
 """ Helper classes and functions useful when interfacing the pxar API with Python. """
-from PyPxarCore import Pixel, PixelConfig, PyPxarCore, PyRegisterDictionary, PyProbeDictionary, Statistics
+from PyPxarCore import Pixel, PixelConfig, PyPxarCore, PyRegisterDictionary, PyProbeDictionary, Statistics, STATISTICS_FIELDS
 from functools import wraps # used in parameter verification decorator ("arity")
 import os
 from os.path import join
@@ -8,10 +8,11 @@ import sys
 import shlex
 from collections import OrderedDict
 from datetime import datetime
+from time import time
 from ConfigParser import ConfigParser
 from json import loads
 from utils import info, critical
-from numpy import full, array, arange
+from numpy import full, array, arange, where, argmax, nan_to_num, concatenate, cumsum, pad
 
 
 def arity(n, m, cs=[]): # n = min number of args, m = max number of args, cs = types
@@ -40,6 +41,13 @@ def arity(n, m, cs=[]): # n = min number of args, m = max number of args, cs = t
 
 
 def print_data(fullOutput,data,stepsize=1):
+    if type(data) is tuple:  # dense DAC scan: (values, dacs)
+        for dac, values in zip(data[1], data[0]):
+            pixels = zip(*where(nan_to_num(values) != 0))
+            s = "DAC " + str(dac) + ": "
+            s += ''.join('ROC {} [{},{},{}] '.format(roc, col, row, values[roc, col, row]) for roc, col, row in pixels) if fullOutput else str(len(pixels)) + " pixels"
+            print s
+        return
     for idac, dac in enumerate(data):
         s = "DAC " + str(idac*stepsize) + ": "
         if fullOutput:
@@ -50,6 +58,48 @@ def print_data(fullOutput,data,stepsize=1):
         print s
 
 
+def first_pixel(values):
+    """ :returns: the DAC scan of the first pixel that responded in the dense scan [values] with shape ([n_dac1, ]n_dac2, n_rocs, 52, 80) """
+    values = nan_to_num(values.reshape(values.shape[:-3] + (-1,)))
+    return values[..., argmax((values != 0).reshape(-1, values.shape[-1]).any(axis=0))]
+
+
+def pixel_arrays(data, i2cs=None):
+    """ :returns: roc, column, row and value arrays of a list of pixels, of the columnar dict of daqGetEventBufferArrays
+        or of the (values, mask) tuple of the dense maps. The ROC indices of the dense maps are translated to [i2cs] if given. """
+    if type(data) is tuple:
+        values, mask = data
+        roc, col, row = where(~mask)
+        return [array(i2cs, 'i2')[roc] if i2cs is not None else roc.astype('i2'), col.astype('i2'), row.astype('i2'), values[~mask]]
+    if type(data) is dict:
+        return [data[key].astype('i2') for key in ['roc', 'column', 'row']] + [data['value']]
+    return [array([getattr(px, key) for px in data], 'i2') for key in ['roc', 'column', 'row']] + [array([px.value for px in data], 'd')]
+
+
+def merge_event_arrays(data):
+    """ :returns: one dictionary from a list of dictionaries of daqGetEventBufferArrays. (n_events, n) arrays are padded with zeros to the largest n. """
+    shifts = cumsum([0] + [d['offsets'][-1] for d in data])
+    merged = {'offsets': concatenate([[0]] + [d['offsets'][1:] + shift for d, shift in zip(data, shifts)]).astype('i8')}
+    for key in (key for key in data[0] if key != 'offsets'):
+        arrays = [d[key] for d in data]
+        if arrays[0].ndim == 2:
+            width = max(a.shape[1] for a in arrays)
+            arrays = [pad(a, ((0, 0), (0, width - a.shape[1])), 'constant') for a in arrays]
+        merged[key] = concatenate(arrays)
+    return merged
+
+
+def set_pixels(api, enabled, masked):
+    """ enables and masks exactly the pixels of the (n_rocs, 52, 80) maps [enabled] and [masked] """
+    api.testAllPixels(0)
+    api.maskAllPixels(0)
+    for roc in xrange(enabled.shape[0]):
+        if enabled[roc].any():
+            api.testPixels(*(where(enabled[roc]) + (1, roc)))
+        if masked[roc].any():
+            api.maskPixels(*(where(masked[roc]) + (1, roc)))
+
+
 def get_possible_filename_completions(text):
     head, tail = os.path.split(text.strip())
     if head == "": #no head
@@ -210,8 +260,14 @@ class PxarTrimFile:
 
 class PxarStatistics:
 
-    def __init__(self, channels):
+    def __init__(self, channels, delta=False):
         self.NChannels = channels if channels else 1
+        self.Fields = OrderedDict([('General Information', ['info_words_read', 'empty_events', 'valid_events', 'valid_pixels']),
+                                   ('Event Errors', ['errors_event_start', 'errors_event_stop', 'errors_event_overflow', 'errors_event_invalid_words', 'errors_event_invalid_xor',
+                                                     'errors_event_frame', 'errors_event_idledata', 'errors_event_nodata', 'errors_event_pkam']),
+                                   ('TBM Errors', ['errors_tbm_header', 'errors_tbm_trailer', 'errors_tbm_eventid_mismatch']),
+                                   ('ROC Errors', ['errors_roc_missing', 'errors_roc_readback']),
+                                   ('Pixel Decoding Errors', ['errors_pixel_incomplete', 'errors_pixel_address', 'errors_pixel_pulseheight', 'errors_pixel_buffer_corrupt'])])
         self.GeneralInformation = OrderedDict([('words read', 0),
                                                ('events empty', 0),
                                                ('events valid', 0),
@@ -240,6 +296,11 @@ class PxarStatistics:
                                     ('ROC Errors', self.RocErrors),
                                     ('Pixel Decoding Errors', self.PixelDecodingErrors)])
 
+        # delta mode: keep the counters of every interval between two calls of add
+        self.Delta = delta
+        self.Intervals = []
+        self.LastTime = time()
+
     def __str__(self):
         string = ''
         for head, dic in self.AllDics.iteritems():
@@ -261,33 +322,39 @@ class PxarStatistics:
         f.close()
 
     def add(self, stats):
-        self.GeneralInformation['words read'] += stats.info_words_read
-        self.GeneralInformation['events empty'] += stats.empty_events
-        self.GeneralInformation['events valid'] += stats.valid_events
-        self.GeneralInformation['pixels valid'] += stats.valid_pixels
-        self.EventErrors['start marker'] += stats.errors_event_start
-        self.EventErrors['stop marker'] += stats.errors_event_stop
-        self.EventErrors['overflow'] += stats.errors_event_overflow
-        self.EventErrors['invalid words'] += stats.errors_event_invalid_words
-        self.EventErrors['invalid XOR'] += stats.errors_event_invalid_xor
-        self.EventErrors['frame'] += stats.errors_event_frame
-        self.EventErrors['idle data'] += stats.errors_event_idledata
-        self.EventErrors['no data'] += stats.errors_event_nodata
-        self.EventErrors['PKAM'] += stats.errors_event_pkam
-        self.TbmErrors['header'] += stats.errors_tbm_header
-        self.TbmErrors['trailer'] += stats.errors_tbm_trailer
-        self.TbmErrors['eventid mismatch'] += stats.errors_tbm_eventid_mismatch
-        self.RocErrors['missing header'] += stats.errors_roc_missing
-        self.RocErrors['readback'] += stats.errors_roc_readback
-        self.PixelDecodingErrors['incomplete'] += stats.errors_pixel_incomplete
-        self.PixelDecodingErrors['address'] += stats.errors_pixel_address
-        self.PixelDecodingErrors['pulse height'] += stats.errors_pixel_pulseheight
-        self.PixelDecodingErrors['buffer corruption'] += stats.errors_pixel_buffer_corrupt
+        """ adds the counters of a Statistics object, i.e. of one interval since getStatistics resets the counters.
+            :returns: the counters of the interval as dictionary """
+        counters = stats.as_array()
+        values = dict(zip(STATISTICS_FIELDS, counters.tolist()))
+        for dic, fields in zip(self.AllDics.itervalues(), self.Fields.itervalues()):
+            for key, field in zip(dic.iterkeys(), fields):
+                dic[key] += values[field]
+        if self.Delta:
+            t = time()
+            self.Intervals.append((t - self.LastTime, counters))
+            self.LastTime = t
+        return values
 
     def clear(self):
-        for dic in self.AllDics:
+        for dic in self.AllDics.itervalues():
             for key in dic.iterkeys():
                 dic[key] = 0
+        self.Intervals = []
+        self.LastTime = time()
+
+    def get_rates(self, n=1):
+        """ :returns: words/s, events/s and errors per event of the last [n] intervals (all for n=None) in delta mode """
+        if not self.Intervals:
+            return OrderedDict([('words/s', 0.), ('events/s', 0.), ('errors/event', 0.)])
+        intervals = self.Intervals[-n:] if n is not None else self.Intervals
+        t = sum(interval[0] for interval in intervals)
+        counters = dict(zip(STATISTICS_FIELDS, sum(interval[1] for interval in intervals).tolist()))
+        return OrderedDict([('words/s', counters['info_words_read'] / t if t else 0.),
+                            ('events/s', counters['total_events'] / t if t else 0.),
+                            ('errors/event', counters['errors'] / float(counters['total_events']) if counters['total_events'] else 0.)])
+
+    def print_rates(self, n=1):
+        print ', '.join('{}: {:.3g}'.format(key, value) for key, value in self.get_rates(n).iteritems())
 
     @property
     def valid_pixels(self):
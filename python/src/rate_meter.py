@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Class to measure event, hit and word rates of DAQ loops in a sliding window
+# created on October 18th 2026
+# --------------------------------------------------------
+
+from time import time
+from collections import OrderedDict
+from numpy import zeros, array, roll, diff, searchsorted, savetxt, column_stack
+
+
+class RateMeter(object):
+    """ Records the cumulative event, hit and word counts with time stamps in a ring buffer of [size] entries.
+        Recording is O(1), the rates are only calculated when they are requested. """
+
+    Fields = ('events', 'hits', 'words')
+
+    def __init__(self, size=10000, window=1.):
+        """ :param window: default length of the sliding window in seconds """
+        self.Size = size
+        self.Window = window
+        self.Times = zeros(size, 'd')
+        self.Counts = zeros((size, len(self.Fields)), 'u8')
+        self.Total = zeros(len(self.Fields), 'u8')
+        self.N = 0
+        self.StartTime = None
+        self.start()
+
+    def start(self, t=None):
+        """ resets the meter and sets the start time of the cumulative rates """
+        self.Total[:] = 0
+        self.N = 0
+        self.StartTime = time() if t is None else t
+        self.record(self.StartTime)
+
+    def record(self, t):
+        self.Times[self.N % self.Size] = t
+        self.Counts[self.N % self.Size] = self.Total
+        self.N += 1
+
+    def add(self, events=0, hits=0, words=0, t=None):
+        """ adds the counts read since the last call """
+        self.Total += array([events, hits, words], 'u8')
+        self.record(time() if t is None else t)
+
+    def update(self, events=None, hits=None, words=None, t=None):
+        """ sets the cumulative counts, e.g. from a progress bar or the testboard statistics """
+        for i, value in enumerate([events, hits, words]):
+            if value is not None:
+                self.Total[i] = value
+        self.record(time() if t is None else t)
+
+    def get_history(self):
+        """ :returns: the time stamps since the start and the cumulative counts of the records in the ring buffer, oldest first """
+        n = min(self.N, self.Size)
+        i = self.N % self.Size if self.N > self.Size else 0
+        return roll(self.Times[:n], -i) - self.StartTime, roll(self.Counts[:n], -i, axis=0)
+
+    def get_rate_curve(self):
+        """ :returns: the mean time and the rates (n, 3) between consecutive records """
+        t, counts = self.get_history()
+        dt = diff(t)
+        dt[dt == 0] = 1e-9
+        return t[:-1] + dt / 2, diff(counts.astype('d'), axis=0) / dt.reshape(-1, 1)
+
+    def get_windowed(self, window=None):
+        """ :returns: the rates in the last [window] seconds (the oldest record in the buffer limits the window) """
+        t, counts = self.get_history()
+        if t.size < 2:
+            return zeros(len(self.Fields))
+        i = min(searchsorted(t, t[-1] - (self.Window if window is None else window)), t.size - 2)
+        return (counts[-1] - counts[i]).astype('d') / max(t[-1] - t[i], 1e-9)
+
+    def get_instantaneous(self):
+        """ :returns: the rates between the last two records """
+        return self.get_windowed(0)
+
+    def get_duration(self):
+        """ :returns: the time between the start and the last record """
+        return self.Times[(self.N - 1) % self.Size] - self.StartTime
+
+    def get_cumulative(self):
+        t = self.get_duration()
+        return self.Total.astype('d') / t if t > 0 else zeros(len(self.Fields))
+
+    def get_rates(self, window=None):
+        return OrderedDict([('instantaneous', self.get_instantaneous()), ('windowed', self.get_windowed(window)), ('cumulative', self.get_cumulative())])
+
+    def format(self, field='events', window=None, unit='Hz'):
+        i = self.Fields.index(field)
+        return '{}: {:8.1f} {u} ({:.0f}s: {:8.1f} {u}, total: {:8.1f} {u})'.format(field, self.get_instantaneous()[i], self.Window if window is None else window,
+                                                                                 self.get_windowed(window)[i], self.get_cumulative()[i], u=unit)
+
+    def print_rates(self, window=None):
+        print 'Rates (instantaneous, {:.0f}s window, cumulative):'.format(self.Window if window is None else window)
+        for field, total, i, w, c in zip(self.Fields, self.Total, *self.get_rates(window).values()):
+            if not total:  # field not recorded
+                continue
+            print '  {:<8}{: 12.1f}{: 12.1f}{: 12.1f} Hz'.format(field, i, w, c)
+
+    def save_csv(self, file_name):
+        t, rates = self.get_rate_curve()
+        savetxt(file_name, column_stack([t, rates]), delimiter=',', header=','.join(('time',) + self.Fields), comments='')
+
+    def save_hdf5(self, file_name, group='rates'):
+        import h5py
+        t, counts = self.get_history()
+        with h5py.File(file_name, 'a') as f:
+            if group in f:
+                del f[group]
+            g = f.create_group(group)
+            g.attrs['start_time'] = self.StartTime
+            g.create_dataset('time', data=t)
+            for i, field in enumerate(self.Fields):
+                g.create_dataset(field, data=counts[:, i])
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Class to find the vcal thresholds of many pixels in parallel with a bisection
+# created on October 18th 2026
+# --------------------------------------------------------
+
+from numpy import full, zeros, where, unique, nan
+from math import ceil, log
+from utils import do_nothing
+from pxar_helpers import set_pixels
+
+
+class ThresholdFinder(object):
+    """ Finds the vcal threshold (first vcal with at least 50% efficiency) of many pixels with a parallel bisection.
+        In every step each unresolved pixel is measured once with [n_trig] triggers at the centre of its search interval. The pixels are grouped by this vcal
+        and only the pixels of one group are enabled for getEfficiencyVsDAC. A pixel leaves the search as soon as its interval is not larger than [resolution]. """
+
+    def __init__(self, api, n_trig=10, vcal_min=0, vcal_max=255, resolution=1, flags=0):
+        self.API = api
+        self.NTrig = n_trig
+        self.Min = vcal_min
+        self.Max = vcal_max
+        self.Resolution = resolution
+        self.Flags = flags
+
+        self.NTriggers = 0
+        self.NScans = 0
+        self.NSteps = 0
+
+    def run(self, pixels=None, pbar=None):
+        """ :param pixels: (n_rocs, 52, 80) bool array of the pixels to scan, default: all enabled and unmasked pixels
+            :param pbar: PBar
+            :returns: (n_rocs, 52, 80) array with the thresholds, NaN for pixels not reaching 50% below vcal_max. The pixel configuration is restored afterwards. """
+        enabled, masked = self.API.getEnableMap(), self.API.getMaskMap()
+        active = (enabled & ~masked) if pixels is None else pixels.copy()
+        lo, hi = full(active.shape, self.Min - 1, 'i2'), full(active.shape, self.Max + 1, 'i2')  # open interval, so that both edges can be measured
+        responded = zeros(active.shape, bool)
+        self.NTriggers = self.NScans = self.NSteps = 0
+        pbar.start(int(ceil(log(max(self.Max - self.Min + 2, 2) / float(self.Resolution), 2)))) if pbar is not None else do_nothing()
+        while active.any():
+            mid = (lo + hi) // 2
+            for vcal in unique(mid[active]):
+                group = active & (mid == vcal)
+                set_pixels(self.API, group, ~group)
+                values = self.API.getEfficiencyVsDAC('vcal', 1, int(vcal), int(vcal), self.Flags, self.NTrig, dense=True)[0][0]
+                above = group & (values >= .5 * self.NTrig)
+                hi[above] = vcal
+                lo[group & ~above] = vcal
+                responded |= above
+                self.NTriggers += group.sum() * self.NTrig
+                self.NScans += 1
+            active &= hi - lo > self.Resolution
+            self.NSteps += 1
+            pbar.update(self.NSteps) if pbar is not None else do_nothing()
+        pbar.finish() if pbar is not None else do_nothing()
+        set_pixels(self.API, enabled, masked)
+        return where(responded, hi, nan)
+
+    def print_stats(self, n_pixels=None):
+        print 'Threshold search: {} bisection steps, {} scans, {} triggers'.format(self.NSteps, self.NScans, self.NTriggers),
+        print '(linear scan: {} triggers)'.format(n_pixels * self.NTrig * (self.Max - self.Min + 1)) if n_pixels is not None else ''
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Class to find the window of working clk and deser160phase delays of the testboard
+# created on October 18th 2026
+# --------------------------------------------------------
+
+from json import load, dump
+from os.path import isfile
+from numpy import zeros, full, where, array, argmax
+from utils import info, warning, GREEN, YELLOW, RED, ENDC
+
+UNKNOWN, BAD, GOOD = -1, 0, 1
+
+
+def clock_delays(clk, digital=True):
+    """ :returns: the testboard delays which have to follow the clk delay """
+    return {'clk': clk, 'ctr': clk, 'sda': clk + (15 if digital else 11), 'tin': clk + (5 if digital else 2)}
+
+
+class TimingScan(object):
+    """ Finds the window of clk/deser160phase settings for which [measure] returns full efficiency. A coarse pass measures every [step]th point of the grid,
+        afterwards the window is grown by measuring all points next to good points. Points which are never reached are bad.
+        If the coarse pass does not find any good point (the window may be narrower than [step]), the full grid is measured.
+        The window of every module is cached in [cache_file]: a later search only checks the centre and the edge of the cached window.
+        All delays of one point are written with a single setTestboardDelays call. """
+
+    def __init__(self, api, delays, measure, module_id, digital=True, n_clk=20, n_phases=8, step=2, exclude=None, cache_file=None):
+        """ :param delays: dictionary of the current testboard delays, it is updated with every point
+            :param measure: function returning the efficiency at the current setting """
+        self.API = api
+        self.Delays = delays
+        self.Measure = measure
+        self.ModuleID = module_id
+        self.Digital = digital
+        self.Step = step
+        self.Exclude = [] if exclude is None else exclude
+        self.CacheFile = cache_file
+
+        self.Efficiency = full((n_clk, n_phases), -1.)
+        self.Status = full((n_clk, n_phases), UNKNOWN, 'i1')
+        self.NMeasured = 0
+
+    # -----------------------------------------
+    # region CACHE
+    def load_cache(self):
+        if self.CacheFile is None or not isfile(self.CacheFile):
+            return {}
+        with open(self.CacheFile) as f:
+            return load(f)
+
+    def get_cached_window(self):
+        """ :returns: the bool grid of the cached good window of the module or None """
+        cache = self.load_cache().get(self.ModuleID)
+        if cache is None:
+            return
+        window = zeros(self.Status.shape, bool)
+        for clk, phase in cache['good']:
+            if clk < window.shape[0] and phase < window.shape[1]:
+                window[clk, phase] = True
+        return window if window.any() else None
+
+    def save_cache(self, best):
+        if self.CacheFile is None:
+            return
+        cache = self.load_cache()
+        cache[self.ModuleID] = {'good': array(where(self.get_window())).T.tolist(), 'best': list(best)}
+        with open(self.CacheFile, 'w') as f:
+            dump(cache, f, indent=2)
+    # endregion CACHE
+    # -----------------------------------------
+
+    def set_point(self, clk, phase):
+        self.Delays.update(clock_delays(clk, self.Digital), deser160phase=phase)
+        self.API.setTestboardDelays(self.Delays)
+
+    def measure(self, clk, phase):
+        if self.Status[clk, phase] != UNKNOWN or clk in self.Exclude:
+            return self.Status[clk, phase]
+        self.set_point(clk, phase)
+        self.Efficiency[clk, phase] = self.Measure()
+        self.Status[clk, phase] = GOOD if self.Efficiency[clk, phase] == 1 else BAD
+        self.NMeasured += 1
+        return self.Status[clk, phase]
+
+    def get_neighbours(self, clk, phase, radius=1):
+        """ :returns: the status of the points around [clk, phase], the phase is cyclic """
+        clks = range(max(clk - radius, 0), min(clk + radius + 1, self.Status.shape[0]))
+        phases = [p % self.Status.shape[1] for p in xrange(phase - radius, phase + radius + 1)]
+        return self.Status[clks][:, phases]
+
+    def refine(self):
+        """ measures the unknown points next to good points until the window is closed, the remaining points are bad """
+        radius = max(self.Step - 1, 1)
+        while True:
+            edge = [(c, p) for c, p in zip(*where(self.Status == UNKNOWN)) if c not in self.Exclude and GOOD in self.get_neighbours(c, p, radius)]
+            if not edge:
+                break
+            for clk, phase in edge:
+                self.measure(clk, phase)
+        self.Status[self.Status == UNKNOWN] = BAD
+
+    def coarse_scan(self, step=None):
+        step = self.Step if step is None else step
+        for clk in xrange(0, self.Status.shape[0], step):
+            for phase in xrange(0, self.Status.shape[1], step):
+                self.measure(clk, phase)
+
+    def check_cached(self, window, best):
+        """ measures the best point and the edge of the cached [window] :returns: whether all results agree with the cache """
+        if self.measure(*best) != GOOD:
+            return False
+        points = zip(*where(window))
+        edge = [(c, p) for c, p in points if not self.window_neighbours(window, c, p).all()]
+        outside = set((c, p % window.shape[1]) for c0, p0 in edge for c in xrange(max(c0 - 1, 0), min(c0 + 2, window.shape[0])) for p in xrange(p0 - 1, p0 + 2))
+        for clk, phase in edge:
+            if self.measure(clk, phase) != GOOD:
+                return False
+        for clk, phase in outside:
+            if not window[clk, phase] and self.measure(clk, phase) == GOOD:
+                return False
+        self.Status[(self.Status == UNKNOWN) & window] = GOOD
+        self.Status[self.Status == UNKNOWN] = BAD
+        return True
+
+    def window_neighbours(self, window, clk, phase):
+        clks = range(max(clk - 1, 0), min(clk + 2, window.shape[0]))
+        return window[clks][:, [p % window.shape[1] for p in xrange(phase - 1, phase + 2)]]
+
+    def get_window(self):
+        return self.Status == GOOD
+
+    def get_best(self):
+        """ :returns: the good point with the largest distance to the edge of the window """
+        good = zip(*where(self.get_window()))
+        if not good:
+            return
+        distance = [min([r for r in xrange(1, max(self.Status.shape)) if not self.get_neighbours(c, p, r).all()] or [max(self.Status.shape)]) for c, p in good]
+        return tuple(int(i) for i in good[argmax(distance)])
+
+    def run(self):
+        """ :returns: the best clk and deser160phase or None if no good setting was found """
+        window = self.get_cached_window()
+        cached = self.load_cache().get(self.ModuleID, {}).get('best')
+        if window is not None and cached is not None and self.check_cached(window, tuple(cached)):
+            info('timing window of module {} confirmed with {} measurements'.format(self.ModuleID, self.NMeasured))
+        else:
+            if window is not None:
+                warning('cached timing window of module {} changed, starting a new search'.format(self.ModuleID))
+            self.coarse_scan()
+            if not (self.Status == GOOD).any() and self.Step > 1:
+                warning('no good point in the coarse timing scan, scanning the full grid')
+                self.coarse_scan(step=1)
+            self.refine()
+            info('scanned timing window with {} of {} points'.format(self.NMeasured, self.Status.size))
+        best = self.get_best()
+        if best is not None:
+            self.set_point(*best)
+            self.save_cache(best)
+        return best
+
+    def print_grid(self):
+        print '\nCLK', ' '.join('{:2d} '.format(i) for i in xrange(self.Status.shape[1]))
+        for clk in xrange(self.Status.shape[0]):
+            effs = []
+            for phase in xrange(self.Status.shape[1]):
+                eff = self.Efficiency[clk, phase]
+                if eff < 0:
+                    effs.append(' {} '.format('o' if self.Status[clk, phase] == GOOD else '.'))
+                else:
+                    effs.append('{c}{eff:1.1f}{e}'.format(eff=eff, c=GREEN if eff == 1 else YELLOW if eff > .5 else RED, e=ENDC) if eff > 0 else ' x ')
+            print '{:2d}:'.format(clk), ' '.join(effs)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Class to send triggers with a fixed frequency from a background thread
+# created on October 18th 2026
+# --------------------------------------------------------
+
+from threading import Thread, Event
+from time import time, sleep
+from rate_meter import RateMeter
+
+CLOCK = 40e6  # testboard clock [Hz]
+
+
+class TriggerScheduler(object):
+    """ Sends triggers with [freq] Hz. The deadline of every trigger is calculated from the start time, so delays do not accumulate.
+        If the scheduler falls behind, all due triggers (at most [max_burst]) are sent in a single daqTrigger call with [period] clock cycles between them.
+        Frequencies above [max_soft_freq] are generated by the pattern generator loop of the testboard (daqTriggerLoop). """
+
+    def __init__(self, api, freq, period=500, max_burst=100, max_soft_freq=1000.):
+        self.API = api
+        self.Freq = float(freq)
+        self.Period = period
+        self.MaxBurst = max_burst
+        self.IsHardware = self.Freq > max_soft_freq
+
+        self.Thread = None
+        self.Stop = Event()
+        self.Meter = RateMeter(window=5)
+        self.StartTime = None
+        self.StopTime = None
+        self.LoopPeriod = None
+
+        # statistics
+        self.NTriggers = 0
+        self.NBursts = 0
+        self.MaxBehind = 0
+
+    def start(self):
+        """ starts the triggers, the DAQ has to be running """
+        self.Stop.clear()
+        self.StartTime, self.StopTime = time(), None
+        self.Meter.start(self.StartTime)
+        if self.IsHardware:
+            period = int(round(CLOCK / self.Freq))
+            self.LoopPeriod = self.API.daqTriggerLoop(period) or period  # the testboard may force a longer period
+            return
+        self.Thread = Thread(target=self.run, name='trigger')
+        self.Thread.setDaemon(True)
+        self.Thread.start()
+
+    def run(self):
+        while not self.Stop.is_set():
+            due = int((time() - self.StartTime) * self.Freq) + 1 - self.NTriggers
+            if due > 0:
+                n = min(due, self.MaxBurst)
+                self.API.daqTrigger(n, self.Period)
+                self.NTriggers += n
+                self.NBursts += 1
+                self.MaxBehind = max(self.MaxBehind, due - 1)
+                self.Meter.add(n)
+            sleep(min(max(self.StartTime + self.NTriggers / self.Freq - time(), 0), .1))
+
+    def stop(self):
+        self.Stop.set()
+        if self.IsHardware:
+            self.API.daqTriggerLoopHalt()
+        elif self.Thread is not None:
+            self.Thread.join()
+        self.StopTime = time()
+
+    def is_running(self):
+        return self.StartTime is not None and self.StopTime is None
+
+    def get_rate(self):
+        """ :returns: the achieved trigger frequency in Hz """
+        if self.IsHardware:
+            return CLOCK / self.LoopPeriod if self.LoopPeriod else 0.
+        t = (time() if self.StopTime is None else self.StopTime) - self.StartTime
+        return self.NTriggers / t if t > 0 else 0.
+
+    def print_stats(self):
+        if self.IsHardware:
+            print 'Trigger loop of the testboard: {:.1f} Hz (requested {:.1f} Hz, period {} clk)'.format(self.get_rate(), self.Freq, self.LoopPeriod)
+        else:
+            print 'Triggers: {} in {} bursts, {:.1f} Hz (requested {:.1f} Hz), max {} behind'.format(self.NTriggers, self.NBursts, self.get_rate(), self.Freq, self.MaxBehind)
@@ -15,6 +15,7 @@ from progressbar import Bar, ETA, FileTransferSpeed, Percentage, ProgressBar, Wi
 from uncertainties import ufloat
 from uncertainties.core import Variable, AffineScalarFunc
 from functools import wraps
+from rate_meter import RateMeter
 
 
 type_dict = {'int32': 'I',
@@ -274,17 +275,18 @@ class PBar(object):
 
 
 class EventSpeed(Widget):
-    """Widget for showing the event speed (useful for slow updates)."""
+    """Widget for showing the event speed in a sliding window (useful for slow updates)."""
 
-    def __init__(self, t='s'):
+    def __init__(self, t='s', window=10.):
         self.unit = t
         self.factor = {'s': 1, 'min': 60, 'h': 60 * 60}[t]
+        self.meter = RateMeter(1000, window)
 
     def update(self, pbar):
-        value = 0
-        if pbar.seconds_elapsed > 2e-6 and pbar.currval > 2e-6:
-            value = pbar.currval / pbar.seconds_elapsed * self.factor
-        return '{:4.1f} E/{}'.format(value, self.unit)
+        if pbar.start_time != self.meter.StartTime:  # (re)started bar
+            self.meter.start(pbar.start_time)
+        self.meter.update(pbar.currval)
+        return '{:4.1f} E/{}'.format(self.meter.get_windowed()[0] * self.factor, self.unit)
 
 
 def update_pbar(func):
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Class to tune the vana of all ROCs of a module in common rounds
+# created on October 18th 2026
+# --------------------------------------------------------
+
+from numpy import zeros, full, where, clip, rint, maximum, array
+from utils import info, warning
+
+
+class VanaTuner(object):
+    """ Tunes the vana of all ROCs in common rounds of Newton steps, such that every ROC alone (all other vana at 0) gives an analogue current of [target] mA,
+        as the sequential tuning. Only the total analogue current can be measured, so the current of every ROC is measured with all other ROCs at vana 0
+        and its slope by perturbing its vana by [delta]. Converged ROCs are not measured again since all current readings are cached by the vana settings. """
+
+    def __init__(self, api, read_ia, n_rocs, target=24, vana_range=(60, 180), delta=5, tolerance=.3, max_rounds=8):
+        """ :param read_ia: function returning the analogue current in mA """
+        self.API = api
+        self.ReadIA = read_ia
+        self.NRocs = n_rocs
+        self.Target = target
+        self.Range = vana_range
+        self.Delta = delta
+        self.Tolerance = tolerance
+        self.MaxRounds = max_rounds
+
+        self.Vanas = full(n_rocs, -1, 'i2')
+        self.Base = None
+        self.Cache = {}
+        self.Trace = []  # (round, vanas, currents of the ROCs above the baseline)
+
+    def set_vanas(self, vanas):
+        for roc in where(vanas != self.Vanas)[0]:
+            self.API.setDAC('vana', int(vanas[roc]), int(roc))
+        self.Vanas = array(vanas, 'i2')
+
+    def measure(self, vanas):
+        """ :returns: the analogue current for the [vanas] of all ROCs """
+        key = tuple(vanas)
+        if key not in self.Cache:
+            self.set_vanas(vanas)
+            self.Cache[key] = self.ReadIA()
+        return self.Cache[key]
+
+    def measure_roc(self, roc, vana):
+        """ :returns: the analogue current above the baseline with [roc] at [vana] and all other ROCs at vana 0 """
+        vanas = zeros(self.NRocs, 'i2')
+        vanas[roc] = vana
+        return self.measure(vanas) - self.Base
+
+    def get_slope(self, roc, vana, current):
+        """ :returns: the change of the analogue current of [roc] per vana step around [vana] """
+        perturbed = min(vana + self.Delta, 255)
+        return (self.measure_roc(roc, perturbed) - current) / max(perturbed - vana, 1)
+
+    def run(self):
+        """ :returns: the vana of every ROC """
+        self.Base = self.measure(zeros(self.NRocs, 'i2'))
+        goal = self.Target - self.Base
+        if goal <= 0:
+            warning('analogue current with all vana at 0 ({:.1f} mA) exceeds the target of {} mA'.format(self.Base, self.Target))
+        vanas = full(self.NRocs, sum(self.Range) // 2, 'i2')
+        slopes = zeros(self.NRocs)
+        for i in xrange(self.MaxRounds):
+            currents = array([self.measure_roc(roc, vana) for roc, vana in enumerate(vanas)])
+            self.Trace.append((i, vanas.copy(), currents))
+            info('round {}: {} mA, vana: {}'.format(i, ' '.join('{:.1f}'.format(self.Base + c) for c in currents), ' '.join(str(v) for v in vanas)))
+            todo = abs(currents - goal) > self.Tolerance
+            if not todo.any():
+                break
+            for roc in where(todo)[0]:
+                slopes[roc] = self.get_slope(roc, vanas[roc], currents[roc])
+            new = where(todo, clip(vanas + rint((goal - currents) / maximum(slopes, .01)), *self.Range), vanas).astype('i2')
+            if (new == vanas).all():
+                warning('vana tuning cannot improve further (range {})'.format(self.Range))
+                break
+            vanas = new
+        else:
+            warning('vana tuning did not converge in {} rounds'.format(self.MaxRounds))
+        self.set_vanas(vanas)
+        total = self.measure(vanas)
+        info('tuned vana in {} rounds with {} current readings, total analogue current: {:.1f} mA'.format(len(self.Trace), len(self.Cache), total))
+        return vanas
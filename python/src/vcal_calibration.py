@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Class to convert pulse heights (adc) to vcal with a per pixel lookup table
+# created on October 18th 2026
+# --------------------------------------------------------
+
+from hashlib import md5
+from glob import glob
+from math import erf
+from os.path import join, basename
+from re import search
+from numpy import genfromtxt, arange, array, linspace, interp, clip, where, load, save, float32, concatenate
+from utils import info, warning, ensure_dir, get_base_dir
+
+ADC_MIN, ADC_MAX = -256, 255  # range of the signed adc values of digital and analogue ROCs
+
+
+def roc_number(filename):
+    """ :returns: the ROC number n of a calibration file name ..._C<n>.dat """
+    match = search(r'_C(\d+)', basename(filename))
+    return int(match.group(1)) if match else -1
+
+
+class VcalCalibration(object):
+    """ Lookup table of the vcal for every pixel and every adc value in [ADC_MIN, ADC_MAX] (n_rocs, n_cols, n_rows, 512) as float32, built from the parameters of the fits
+        [3] * (Erf((x - [0]) / [1]) + [2]) in the phCalibrationFitErr files. The table is built with the analytic inverse of the fit function, which gives the same
+        result as TF1.GetX in the range [v_min, v_max]. It is cached in [cache_dir] with the hash of the calibration files as key. """
+
+    def __init__(self, trim='', directory='.', cache_dir=None, n_cols=52, n_rows=80, v_min=-500, v_max=255 * 7):
+        self.Files = sorted(glob(join(directory, 'phCalibrationFitErr{}_C*'.format(trim))), key=roc_number)
+        self.CacheDir = join(get_base_dir(), '.cache') if cache_dir is None else cache_dir
+        self.NCols = n_cols
+        self.NRows = n_rows
+        self.Range = (v_min, v_max)
+        self.Table = self.load_table()
+
+    def __call__(self, roc, col, row, adc):
+        """ :returns: the vcal of the hits with [adc] values in the pixels [col], [row] of [roc], each argument can be a number or an array """
+        return self.Table[roc, col, row, clip(adc, ADC_MIN, ADC_MAX) - ADC_MIN] if self.Table is not None else array(adc, 'f4')
+
+    def get_hash(self):
+        h = md5()
+        for filename in self.Files:
+            with open(filename) as f:
+                h.update(f.read())
+        return h.hexdigest()
+
+    def load_parameters(self):
+        """ :returns: the fit parameters of all pixels (n_rocs, n_cols, n_rows, 4) or None """
+        pars = [genfromtxt(filename, skip_header=3, usecols=arange(4)) for filename in self.Files]
+        if not pars or any(par.size != self.NCols * self.NRows * 4 for par in pars):
+            return
+        return array(pars).reshape((len(pars), self.NCols, self.NRows, 4))
+
+    def load_table(self):
+        if not self.Files:
+            warning('Did not find calibration file! Using the adc values instead of vcal.')
+            return
+        filename = join(self.CacheDir, 'vcal_table_{}_{}_{}.npy'.format(self.get_hash(), ADC_MIN, ADC_MAX))
+        try:
+            return load(filename, mmap_mode='r')
+        except (IOError, ValueError):  # missing or corrupt cache file
+            pars = self.load_parameters()
+            if pars is None:
+                warning('Could not read the calibration files {}! Using the adc values instead of vcal.'.format(', '.join(self.Files)))
+                return
+            info('building vcal lookup table for {} ROCs ...'.format(pars.shape[0]))
+            table = self.build_table(pars)
+            ensure_dir(self.CacheDir)
+            save(filename, table)
+            return table
+
+    def build_table(self, pars):
+        """ :returns: the table from the analytic inverse of the fit function, Erf^-1 is interpolated from a fine grid """
+        x = linspace(-5, 5, 200001)
+        grid = concatenate([[-1], [erf(i) for i in x[1:-1]], [1]])
+        table = []
+        for p0, p1, p2, p3 in [[roc_pars[..., i, None] for i in xrange(4)] for roc_pars in pars]:
+            y = arange(ADC_MIN, ADC_MAX + 1) / p3 - p2  # value of the Erf for every adc
+            vcal = where(y >= 1, self.Range[1], where(y <= -1, self.Range[0], p0 + p1 * interp(y, grid, x)))
+            table.append(clip(vcal, *self.Range).astype(float32))
+        return array(table)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Class to measure the pulse height vs. vcal of all pixels for the pulse height calibration
+# created on October 18th 2026
+# --------------------------------------------------------
+
+from collections import OrderedDict
+from numpy import arange, array, zeros, full, add, where, nan, isnan, concatenate, searchsorted, rint, maximum
+from os.path import join
+from utils import do_nothing
+from pxar_helpers import set_pixels
+
+
+def half_columns(n_cols=52, n_rows=80):
+    """ :returns: the columns and rows of the pixels of every half column """
+    return [(full(n_rows / 2, col), arange(n_rows / 2) + start) for col in xrange(n_cols) for start in [0, n_rows / 2]]
+
+
+class VcalSweep(object):
+    """ Pulse height vs. vcal of all pixels of all ROCs in the low (ctrlreg 0) and in the high (ctrlreg 4) vcal range.
+        The scan is either delegated to getPulseheightVsDAC of the core, or the pixels are enabled in [groups] and all [n_trig] triggers of a vcal step are
+        sent at once and read back with a single buffer read. """
+
+    HighScale = 7  # vcal high range / low range
+
+    def __init__(self, api, n_trig=10, vcals_low=None, vcals_high=None, period=500, groups=None):
+        self.API = api
+        self.NTrig = n_trig
+        self.Period = period
+        self.Groups = half_columns() if groups is None else groups
+        self.Ranges = OrderedDict([(0, arange(256) if vcals_low is None else array(vcals_low)), (4, arange(256) if vcals_high is None else array(vcals_high))])
+        self.I2Cs = array(api.getRocI2Caddr(), 'i2')
+        self.PH = None  # (n_rocs, 52, 80, n_vcals) mean pulse heights, NaN for pixels without response
+
+    def get_vcals(self):
+        """ :returns: the vcals of both ranges in units of the low range """
+        return concatenate([self.Ranges[0], self.Ranges[4] * self.HighScale])
+
+    def run(self, parallel=True, pbar=None):
+        """ :param pbar: PBar
+            :returns: the mean pulse heights (n_rocs, 52, 80, n_vcals). The pixel configuration is restored afterwards. """
+        ctrl_reg = self.API.getRocDACs(0)['ctrlreg']
+        enabled, masked = self.API.getEnableMap(), self.API.getMaskMap()
+        self.API.testAllPixels(1)
+        self.API.maskAllPixels(0)
+        pbar.start(len(self.Ranges) * (1 if parallel else len(self.Groups))) if pbar is not None else do_nothing()
+        ph = []
+        for i, (reg, vcals) in enumerate(self.Ranges.iteritems()):
+            self.API.setDAC('ctrlreg', reg)
+            ph.append(self.scan_parallel(vcals) if parallel else self.scan_groups(vcals, pbar, i * len(self.Groups)))
+            pbar.update(i + 1) if pbar is not None and parallel else do_nothing()
+        pbar.finish() if pbar is not None else do_nothing()
+        self.API.setDAC('ctrlreg', ctrl_reg)
+        set_pixels(self.API, enabled, masked)
+        self.PH = concatenate(ph, axis=-1)
+        return self.PH
+
+    def scan_parallel(self, vcals):
+        values, dacs = self.API.getPulseheightVsDAC('vcal', 1, int(vcals.min()), int(vcals.max()), 0, self.NTrig, dense=True)
+        return values[searchsorted(dacs, vcals)].transpose(1, 2, 3, 0)
+
+    def scan_groups(self, vcals, pbar=None, n_done=0):
+        ph = zeros((self.I2Cs.size, 52, 80, vcals.size))
+        n = zeros(ph.shape, 'u4')
+        roc_index = full(256, -1, 'i2')
+        roc_index[self.I2Cs] = arange(self.I2Cs.size)
+        for i, (cols, rows) in enumerate(self.Groups):
+            self.API.testAllPixels(0)
+            self.API.maskAllPixels(1)
+            self.API.testPixels(cols, rows, 1)
+            self.API.maskPixels(cols, rows, 0)
+            self.API.daqStart()
+            for j, vcal in enumerate(vcals):
+                self.API.setDAC('vcal', int(vcal))
+                self.API.daqTrigger(self.NTrig, self.Period)
+                try:
+                    data = self.API.daqGetEventBufferArrays()
+                except RuntimeError:
+                    continue
+                roc = roc_index[data['roc']]
+                good = (roc >= 0) & (data['column'] < 52) & (data['row'] < 80)
+                pixels = (roc[good], data['column'][good], data['row'][good], full(good.sum(), j))
+                add.at(ph, pixels, data['value'][good])
+                add.at(n, pixels, 1)
+            self.API.daqStop()
+            pbar.update(n_done + i + 1) if pbar is not None else do_nothing()
+        return where(n > 0, ph / maximum(n, 1), nan)
+
+    def save(self, name='phCalibration', directory='.'):
+        """ writes one file per ROC [name]_C[roc].dat in the format of the pXar phCalibration files (read by phCalibrationFits).
+            The ranges are measured separately, so the files have to be read with the after2019 option. """
+        ph = rint(where(isnan(self.PH), 0, self.PH)).astype('i2')
+        file_names = []
+        for roc in xrange(ph.shape[0]):
+            file_names.append(join(directory, '{}_C{}.dat'.format(name, roc)))
+            with open(file_names[-1], 'w') as f:
+                f.write('Mode 1\n')
+                f.write('Low range:  {} \n'.format(' '.join(str(v) for v in self.Ranges[0])))
+                f.write('High range:  {} \n\n'.format(' '.join(str(v) for v in self.Ranges[4])))
+                for col in xrange(52):
+                    for row in xrange(80):
+                        f.write('{}    Pix {} {}\n'.format(' '.join('{:3d}'.format(v) for v in ph[roc, col, row]), col, row))
+        return file_names
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Class to scan the event yield vs. a timing setting (wbc, trigger latency) with streamed event batches
+# created on October 18th 2026
+# --------------------------------------------------------
+
+from collections import OrderedDict
+from numpy import zeros, full, arange, repeat, diff, bincount, nanargmax, sqrt, array, nan, isnan
+from utils import info, warning, do_nothing
+
+
+class YieldScan(object):
+    """ Scans a timing setting with external triggers. For every value the event buffer is streamed in columnar batches and the number of events with hits is
+        accumulated for every ROC and for the coincidence of all ROCs, together with the histogram of the trigger phases.
+        A yield peak is resolved when its yield exceeds [min_yield] and is larger by [sigma] standard deviations than the yields of the [margin] values after it.
+        With [per_roc] every ROC leaves the scan with its own peak, as soon as it is resolved, otherwise the scan stops when the coincidence peak is resolved.
+        The counts of ROCs which already left the scan are NaN. """
+
+    def __init__(self, api, set_value, values, n_events=50, per_roc=True, sigma=3., min_yield=.1, margin=2, timeout=10):
+        """ :param set_value: function setting the scanned value, called with (value, roc index) or with (value, None) if not [per_roc] """
+        self.API = api
+        self.SetValue = set_value
+        self.Values = list(values)
+        self.NEvents = n_events
+        self.PerRoc = per_roc
+        self.Sigma = sigma
+        self.MinYield = min_yield
+        self.Margin = margin
+        self.Timeout = timeout
+
+        self.I2Cs = array(api.getRocI2Caddr(), 'i2')
+        self.RocIndex = full(256, -1, 'i2')
+        self.RocIndex[self.I2Cs] = arange(self.I2Cs.size)
+        self.NRocs = self.I2Cs.size
+        self.Counts = OrderedDict()  # value: events with hits of every ROC (NaN if not measured) + coincidences
+        self.N = OrderedDict()  # value: number of events
+        self.TriggerPhases = zeros(64, 'u8')
+        self.Best = OrderedDict()  # ROC index (-1 for the coincidence): best value
+
+    def get_yields(self, coincidence=False):
+        """ :returns: the yields [%] for every measured value """
+        return OrderedDict((value, 100. * (counts[-1:] if coincidence else counts[:-1]) / max(self.N[value], 1)) for value, counts in self.Counts.iteritems())
+
+    def measure(self, value, rocs):
+        """ counts the events with hits at [value] of the ROCs [rocs] (all for [None]) and of the coincidence of all ROCs """
+        for roc in rocs:
+            self.SetValue(value, roc)
+        self.API.daqClear()
+        counts, n = zeros(self.NRocs + 1), 0
+        for batch in self.API.iterEvents(self.NEvents, timeout=self.Timeout, arrays=True, headers=True):
+            n_events = min(batch['offsets'].size - 1, self.NEvents - n)
+            n_hits = batch['offsets'][n_events]
+            events = repeat(arange(n_events), diff(batch['offsets'][:n_events + 1]))
+            roc = self.RocIndex[batch['roc'][:n_hits]]
+            hit = zeros((n_events, self.NRocs), bool)
+            hit[events[roc >= 0], roc[roc >= 0]] = True
+            counts[:-1] += hit.sum(axis=0)
+            counts[-1] += hit.all(axis=1).sum()
+            if batch['trigger_phase'].shape[1]:
+                self.TriggerPhases += bincount(batch['trigger_phase'][:n_events, 0], minlength=self.TriggerPhases.size).astype('u8')
+            n += n_events
+            if n >= self.NEvents:
+                break
+        if n < self.NEvents:
+            warning('only got {} of {} events for value {}'.format(n, self.NEvents, value))
+        if None not in rocs:
+            counts[[roc for roc in xrange(self.NRocs) if roc not in rocs]] = nan
+        self.Counts[value], self.N[value] = counts, n
+
+    def get_error(self, value, i):
+        """ :returns: the binomial error of the yield of ROC [i] (-1 for the coincidence) at [value] """
+        n = max(self.N[value], 1)
+        p = (self.Counts[value][i] + 1.) / (n + 2.)
+        return sqrt(p * (1 - p) / n)
+
+    def is_resolved(self, i):
+        """ :returns: the value of the resolved yield peak of ROC [i] (-1 for the coincidence) or None """
+        values = self.Counts.keys()
+        yields = [self.Counts[v][i] / float(max(self.N[v], 1)) for v in values]
+        best = int(nanargmax(yields))
+        if yields[best] < self.MinYield or len(values) - best - 1 < self.Margin:
+            return
+        if all(yields[best] - yields[j] > self.Sigma * sqrt(self.get_error(values[best], i) ** 2 + self.get_error(values[j], i) ** 2) for j in xrange(best + 1, best + 1 + self.Margin)):
+            return values[best]
+
+    def run(self, prnt=True):
+        """ :returns: the best value of every ROC (dictionary of ROC index: value) or of the coincidence (key -1) """
+        if prnt:
+            print '\nROC EVENT YIELDS:\n  value\t{}'.format('\t'.join(('roc{}'.format(i)).rjust(6) for i in xrange(self.NRocs) if self.PerRoc) + ('' if self.PerRoc else ' all'))
+        for value in self.Values:
+            todo = [roc for roc in xrange(self.NRocs) if roc not in self.Best] if self.PerRoc else [None]
+            self.measure(value, todo)
+            if prnt:
+                print '  {:03d}\t{}'.format(value, '\t'.join('-'.rjust(6) if isnan(v) else '{:5.1f}%'.format(v) for v in self.get_yields(not self.PerRoc)[value]))
+            for roc in todo:
+                best = self.is_resolved(-1 if roc is None else roc)
+                if best is not None:
+                    self.Best[-1 if roc is None else roc] = best
+                    if roc is not None:
+                        self.SetValue(best, roc)
+                    info('found peak of {} at {}'.format('the coincidence' if roc is None else 'ROC {}'.format(roc), best), prnt=prnt)
+            if len(self.Best) == (self.NRocs if self.PerRoc else 1):
+                break
+        missing = [roc for roc in xrange(self.NRocs) if roc not in self.Best] if self.PerRoc else [] if -1 in self.Best else [None]
+        for roc in missing:
+            i = -1 if roc is None else roc
+            self.Best[i] = self.Counts.keys()[int(nanargmax([counts[i] for counts in self.Counts.itervalues()]))]
+            warning('peak of {} not resolved, using the maximum at {}'.format('the coincidence' if roc is None else 'ROC {}'.format(roc), self.Best[i]), prnt=prnt)
+            self.SetValue(self.Best[i], roc) if roc is not None else do_nothing()
+        if not self.PerRoc:
+            self.SetValue(self.Best[-1], None)
+        return self.Best
+
+    def print_trigger_phases(self):
+        print '\nTRIGGER PHASE:'
+        for i, trigger_phase in enumerate(self.TriggerPhases):
+            if trigger_phase:
+                percentage = trigger_phase * 100. / self.TriggerPhases.sum()
+                print '{i}\t{d} {v:2.1f}%'.format(i=i, d=int(round(percentage)) * '|', v=percentage)
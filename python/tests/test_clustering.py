@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Tests of the vectorised clustering against a brute-force reference
+# created on October 18th 2026
+# --------------------------------------------------------
+
+import unittest
+from os.path import join, dirname, realpath
+from sys import path
+path.insert(1, join(dirname(dirname(realpath(__file__))), 'src'))
+
+from numpy import zeros, cumsum, split, array
+from numpy.random import RandomState
+from clustering import clusterise, clusterise_planes
+
+HitType = [('column', 'u2'), ('row', 'u2'), ('adc', 'i2'), ('vcal', 'f4')]
+
+
+def brute_force(hits):
+    """ :returns: the (size, vcal, seed vcal) of the 8-neighbour clusters of the [hits] of a single event """
+    todo, clusters = set(xrange(hits.size)), []
+    while todo:
+        stack, members = [todo.pop()], []
+        while stack:
+            i = stack.pop()
+            members.append(i)
+            for j in [j for j in todo if abs(int(hits[i]['column']) - hits[j]['column']) <= 1 and abs(int(hits[i]['row']) - hits[j]['row']) <= 1]:
+                todo.remove(j)
+                stack.append(j)
+        vcal = hits['vcal'][members].astype('d')
+        clusters.append((len(members), vcal.sum(), vcal.max()))
+    return sorted(clusters)
+
+
+def random_hits(n_events, max_hits=8, seed=0):
+    """ :returns: hits in a small window with many neighbours and the number of hits of every event """
+    r = RandomState(seed)
+    n_hits = r.randint(0, max_hits + 1, n_events).astype('u2')
+    hits = zeros(n_hits.sum(), HitType)
+    hits['column'] = r.randint(20, 26, hits.size)
+    hits['row'] = r.randint(40, 46, hits.size)
+    hits['vcal'] = r.uniform(0, 100, hits.size)
+    return hits, n_hits
+
+
+def split_events(data, n):
+    return split(data, cumsum(n, dtype='i8')[:-1])
+
+
+class ClusteringTest(unittest.TestCase):
+
+    def check(self, hits, n_hits, clusters, n_clusters):
+        self.assertEqual(n_clusters.size, n_hits.size)
+        self.assertEqual(clusters.size, n_clusters.sum())
+        for ev_hits, ev_clusters in zip(split_events(hits, n_hits), split_events(clusters, n_clusters)):
+            found = []
+            for c in ev_clusters:
+                seed = ev_hits['vcal'][(ev_hits['column'] == c['seed_column']) & (ev_hits['row'] == c['seed_row'])]
+                self.assertTrue(seed.size, 'seed pixel is not a hit of the event')
+                found.append((int(c['size']), float(c['vcal']), float(seed.max())))
+            expected = brute_force(ev_hits)
+            self.assertEqual(len(found), len(expected))
+            for (size, vcal, seed), (ref_size, ref_vcal, ref_seed) in zip(sorted(found), expected):
+                self.assertEqual(size, ref_size)
+                self.assertAlmostEqual(vcal, ref_vcal, delta=1e-3 * ref_vcal + 1e-3)
+                self.assertAlmostEqual(seed, ref_seed, places=4)
+
+    def test_brute_force(self):
+        hits, n_hits = random_hits(500)
+        self.check(hits, n_hits, *clusterise(hits, n_hits))
+
+    def test_empty(self):
+        clusters, n_clusters = clusterise(zeros(0, HitType), zeros(5, 'u2'))
+        self.assertEqual(clusters.size, 0)
+        self.assertEqual(list(n_clusters), [0] * 5)
+
+    def test_planes(self):
+        planes = [random_hits(3000, seed=i) for i in xrange(2)]
+        n_hits = array([n for _, n in planes])
+        for n_processes in [1, 2]:
+            for (hits, n), (clusters, n_clusters) in zip(planes, clusterise_planes([h for h, _ in planes], n_hits, n_processes, shard_size=1000)):
+                self.check(hits, n, clusters, n_clusters)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Tests of the parallel threshold bisection with a simulated testboard
+# created on October 18th 2026
+# --------------------------------------------------------
+
+import unittest
+from os.path import join, dirname, realpath
+from sys import path
+pxar_dir = dirname(dirname(dirname(realpath(__file__))))
+path.insert(1, join(pxar_dir, 'lib'))
+path.insert(1, join(pxar_dir, 'python', 'src'))
+
+from numpy import zeros, ones, where, isnan, array, arange
+from numpy.random import RandomState
+from threshold_finder import ThresholdFinder
+
+
+class FakeAPI(object):
+    """ pixels respond to all triggers from their threshold on if they are enabled and not masked """
+
+    def __init__(self, thresholds):
+        self.Thresholds = thresholds
+        self.Enabled = ones(thresholds.shape, bool)
+        self.Masked = zeros(thresholds.shape, bool)
+        self.NCalls = 0
+
+    def getEnableMap(self):
+        return self.Enabled.copy()
+
+    def getMaskMap(self):
+        return self.Masked.copy()
+
+    def testAllPixels(self, enable):
+        self.Enabled[:] = enable
+
+    def maskAllPixels(self, mask):
+        self.Masked[:] = mask
+
+    def testPixels(self, cols, rows, enable, roc):
+        self.Enabled[roc, cols, rows] = enable
+
+    def maskPixels(self, cols, rows, mask, roc):
+        self.Masked[roc, cols, rows] = mask
+
+    def getEfficiencyVsDAC(self, dac, step, dac_min, dac_max, flags, n_trig, dense):
+        self.NCalls += 1
+        vcals = arange(dac_min, dac_max + 1, step)
+        values = array([where(self.Enabled & ~self.Masked & (self.Thresholds <= vcal), n_trig, 0) for vcal in vcals])
+        return values, vcals
+
+
+class ThresholdFinderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.Thresholds = RandomState(0).randint(0, 300, (2, 52, 80))
+        self.Thresholds[0, :2, 0] = [0, 255]  # edges of the search range
+        self.API = FakeAPI(self.Thresholds)
+
+    def test_thresholds(self):
+        thresholds = ThresholdFinder(self.API).run()
+        found = self.Thresholds <= 255
+        self.assertTrue((thresholds[found] == self.Thresholds[found]).all())
+        self.assertTrue(isnan(thresholds[~found]).all())
+
+    def test_resolution(self):
+        thresholds = ThresholdFinder(self.API, resolution=4).run()
+        found = ~isnan(thresholds)
+        diff = thresholds[found] - self.Thresholds[found]
+        self.assertTrue(((diff >= 0) & (diff <= 4)).all())
+        self.assertTrue((self.Thresholds[~found] > 255 - 4).all())
+
+    def test_pixels(self):
+        pixels = zeros(self.Thresholds.shape, bool)
+        pixels[1, 10:20, 30] = True
+        thresholds = ThresholdFinder(self.API).run(pixels)
+        self.assertTrue(isnan(thresholds[~pixels]).all())
+        self.assertTrue((thresholds[pixels] == self.Thresholds[pixels]).all())
+
+    def test_restore(self):
+        self.API.Masked[0, 5, 5] = True
+        self.API.Enabled[1, 7] = False
+        enabled, masked = self.API.getEnableMap(), self.API.getMaskMap()
+        thresholds = ThresholdFinder(self.API).run()
+        self.assertTrue((self.API.Enabled == enabled).all())
+        self.assertTrue((self.API.Masked == masked).all())
+        self.assertTrue(isnan(thresholds[0, 5, 5]) and isnan(thresholds[1, 7]).all())
+
+    def test_steps(self):
+        finder = ThresholdFinder(self.API)
+        finder.run()
+        self.assertLessEqual(finder.NSteps, 9)
+        self.assertEqual(finder.NScans, self.API.NCalls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Tests of the vcal lookup table against a numerical root-finding of the fit function
+# created on October 18th 2026
+# --------------------------------------------------------
+
+import unittest
+from math import erf
+from os.path import join, dirname, realpath
+from shutil import rmtree
+from sys import path
+from tempfile import mkdtemp
+path.insert(1, join(dirname(dirname(realpath(__file__))), 'src'))
+
+from numpy import array, arange
+from numpy.random import RandomState
+from vcal_calibration import VcalCalibration, roc_number, ADC_MIN, ADC_MAX
+
+
+def find_root(adc, p0, p1, p2, p3, lo, hi, n=60):
+    """ :returns: the vcal with p3 * (Erf((vcal - p0) / p1) + p2) = [adc] from a bisection in [lo, hi], the edge if there is no root """
+    f = lambda x: p3 * (erf((x - p0) / p1) + p2) - adc
+    if f(lo) >= 0:
+        return lo
+    if f(hi) <= 0:
+        return hi
+    for _ in xrange(n):
+        mid = (lo + hi) / 2.
+        lo, hi = (mid, hi) if f(mid) < 0 else (lo, mid)
+    return (lo + hi) / 2.
+
+
+class VcalCalibrationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.Dir = mkdtemp()
+        self.Calibration = VcalCalibration(directory=self.Dir, cache_dir=self.Dir, n_cols=3, n_rows=2)
+        r = RandomState(0)
+        self.Pars = array([r.uniform(50, 150, (2, 3, 2)), r.uniform(50, 150, (2, 3, 2)), r.uniform(.6, 1.2, (2, 3, 2)), r.uniform(100, 200, (2, 3, 2))]).transpose(1, 2, 3, 0)
+        self.Calibration.Table = self.Calibration.build_table(self.Pars)
+
+    def tearDown(self):
+        rmtree(self.Dir)
+
+    def test_root_find(self):
+        lo, hi = self.Calibration.Range
+        for roc in xrange(2):
+            for col in xrange(3):
+                for row in xrange(2):
+                    p0, p1, p2, p3 = self.Pars[roc, col, row]
+                    for adc in xrange(ADC_MIN, ADC_MAX + 1, 7):
+                        self.assertAlmostEqual(self.Calibration(roc, col, row, adc), find_root(adc, p0, p1, p2, p3, lo, hi), delta=.05, msg='adc {}'.format(adc))
+
+    def test_clip(self):
+        self.assertEqual(self.Calibration(0, 1, 1, ADC_MIN - 100), self.Calibration(0, 1, 1, ADC_MIN))
+        self.assertEqual(self.Calibration(0, 1, 1, ADC_MAX + 100), self.Calibration(0, 1, 1, ADC_MAX))
+
+    def test_arrays(self):
+        adc = arange(-20, 20)
+        values = self.Calibration(1, 2, 0, adc)
+        self.assertEqual([self.Calibration(1, 2, 0, a) for a in adc], list(values))
+
+    def test_no_files(self):
+        self.assertEqual(VcalCalibration(directory=self.Dir, cache_dir=self.Dir).Table, None)
+        self.assertEqual(list(VcalCalibration(directory=self.Dir, cache_dir=self.Dir)(0, 0, 0, array([-5, 7]))), [-5, 7])
+
+    def test_file_order(self):
+        names = ['phCalibrationFitErr_C{}.dat'.format(i) for i in [10, 2, 0, 1]]
+        self.assertEqual([roc_number(name) for name in sorted(names, key=roc_number)], [0, 1, 2, 10])
+
+
+if __name__ == '__main__':
+    unittest.main()
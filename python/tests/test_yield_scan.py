@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Tests of the early stop of the yield scan with a simulated testboard
+# created on October 18th 2026
+# --------------------------------------------------------
+
+import unittest
+from os.path import join, dirname, realpath
+from sys import path
+path.insert(1, join(dirname(dirname(realpath(__file__))), 'src'))
+
+from numpy import array, zeros, isnan, concatenate, cumsum
+from yield_scan import YieldScan
+
+
+class FakeAPI(object):
+    """ the ROCs have hits in [high] of the events at the value of their peak and in [low] of the events otherwise """
+
+    def __init__(self, peaks, i2cs=None, high=.9, low=.05):
+        self.Peaks = peaks
+        self.I2Cs = range(len(peaks)) if i2cs is None else i2cs
+        self.Values = [None] * len(peaks)
+        self.High, self.Low = high, low
+        self.NBatches = 0
+
+    def set_value(self, value, roc):
+        for i in (xrange(len(self.Peaks)) if roc is None else [roc]):
+            self.Values[i] = value
+
+    def getRocI2Caddr(self):
+        return self.I2Cs
+
+    def daqClear(self):
+        pass
+
+    def iterEvents(self, batch_size, timeout=None, arrays=False, headers=False):
+        while True:
+            self.NBatches += 1
+            fractions = [self.High if value == peak else self.Low for value, peak in zip(self.Values, self.Peaks)]
+            rocs = [[i2c for i2c, f in zip(self.I2Cs, fractions) if i < f * batch_size] for i in xrange(batch_size)]
+            yield {'offsets': concatenate([[0], cumsum([len(r) for r in rocs])]), 'roc': array(sum(rocs, []), 'u1'), 'trigger_phase': zeros((batch_size, 1), 'u1')}
+
+
+class YieldScanTest(unittest.TestCase):
+
+    def test_per_roc(self):
+        api = FakeAPI([100, 103], i2cs=[4, 6])
+        scan = YieldScan(api, api.set_value, xrange(95, 115))
+        best = scan.run(prnt=False)
+        self.assertEqual(dict(best), {0: 100, 1: 103})
+        self.assertEqual(api.Values, [100, 103])
+        self.assertEqual(scan.Counts.keys(), range(95, 106))  # stops once the last peak is resolved after [margin] values
+        self.assertFalse(isnan(scan.Counts[102][0]))
+        self.assertTrue(isnan(scan.Counts[103][0]))  # ROC 0 left the scan
+        self.assertTrue(all(not isnan(counts[1:]).any() for counts in scan.Counts.itervalues()))
+
+    def test_yields(self):
+        api = FakeAPI([100, 103])
+        scan = YieldScan(api, api.set_value, xrange(95, 115), n_events=100)
+        scan.run(prnt=False)
+        yields = scan.get_yields()
+        self.assertAlmostEqual(yields[100][0], 90)
+        self.assertAlmostEqual(yields[101][1], 5)
+        self.assertTrue(isnan(yields[104][0]))
+
+    def test_unresolved(self):
+        api = FakeAPI([100, 200])  # the peak of ROC 1 is outside of the scanned range
+        scan = YieldScan(api, api.set_value, xrange(95, 110))
+        best = scan.run(prnt=False)
+        self.assertEqual(best[0], 100)
+        self.assertEqual(best[1], 95)  # first maximum of the flat yields
+        self.assertEqual(len(scan.Counts), 15)
+
+    def test_coincidence(self):
+        api = FakeAPI([100, 100])
+        scan = YieldScan(api, api.set_value, xrange(95, 115), per_roc=False)
+        best = scan.run(prnt=False)
+        self.assertEqual(dict(best), {-1: 100})
+        self.assertEqual(scan.Counts.keys(), range(95, 103))
+        self.assertAlmostEqual(scan.get_yields(coincidence=True)[100][0], 90)
+
+
+if __name__ == '__main__':
+    unittest.main()